@@ -2,10 +2,12 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
+from sqlalchemy.engine import make_url
 from config import Config
+from app.replicas import RoutingSession, init_replicas
 
 # 初始化插件
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
 login = LoginManager()
 login.login_view = 'auth.login'
@@ -14,10 +16,37 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    # 部分写入用了 SQLite 方言（INSERT ... ON CONFLICT、json_extract 生成列），主库和从库都只能是 SQLite
+    for uri in [app.config['SQLALCHEMY_DATABASE_URI'], *(app.config.get('SQLALCHEMY_REPLICA_URIS') or [])]:
+        backend = make_url(uri).get_backend_name()
+        if backend != 'sqlite':
+            raise RuntimeError(f'只支持 SQLite 数据库，DATABASE_URL / REPLICA_DATABASE_URIS 不能使用 {backend}')
+
+    init_replicas(app)
     db.init_app(app)
     migrate.init_app(app, db)
     login.init_app(app)
 
+    from app.passwords import init_passwords
+    init_passwords(app)
+
+    from app.warmup import init_template_cache, templates_cli
+    init_template_cache(app)
+    app.cli.add_command(templates_cli)
+
+    # 最先注册：after_request 按注册的逆序执行，指标在压缩之后统计响应大小，压缩在其余钩子之后执行
+    from app.metrics import init_metrics
+    init_metrics(app)
+
+    from app.compress import init_compress
+    init_compress(app)
+
+    from app.slow_queries import init_slow_queries
+    init_slow_queries(app)
+
+    from app.profiler import init_profiler
+    init_profiler(app)
+
     # 注册蓝图
     from app.auth import bp as auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -31,6 +60,31 @@ def create_app(config_class=Config):
     from app.admin import bp as admin_bp
     app.register_blueprint(admin_bp, url_prefix='/admin')
 
+    from app.cart_summary import init_cart_summary
+    init_cart_summary(app)
+
+    from app.uploads import uploads_cli
+    app.cli.add_command(uploads_cli)
+
+    from app.image_proxy import init_image_proxy
+    init_image_proxy(app)
+
+    from app.assets import init_assets
+    init_assets(app)
+
+    from app.recommend import recommend_cli
+    app.cli.add_command(recommend_cli)
+
+    from app.trending import trending_cli
+    app.cli.add_command(trending_cli)
+
+    from app.price_history import prices_cli
+    app.cli.add_command(prices_cli)
+
+    from app.sweeper import init_sweeper, sweep_command
+    app.cli.add_command(sweep_command)
+    init_sweeper(app)
+
     return app
 
 from app import models
\ No newline at end of file
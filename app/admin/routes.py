@@ -1,8 +1,17 @@
-from flask import render_template, redirect, url_for, flash, request
+import json
+import time
+
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, abort, Response
 from flask_login import login_required, current_user
 from app import db
 from app.admin import bp
+from app.replicas import read_only
+from app.search_cache import get_search_cache
+from app.metrics import get_metrics, summarize
+from app.slow_queries import get_slow_query_log
+from app.profiler import get_profiler, to_collapsed, to_speedscope, top_frames
 from app.models import User, Product, Bounty
+from app.batch import delete_derived_rows
 
 # 简单的权限检查装饰器逻辑（也可以写成装饰器，这里直接写在函数里简单点）
 def check_admin():
@@ -13,6 +22,7 @@ def check_admin():
 
 @bp.route('/dashboard')
 @login_required
+@read_only(read_your_writes=True)
 def dashboard():
     if not check_admin():
         return redirect(url_for('buyer.index'))
@@ -36,6 +46,89 @@ def dashboard():
                            bounty_count=bounty_count,
                            products=products)
 
+@bp.route('/search_stats')
+@login_required
+def search_stats():
+    """搜索结果缓存的命中率与热门搜索（容量规划用）"""
+    if not check_admin():
+        return redirect(url_for('buyer.index'))
+    top = request.args.get('top', 20, type=int)
+    return jsonify(get_search_cache().stats(top=top))
+
+@bp.route('/performance')
+@login_required
+def performance():
+    """各视图的延迟分布、SQL 占比、模板耗时与响应大小（所有 worker 合并）"""
+    if not check_admin():
+        return redirect(url_for('buyer.index'))
+    rows = summarize(get_metrics().collect())
+    sort = request.args.get('sort', 'total_s')
+    if rows and sort in rows[0] and sort not in ('endpoint', 'method'):
+        rows.sort(key=lambda row: -row[sort])
+    slow_log = get_slow_query_log()
+    slow_queries = slow_log.top(n=current_app.config['SLOW_QUERY_TOP']) if slow_log else None
+    return render_template('admin_performance.html', rows=rows, sort=sort,
+                           enabled=current_app.config['METRICS_ENABLED'], slow_queries=slow_queries)
+
+@bp.route('/performance/reset', methods=['POST'])
+@login_required
+def reset_performance():
+    if not check_admin():
+        return redirect(url_for('buyer.index'))
+    get_metrics().reset()
+    flash('性能统计已清空', 'success')
+    return redirect(url_for('admin.performance'))
+
+@bp.route('/profiler')
+@login_required
+def profiler():
+    """按需采样分析：开启 / 停止，历次结果"""
+    if not check_admin():
+        return redirect(url_for('buyer.index'))
+    prof = get_profiler()
+    endpoints = sorted({rule.endpoint for rule in current_app.url_map.iter_rules() if rule.endpoint != 'static'})
+    return render_template('admin_profiler.html', active=prof.active(), sessions=prof.sessions(),
+                           endpoints=endpoints, now=time.time())
+
+@bp.route('/profiler/start', methods=['POST'])
+@login_required
+def start_profiler():
+    if not check_admin():
+        return redirect(url_for('buyer.index'))
+    endpoint = request.form.get('endpoint') or None
+    rate = min(max(request.form.get('rate', 10, type=float), 0.1), 100) / 100
+    duration = min(max(request.form.get('duration', 60, type=int), 1), current_app.config['PROFILER_MAX_DURATION'])
+    session = get_profiler().start(endpoint=endpoint, rate=rate, duration=duration)
+    flash(f"已开始分析 {endpoint or '全部视图'}（采样 {rate:.0%} 的请求，{duration} 秒）：{session['id']}", 'success')
+    return redirect(url_for('admin.profiler'))
+
+@bp.route('/profiler/stop', methods=['POST'])
+@login_required
+def stop_profiler():
+    if not check_admin():
+        return redirect(url_for('buyer.index'))
+    session = get_profiler().stop()
+    flash(f"已停止分析 {session['id']}" if session else '当前没有进行中的分析', 'info')
+    return redirect(url_for('admin.profiler'))
+
+@bp.route('/profiler/<session_id>')
+@login_required
+def profile_detail(session_id):
+    if not check_admin():
+        return redirect(url_for('buyer.index'))
+    loaded = get_profiler().load(session_id)
+    if loaded is None:
+        abort(404)
+    meta, samples = loaded
+    fmt = request.args.get('format')
+    if fmt == 'collapsed':
+        return Response(to_collapsed(samples), mimetype='text/plain', headers={
+            'Content-Disposition': f'attachment; filename=profile-{meta["id"]}.collapsed.txt'})
+    if fmt == 'speedscope':
+        return Response(json.dumps(to_speedscope(meta, samples)), mimetype='application/json', headers={
+            'Content-Disposition': f'attachment; filename=profile-{meta["id"]}.speedscope.json'})
+    return render_template('admin_profile_detail.html', meta=meta, frames=top_frames(samples, 30))
+
 @bp.route('/delete_product/<int:id>')
 @login_required
 def delete_product(id):
@@ -43,6 +136,7 @@ def delete_product(id):
         return redirect(url_for('buyer.index'))
     
     product = Product.query.get_or_404(id)
+    delete_derived_rows([product.id])
     db.session.delete(product)
     db.session.commit()
     flash(f'商品 "{product.title}" 已被强制下架/删除', 'success')
@@ -0,0 +1,177 @@
+"""
+静态资源指纹与预压缩：flask assets build
+
+- 把 app/static 下的文件（上传目录除外）按内容哈希复制到 ASSETS_BUILD_DIR：css/style.css -> css/style.<哈希>.css，
+  并写出 manifest.json（原路径 -> 带指纹路径）；
+- 可压缩的文本类型（css / js / svg 等）同时生成 .gz 和 .br（需要安装 brotli）预压缩版本；
+- 模板里用 {{ asset_url('css/style.css') }} 引用静态资源：有 manifest 时指向 /assets/<带指纹路径>，
+  响应带一年的 Cache-Control: immutable，按 Accept-Encoding 直接发送预压缩文件；
+  没有构建过、文件不在 manifest 中或处于调试模式时退回普通的 /static 地址。
+
+内容变化后重新执行 flask assets build 即得到新地址；旧文件保留，已缓存旧页面的浏览器仍能取到。
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+
+import click
+from flask import Blueprint, abort, current_app, request, send_file, url_for
+from flask.cli import AppGroup
+from flask.sessions import SecureCookieSessionInterface
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # 可选依赖：未安装时只生成 / 发送 gzip
+    brotli = None
+
+bp = Blueprint('assets', __name__)
+
+MANIFEST = 'manifest.json'
+
+# 值得压缩的类型；图片（svg 除外）和字体本身已压缩
+COMPRESSIBLE = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml'}
+
+
+def _fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def _write_compressed(path, min_size):
+    """生成 path.gz / path.br（比原文件小才保留），返回生成的后缀"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < min_size:
+        return []
+    variants = [('.gz', lambda d: gzip.compress(d, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.insert(0, ('.br', lambda d: brotli.compress(d, quality=11)))
+    written = []
+    for suffix, compress in variants:
+        body = compress(data)
+        if len(body) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(body)
+            written.append(suffix)
+    return written
+
+
+def build_assets(app):
+    """为全部静态资源生成带指纹的副本与预压缩版本，写出 manifest，返回 manifest"""
+    static = app.static_folder
+    build_dir = app.config['ASSETS_BUILD_DIR']
+    skip = {os.path.normpath(app.config['UPLOAD_FOLDER']), os.path.normpath(build_dir)}
+    min_size = app.config['COMPRESS_MIN_SIZE']
+    manifest = {}
+    for root, dirs, files in os.walk(static):
+        dirs[:] = sorted(d for d in dirs if os.path.normpath(os.path.join(root, d)) not in skip)
+        for name in sorted(files):
+            source = os.path.join(root, name)
+            rel = os.path.relpath(source, static).replace(os.sep, '/')
+            stem, ext = os.path.splitext(rel)
+            target_rel = f'{stem}.{_fingerprint(source)}{ext}'
+            target = os.path.join(build_dir, target_rel)
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.copyfile(source, target + '.tmp')
+                os.replace(target + '.tmp', target)
+                if ext.lower() in COMPRESSIBLE:
+                    _write_compressed(target, min_size)
+            manifest[rel] = target_rel
+    os.makedirs(build_dir, exist_ok=True)
+    tmp = os.path.join(build_dir, MANIFEST + '.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp, os.path.join(build_dir, MANIFEST))
+    app.extensions['assets'] = manifest
+    return manifest
+
+
+def load_manifest(app):
+    """读取 manifest（进程内缓存）；没有构建过时为空字典"""
+    manifest = app.extensions.get('assets')
+    if manifest is None:
+        try:
+            with open(os.path.join(app.config['ASSETS_BUILD_DIR'], MANIFEST), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = {}
+        app.extensions['assets'] = manifest
+    return manifest
+
+
+def asset_url(filename):
+    """模板全局函数：静态资源的带指纹地址，没有时退回 /static"""
+    app = current_app._get_current_object()
+    if not app.debug:
+        fingerprinted = load_manifest(app).get(filename)
+        if fingerprinted:
+            return url_for('assets.asset', filename=fingerprinted)
+    return url_for('static', filename=filename)
+
+
+@bp.route('/assets/<path:filename>')
+def asset(filename):
+    config = current_app.config
+    path = safe_join(config['ASSETS_BUILD_DIR'], filename)
+    if path is None or filename == MANIFEST or not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    compressible = os.path.splitext(filename)[1].lower() in COMPRESSIBLE
+    encoding = None
+    if compressible:
+        offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+        encoding = request.accept_encodings.best_match(offered)
+        suffix = {'br': '.br', 'gzip': '.gz'}.get(encoding)
+        if suffix and os.path.isfile(path + suffix):
+            path += suffix
+        else:
+            encoding = None
+    response = send_file(path, mimetype=mimetype, max_age=config['ASSETS_MAX_AGE'], conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if compressible:
+        response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class AssetSessionInterface(SecureCookieSessionInterface):
+    """
+    静态资源与图片代理的响应不保存会话
+    Flask-Login 每个请求都会读取会话，默认会给响应加上 Vary: Cookie，
+    会话 Cookie 一变（购物车摘要等经常刷新）浏览器就认为缓存不匹配，immutable 失去意义
+    """
+
+    SESSIONLESS_ENDPOINTS = {'assets.asset', 'image_proxy.proxy', 'static'}
+
+    def save_session(self, app, session, response):
+        if request.endpoint in self.SESSIONLESS_ENDPOINTS:
+            return
+        super().save_session(app, session, response)
+
+
+assets_cli = AppGroup('assets', help='静态资源')
+
+
+@assets_cli.command('build')
+def build_command():
+    """生成带指纹的静态资源、预压缩版本与 manifest"""
+    manifest = build_assets(current_app._get_current_object())
+    click.echo(f"处理 {len(manifest)} 个文件，输出到 {current_app.config['ASSETS_BUILD_DIR']}"
+               + ('' if brotli is not None else '（未安装 brotli，只生成 gzip）'))
+
+
+def init_assets(app):
+    app.register_blueprint(bp)
+    app.add_template_global(asset_url)
+    app.session_interface = AssetSessionInterface()
+    app.cli.add_command(assets_cli)
@@ -4,6 +4,9 @@ from app import db
 from app.auth import bp
 from app.models import User
 from app.forms import LoginForm, RegisterForm
+from app.passwords import PasswordHasherBusy
+
+BUSY_MESSAGE = '登录的人太多了，请稍后再试'
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -12,7 +15,13 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        try:
+            verified = user is not None and user.check_password(form.password.data)
+        except PasswordHasherBusy:
+            flash(BUSY_MESSAGE, 'warning')
+            return render_template('login.html', form=form), 503
+        if verified:
+            db.session.commit()  # 保存升级后的密码哈希
             login_user(user)
             return redirect(url_for('buyer.index'))
         flash('用户名或密码错误', 'danger')
@@ -23,7 +32,11 @@ def register():
     form = RegisterForm()
     if form.validate_on_submit():
         user = User(username=form.username.data, role=form.role.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except PasswordHasherBusy:
+            flash(BUSY_MESSAGE, 'warning')
+            return render_template('register.html', form=form), 503
         db.session.add(user)
         db.session.commit()
         flash('注册成功，请登录', 'success')
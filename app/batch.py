@@ -0,0 +1,247 @@
+"""
+批量操作：收藏、购物车、卖家商品管理
+
+每个接口接收一组 id（或 {id, ...} 条目），先用一条查询取出涉及的全部记录逐条校验，
+再对通过校验的条目执行集合式语句（INSERT ... ON CONFLICT / executemany UPDATE / DELETE ... IN），
+整批一个事务提交，返回逐条结果 [{'id', 'success', 'message'}]。
+
+这些语句不经过 ORM flush，因此：
+- 商品变更用 events.record_changes 登记，提交后照常广播 product_changed；
+- 改价时同时写入 PriceHistory（单条改价由 price_history 的 before_flush 负责）；
+- 删除商品时按 Product 上的关系处理关联数据：收藏、购物车随之删除，其余外键置空；
+  通知、相似商品、热度统计这类派生数据直接删除（见 delete_derived_rows）。
+"""
+import math
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.events import TRACKED, Change, record_changes
+from app.models import (BrowsingHistory, Cart, Favorite, Message, Notification, Order, PriceHistory,
+                        Product, ProductNeighbors, ProductStats, Review)
+
+
+def delete_derived_rows(product_ids):
+    """删除挂在商品上、Product 没有对应关系的派生数据（单条删除前也要调用）"""
+    for model in (Notification, ProductNeighbors, ProductStats):
+        db.session.execute(model.__table__.delete().where(model.product_id.in_(product_ids)))
+
+
+class BatchError(ValueError):
+    """请求格式不合法（整批拒绝）"""
+
+
+def _result(item_id, success, message):
+    return {'id': item_id, 'success': success, 'message': message}
+
+
+def parse_ids(values):
+    """校验并去重 id 列表，保持原顺序"""
+    if not isinstance(values, list) or not values:
+        raise BatchError('请提供 id 列表')
+    limit = current_app.config['BATCH_MAX_ITEMS']
+    if len(values) > limit:
+        raise BatchError(f'一次最多处理 {limit} 条')
+    ids = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, int):
+            raise BatchError(f'无效的 id：{value!r}')
+        if value not in ids:
+            ids.append(value)
+    return ids
+
+
+def _products(ids, *columns):
+    rows = db.session.execute(db.select(Product.id, *columns).where(Product.id.in_(ids)))
+    return {row.id: row for row in rows}
+
+
+# ---------- 收藏 ----------
+
+def add_favorites(user_id, product_ids):
+    products = _products(product_ids)
+    existing = set(db.session.scalars(db.select(Favorite.product_id).where(
+        Favorite.user_id == user_id, Favorite.product_id.in_(product_ids))))
+    results, added = [], []
+    for pid in product_ids:
+        if pid not in products:
+            results.append(_result(pid, False, '商品不存在'))
+        elif pid in existing:
+            results.append(_result(pid, True, '已在收藏中'))
+        else:
+            added.append(pid)
+            results.append(_result(pid, True, '收藏'))
+    if added:
+        now = datetime.utcnow()
+        db.session.execute(sqlite_insert(Favorite.__table__).on_conflict_do_nothing(), [
+            {'user_id': user_id, 'product_id': pid, 'created_at': now} for pid in added])
+    db.session.commit()
+    return results, added
+
+
+def remove_favorites(user_id, product_ids):
+    table = Favorite.__table__
+    removed = set(db.session.scalars(db.select(table.c.product_id).where(
+        table.c.user_id == user_id, table.c.product_id.in_(product_ids))))
+    if removed:
+        db.session.execute(table.delete().where(table.c.user_id == user_id, table.c.product_id.in_(list(removed))))
+    db.session.commit()
+    results = [_result(pid, True, '取消收藏') if pid in removed else _result(pid, False, '未收藏该商品')
+               for pid in product_ids]
+    return results, [pid for pid in product_ids if pid in removed]
+
+
+# ---------- 购物车 ----------
+
+def add_to_cart(user_id, product_ids):
+    """每件商品数量 +1（不在购物车中则新增）"""
+    products = _products(product_ids, Product.status, Product.seller_id)
+    results, accepted = [], []
+    for pid in product_ids:
+        product = products.get(pid)
+        if product is None:
+            results.append(_result(pid, False, '商品不存在'))
+        elif product.status != 1:
+            results.append(_result(pid, False, '商品已下架或已售出'))
+        elif product.seller_id == user_id:
+            results.append(_result(pid, False, '不能购买自己发布的商品'))
+        else:
+            accepted.append(pid)
+            results.append(_result(pid, True, '已添加到购物车'))
+    if accepted:
+        table = Cart.__table__
+        now = datetime.utcnow()
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.user_id, table.c.product_id], set_={
+            'quantity': table.c.quantity + 1,
+            'updated_at': stmt.excluded.updated_at,
+        })
+        db.session.execute(stmt, [
+            {'user_id': user_id, 'product_id': pid, 'quantity': 1, 'created_at': now, 'updated_at': now}
+            for pid in accepted])
+    db.session.commit()
+    return results
+
+
+def update_cart(user_id, items):
+    """items 为 [{'cart_id': ..., 'quantity': ...}]，数量小于 1 按 1 处理"""
+    quantities = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            raise BatchError('条目格式应为 {"cart_id": ..., "quantity": ...}')
+        quantity = item.get('quantity', 1)
+        if isinstance(quantity, bool) or not isinstance(quantity, int):
+            raise BatchError(f'无效的数量：{quantity!r}')
+        quantities[item.get('cart_id')] = max(quantity, 1)
+    cart_ids = parse_ids(list(quantities))
+    table = Cart.__table__
+    owned = set(db.session.scalars(db.select(table.c.id).where(
+        table.c.id.in_(cart_ids), table.c.user_id == user_id)))
+    rows = [{'b_id': cid, 'b_quantity': quantities[cid], 'b_updated_at': datetime.utcnow()}
+            for cid in cart_ids if cid in owned]
+    if rows:
+        db.session.execute(table.update().where(table.c.id == db.bindparam('b_id')).values(
+            quantity=db.bindparam('b_quantity'), updated_at=db.bindparam('b_updated_at')), rows)
+    db.session.commit()
+    return [_result(cid, True, f'数量已更新为 {quantities[cid]}') if cid in owned else _result(cid, False, '无权操作')
+            for cid in cart_ids]
+
+
+def remove_from_cart(user_id, cart_ids):
+    table = Cart.__table__
+    owned = set(db.session.scalars(db.select(table.c.id).where(
+        table.c.id.in_(cart_ids), table.c.user_id == user_id)))
+    if owned:
+        db.session.execute(table.delete().where(table.c.id.in_(list(owned))))
+    db.session.commit()
+    return [_result(cid, True, '已从购物车移除') if cid in owned else _result(cid, False, '无权操作')
+            for cid in cart_ids]
+
+
+# ---------- 卖家商品 ----------
+
+SELLER_OPS = ('price', 'list', 'unlist', 'delete')
+
+
+def _snapshot(row):
+    return {name: getattr(row, name) for name in TRACKED['Product'][1]}
+
+
+def seller_products(user_id, ops):
+    """ops 为 [{'id': 商品 id, 'op': 'price' | 'list' | 'unlist' | 'delete', 'price': 新价格}]"""
+    if not isinstance(ops, list) or not all(isinstance(op, dict) for op in ops):
+        raise BatchError('条目格式应为 {"id": ..., "op": ...}')
+    ids = parse_ids([op.get('id') for op in ops])
+    if len(ids) != len(ops):
+        raise BatchError('同一商品在一批中只能出现一次')
+    products = _products(ids, *[getattr(Product, name) for name in TRACKED['Product'][1]])
+
+    results, prices, statuses, deletes, changes = [], [], [], [], []
+    for op in ops:
+        pid, kind = op['id'], op.get('op')
+        product = products.get(pid)
+        if kind not in SELLER_OPS:
+            results.append(_result(pid, False, f'未知操作：{kind!r}'))
+            continue
+        if product is None:
+            results.append(_result(pid, False, '商品不存在'))
+            continue
+        if product.seller_id != user_id:
+            results.append(_result(pid, False, '无权操作'))
+            continue
+        old = _snapshot(product)
+        if kind == 'price':
+            if product.status != 1:
+                results.append(_result(pid, False, '商品不在售卖状态，无法改价'))
+                continue
+            try:
+                price = float(op.get('price'))
+            except (TypeError, ValueError):
+                price = 0
+            # nan / inf 也能被 float() 解析，入库后会变成 NULL
+            if not math.isfinite(price) or price <= 0:
+                results.append(_result(pid, False, '请输入有效的价格'))
+                continue
+            prices.append((pid, product.price, price))
+            changes.append(Change('update', pid, old, dict(old, price=price)))
+            results.append(_result(pid, True, f'价格已从 ¥{product.price} 更新为 ¥{price}'))
+        elif kind in ('list', 'unlist'):
+            current, target, action = (0, 1, '上架') if kind == 'list' else (1, 0, '下架')
+            if product.status != current:
+                results.append(_result(pid, False, '当前商品状态无法切换'))
+                continue
+            statuses.append((pid, target))
+            changes.append(Change('update', pid, old, dict(old, status=target)))
+            results.append(_result(pid, True, f'商品已{action}'))
+        else:
+            if product.status in (2, 3):
+                results.append(_result(pid, False, '该商品有订单记录，无法删除'))
+                continue
+            deletes.append(pid)
+            changes.append(Change('delete', pid, old, None))
+            results.append(_result(pid, True, '商品已删除'))
+
+    products_table = Product.__table__
+    if prices:
+        now = datetime.utcnow()
+        db.session.execute(products_table.update().where(products_table.c.id == db.bindparam('b_id')).values(
+            price=db.bindparam('b_price')), [{'b_id': pid, 'b_price': new} for pid, _, new in prices])
+        db.session.execute(PriceHistory.__table__.insert(), [
+            {'product_id': pid, 'old_price': old, 'new_price': new, 'changed_at': now, 'notified': False}
+            for pid, old, new in prices])
+    if statuses:
+        db.session.execute(products_table.update().where(products_table.c.id == db.bindparam('b_id')).values(
+            status=db.bindparam('b_status')), [{'b_id': pid, 'b_status': status} for pid, status in statuses])
+    if deletes:
+        delete_derived_rows(deletes)
+        for model in (Favorite, Cart):
+            db.session.execute(model.__table__.delete().where(model.product_id.in_(deletes)))
+        for model in (Review, Order, Message, BrowsingHistory, PriceHistory):
+            db.session.execute(model.__table__.update().where(model.product_id.in_(deletes)).values(product_id=None))
+        db.session.execute(products_table.delete().where(products_table.c.id.in_(deletes)))
+    if changes:
+        record_changes(db.session, 'Product', changes)
+    db.session.commit()
+    return results
@@ -2,57 +2,48 @@ from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db
 from app.buyer import bp
-from app.models import Product, Bounty, User, Review, Order, Favorite, Cart, Message, BrowsingHistory
+from app.replicas import incidental_writes, read_only
+from app.search import filters_from_args, facet_counts
+from app.search_cache import paginate_search
+from app.suggest import get_suggester
+from app.recommend import similar_products, recommend_for_user
+from app.matcher import MATCH_KIND
+from app.trending import get_counters
+from app.history import record_view, history_page
+from app.cart_summary import cart_summary, refresh_cart_summary, set_cart_summary
+from app import batch
+from app.models import Product, Bounty, User, Review, Order, Favorite, Cart, Message, BrowsingHistory, Notification
 from app.forms import BountyForm, ReviewForm, OrderForm, ProfileForm, MessageForm, PriceOfferForm
 from datetime import datetime
-import random
-import string
 
 @bp.route('/')
+@read_only
 def index():
     """
     买家端首页 - 支持搜索、筛选和分页
     """
     # 1. 获取筛选参数
-    query = request.args.get('q', '')
-    category = request.args.get('category', '')
-    min_price = request.args.get('min_price', type=float)
-    max_price = request.args.get('max_price', type=float)
-    sort_by = request.args.get('sort_by', 'latest')  # latest, price_asc, price_desc
+    filters = filters_from_args(request.args)
     page = request.args.get('page', 1, type=int)
     per_page = 12  # 每页显示12个商品
     
-    # 2. 构建查询
-    products_query = Product.query.filter_by(status=1)
-    
-    # 搜索筛选
-    if query:
-        products_query = products_query.filter(Product.title.contains(query))
-    
-    # 分类筛选
-    if category:
-        products_query = products_query.filter_by(category=category)
-    
-    # 价格区间筛选
-    if min_price is not None:
-        products_query = products_query.filter(Product.price >= min_price)
-    if max_price is not None:
-        products_query = products_query.filter(Product.price <= max_price)
-    
-    # 排序
-    if sort_by == 'price_asc':
-        products_query = products_query.order_by(Product.price.asc())
-    elif sort_by == 'price_desc':
-        products_query = products_query.order_by(Product.price.desc())
-    else:  # latest
-        products_query = products_query.order_by(Product.timestamp.desc())
-    
-    # 分页
-    products_pagination = products_query.paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # 2. 搜索、分类、价格区间筛选与排序后分页（热门搜索的结果 id 列表走缓存）
+    products_pagination = paginate_search(filters, page, per_page)
     products = products_pagination.items
     
+    # 有结果的搜索词进入热门搜索补全
+    if filters.q and products_pagination.total:
+        get_suggester().record_query(filters.q)
+    
+    # 分面统计：各分类、各价格区间的商品数
+    facets = facet_counts(filters)
+    
+    # 猜你喜欢：登录用户在未搜索的首页第一页看到
+    recommended = []
+    searching = filters.q or filters.category or filters.min_price is not None or filters.max_price is not None
+    if current_user.is_authenticated and page == 1 and not searching:
+        recommended = recommend_for_user(current_user.id)
+    
     # 3. 悬赏墙逻辑
     bounties = Bounty.query.filter_by(status=0).order_by(Bounty.created_at.desc()).limit(6).all()
     
@@ -70,44 +61,44 @@ def index():
     return render_template('index.html', 
                            products=products,
                            pagination=products_pagination,
-                           query=query,
-                           category=category,
-                           min_price=min_price,
-                           max_price=max_price,
-                           sort_by=sort_by,
+                           query=filters.q,
+                           category=filters.category,
+                           min_price=filters.min_price,
+                           max_price=filters.max_price,
+                           sort_by=filters.sort_by,
                            price_range=price_range,
+                           facets=facets,
+                           recommended=recommended,
                            bounties=bounties,
                            user_count=user_count,
                            product_count=product_count,
                            bounty_count=bounty_count)
 
+@bp.route('/api/suggest')
+@read_only
+def suggest():
+    """搜索框补全：商品标题与热门搜索词，支持拼音首字母"""
+    q = request.args.get('q', '')
+    limit = min(request.args.get('limit', 8, type=int), 20)
+    return jsonify({'q': q, 'suggestions': get_suggester().suggest(q, limit)})
+
 @bp.route('/product/<int:product_id>')
+@read_only(read_your_writes=True)
 def product_detail(product_id):
     """
     商品详情页
     """
     product = Product.query.get_or_404(product_id)
     
+    # 浏览计数只累加在内存里，由后台线程批量落库
+    get_counters().view(product_id)
+    
     # 记录浏览历史（仅登录用户）
     if current_user.is_authenticated:
-        # 检查是否已有浏览记录
-        existing_history = BrowsingHistory.query.filter_by(
-            user_id=current_user.id,
-            product_id=product_id
-        ).first()
-        
-        if existing_history:
-            # 更新浏览时间
-            existing_history.viewed_at = datetime.utcnow()
-        else:
-            # 创建新的浏览记录
-            history = BrowsingHistory(
-                user_id=current_user.id,
-                product_id=product_id
-            )
-            db.session.add(history)
-        
-        db.session.commit()
+        # 已有记录则刷新浏览时间（单条 upsert）；浏览记录不影响之后读从库
+        with incidental_writes(db.session):
+            record_view(current_user.id, product_id)
+            db.session.commit()
     
     # 获取该商品的所有评价
     reviews = product.reviews.order_by(Review.timestamp.desc()).all()
@@ -138,14 +129,19 @@ def product_detail(product_id):
         ).order_by(Message.created_at.asc()).all()
         
         # 标记消息为已读
-        for msg in messages:
-            if msg.receiver_id == current_user.id and not msg.is_read:
-                msg.is_read = True
-        db.session.commit()
+        with incidental_writes(db.session):
+            for msg in messages:
+                if msg.receiver_id == current_user.id and not msg.is_read:
+                    msg.is_read = True
+            db.session.commit()
+    
+    # 相似商品（离线计算的邻居列表，按主键读取）
+    similar = similar_products(product)
     
     return render_template('product_detail.html', 
                          product=product, 
                          reviews=reviews,
+                         similar=similar,
                          is_favorited=is_favorited,
                          has_reviewed=has_reviewed,
                          messages=messages)
@@ -240,6 +236,11 @@ def post_bounty():
         db.session.add(bounty)
         db.session.commit()
         flash('✨ 悬赏发布成功！全校都能看到你的心愿了。', 'success')
+        # 提交时已按悬赏标题匹配过在售商品，有结果就直接带用户去看
+        matched = Notification.query.filter_by(kind=MATCH_KIND, bounty_id=bounty.id).count()
+        if matched:
+            flash(f'🔍 已为你找到 {matched} 件可能符合的在售商品。', 'info')
+            return redirect(url_for('buyer.my_bounties'))
         return redirect(url_for('buyer.index'))
     
     return render_template('post_bounty.html', form=form)
@@ -263,7 +264,7 @@ def buy_product(product_id):
     form = OrderForm()
     if form.validate_on_submit():
         # 生成订单号
-        order_no = ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+        order_no = Order.generate_order_no()
         
         # 创建订单
         order = Order(
@@ -307,34 +308,61 @@ def toggle_favorite(product_id):
         action = '收藏'
     
     db.session.commit()
+    get_counters().favorite(product_id, added=action == '收藏')
     return jsonify({'success': True, 'action': action})
 
+@bp.route('/favorites/batch', methods=['POST'])
+@login_required
+def batch_favorites():
+    """批量收藏/取消收藏：{"action": "add" | "remove", "product_ids": [...]}"""
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    if action not in ('add', 'remove'):
+        return jsonify({'success': False, 'message': '未知操作'})
+    try:
+        product_ids = batch.parse_ids(data.get('product_ids'))
+        if action == 'add':
+            results, changed = batch.add_favorites(current_user.id, product_ids)
+        else:
+            results, changed = batch.remove_favorites(current_user.id, product_ids)
+    except batch.BatchError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    counters = get_counters()
+    for product_id in changed:
+        counters.favorite(product_id, added=action == 'add')
+    return jsonify({'success': True, 'results': results})
+
 @bp.route('/my_favorites')
 @login_required
+@read_only(read_your_writes=True)
 def my_favorites():
     """我的收藏"""
     favorites = Favorite.query.filter_by(user_id=current_user.id).order_by(Favorite.created_at.desc()).all()
     products = [f.product for f in favorites if f.product.status == 1]
     return render_template('my_favorites.html', products=products)
 
+@bp.route('/notifications')
+@login_required
+def notifications():
+    """我的通知（降价提醒、悬赏匹配等），打开即标记已读"""
+    items = Notification.query.filter_by(user_id=current_user.id).order_by(
+        Notification.created_at.desc(), Notification.id.desc()).limit(100).all()
+    unread_ids = {n.id for n in items if not n.is_read}
+    if unread_ids:
+        Notification.query.filter(Notification.id.in_(unread_ids)).update(
+            {'is_read': True}, synchronize_session=False)
+        db.session.commit()
+    return render_template('notifications.html', notifications=items, unread_ids=unread_ids)
+
 @bp.route('/browsing_history')
 @login_required
 def browsing_history():
     """浏览历史"""
-    # 获取最近浏览的商品（去重，按最后浏览时间排序）
-    history_records = db.session.query(BrowsingHistory).filter_by(
-        user_id=current_user.id
-    ).order_by(BrowsingHistory.viewed_at.desc()).all()
-    
-    # 去重：保留每个商品最新的浏览记录
-    seen_products = set()
-    unique_history = []
-    for record in history_records:
-        if record.product_id not in seen_products and record.product.status == 1:
-            seen_products.add(record.product_id)
-            unique_history.append(record)
+    # 最近浏览的在售商品（每个商品唯一一条记录，SQL 中连接过滤并分页）
+    page = request.args.get('page', 1, type=int)
+    pagination = history_page(current_user.id, page)
     
-    return render_template('browsing_history.html', history_records=unique_history)
+    return render_template('browsing_history.html', history_records=pagination.items, pagination=pagination)
 
 @bp.route('/clear_history', methods=['POST'])
 @login_required
@@ -347,6 +375,7 @@ def clear_history():
 
 @bp.route('/my_orders')
 @login_required
+@read_only(read_your_writes=True)
 def my_orders():
     """我的订单"""
     orders = Order.query.filter_by(buyer_id=current_user.id).order_by(Order.created_at.desc()).all()
@@ -498,6 +527,7 @@ def cart():
     # 过滤掉已下架或已售出的商品
     valid_items = [item for item in cart_items if item.product.status == 1]
     total_price = sum([item.product.price * item.quantity for item in valid_items])
+    set_cart_summary(current_user.id, len(valid_items), total_price)
     return render_template('cart.html', cart_items=valid_items, total_price=total_price)
 
 @bp.route('/add_to_cart/<int:product_id>', methods=['POST'])
@@ -530,7 +560,8 @@ def add_to_cart(product_id):
         db.session.add(cart_item)
     
     db.session.commit()
-    return jsonify({'success': True, 'message': '已添加到购物车'})
+    summary = refresh_cart_summary(current_user.id)
+    return jsonify({'success': True, 'message': '已添加到购物车', 'count': summary['count'], 'total': summary['total']})
 
 @bp.route('/remove_from_cart/<int:cart_id>', methods=['POST'])
 @login_required
@@ -544,6 +575,7 @@ def remove_from_cart(cart_id):
     
     db.session.delete(cart_item)
     db.session.commit()
+    refresh_cart_summary(current_user.id)
     flash('已从购物车移除', 'success')
     return redirect(url_for('buyer.cart'))
 
@@ -563,13 +595,39 @@ def update_cart(cart_id):
     cart_item.quantity = quantity
     cart_item.updated_at = datetime.utcnow()
     db.session.commit()
+    summary = refresh_cart_summary(current_user.id)
     
     return jsonify({
         'success': True,
         'quantity': quantity,
-        'subtotal': cart_item.product.price * quantity
+        'subtotal': cart_item.product.price * quantity,
+        'count': summary['count'],
+        'total': summary['total']
     })
 
+@bp.route('/cart/batch', methods=['POST'])
+@login_required
+def batch_cart():
+    """批量操作购物车：
+    {"action": "add", "product_ids": [...]}、{"action": "update", "items": [{"cart_id", "quantity"}]}、
+    {"action": "remove", "cart_ids": [...]}
+    """
+    data = request.get_json(silent=True) or {}
+    action = data.get('action')
+    try:
+        if action == 'add':
+            results = batch.add_to_cart(current_user.id, batch.parse_ids(data.get('product_ids')))
+        elif action == 'update':
+            results = batch.update_cart(current_user.id, data.get('items'))
+        elif action == 'remove':
+            results = batch.remove_from_cart(current_user.id, batch.parse_ids(data.get('cart_ids')))
+        else:
+            return jsonify({'success': False, 'message': '未知操作'})
+    except batch.BatchError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    summary = refresh_cart_summary(current_user.id)
+    return jsonify({'success': True, 'results': results, 'count': summary['count'], 'total': summary['total']})
+
 @bp.route('/cart/checkout', methods=['GET', 'POST'])
 @login_required
 def cart_checkout():
@@ -586,7 +644,7 @@ def cart_checkout():
         # 为每个商品创建订单
         order_nos = []
         for item in valid_items:
-            order_no = ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+            order_no = Order.generate_order_no()
             order = Order(
                 order_no=order_no,
                 buyer_id=current_user.id,
@@ -605,6 +663,7 @@ def cart_checkout():
             order_nos.append(order_no)
         
         db.session.commit()
+        refresh_cart_summary(current_user.id)
         flash(f'✅ 成功创建 {len(order_nos)} 个订单！', 'success')
         return redirect(url_for('buyer.my_orders'))
     
@@ -614,9 +673,9 @@ def cart_checkout():
 @bp.route('/cart/count')
 @login_required
 def cart_count():
-    """获取购物车商品数量（用于AJAX）"""
-    count = Cart.query.filter_by(user_id=current_user.id).count()
-    return jsonify({'count': count})
+    """获取购物车商品数量（用于AJAX，读 session 中的摘要）"""
+    summary = cart_summary()
+    return jsonify({'count': summary['count'], 'total': summary['total']})
 
 @bp.route('/messages')
 @login_required
@@ -792,7 +851,7 @@ def create_bounty_order(bounty_id):
         return jsonify({'success': False, 'message': '请填写完整的收货信息'})
     
     # 生成订单号
-    order_no = ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+    order_no = Order.generate_order_no()
     
     # 创建订单
     order = Order(
@@ -834,9 +893,23 @@ def my_bounties():
     # 我接单的悬赏
     accepted_bounties = Bounty.query.filter_by(accepter_id=current_user.id).order_by(Bounty.accepted_at.desc()).all()
     
+    # 待接单悬赏匹配到的在售商品，看过即标记已读
+    matches = {}
+    notifications = Notification.query.filter_by(user_id=current_user.id, kind=MATCH_KIND).join(
+        Notification.product).filter(Product.status == 1).order_by(Notification.created_at.desc()).all()
+    for n in notifications:
+        matches.setdefault(n.bounty_id, []).append(n)
+    unread = [n for n in notifications if not n.is_read]
+    if unread:
+        for n in unread:
+            n.is_read = True
+        db.session.commit()
+    
     return render_template('my_bounties.html',
                          posted_bounties=posted_bounties,
-                         accepted_bounties=accepted_bounties)
+                         accepted_bounties=accepted_bounties,
+                         matches=matches,
+                         unread_ids={n.id for n in unread})
 
 @bp.route('/cancel_bounty/<int:bounty_id>', methods=['POST'])
 @login_required
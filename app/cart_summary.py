@@ -0,0 +1,51 @@
+"""
+购物车摘要（件数与合计金额）
+
+- 摘要存在签名 session 里，按用户区分，页面渲染时由上下文处理器注入 cart_summary，
+  导航栏角标直接输出，不再每个页面额外请求 /cart/count；
+- 加购、移除、改数量、结算之后调用 refresh_cart_summary 重新统计（一条聚合查询）；
+- 商品被别人买走、改价等不经过本人购物车的变化，靠 CART_SUMMARY_TTL 秒后重新统计收敛。
+"""
+import time
+
+from flask import current_app, session
+from flask_login import current_user
+
+from app import db
+from app.models import Cart, Product
+
+SESSION_KEY = 'cart_summary'
+
+
+def refresh_cart_summary(user_id):
+    """重新统计购物车中在售商品的件数与合计，写回 session 并返回"""
+    count, total = db.session.query(
+        db.func.count(Cart.id), db.func.coalesce(db.func.sum(Product.price * Cart.quantity), 0)
+    ).join(Product, Product.id == Cart.product_id).filter(
+        Cart.user_id == user_id, Product.status == 1
+    ).one()
+    return set_cart_summary(user_id, count, total)
+
+
+def set_cart_summary(user_id, count, total):
+    """已经算好件数与合计时（如购物车页）直接写入，省去一次查询"""
+    summary = {'user_id': user_id, 'count': count, 'total': round(float(total), 2), 'at': time.time()}
+    session[SESSION_KEY] = summary
+    return summary
+
+
+def cart_summary():
+    """当前用户的购物车摘要；未登录返回 None"""
+    if not current_user.is_authenticated:
+        return None
+    summary = session.get(SESSION_KEY)
+    if (summary is None or summary.get('user_id') != current_user.id
+            or time.time() - summary.get('at', 0) > current_app.config['CART_SUMMARY_TTL']):
+        summary = refresh_cart_summary(current_user.id)
+    return summary
+
+
+def init_cart_summary(app):
+    @app.context_processor
+    def _inject_cart_summary():
+        return {'cart_summary': cart_summary()}
@@ -0,0 +1,42 @@
+"""
+动态响应压缩
+
+HTML / JSON 等文本响应超过 COMPRESS_MIN_SIZE 字节时，按 Accept-Encoding 用 brotli（需要安装）或 gzip 压缩。
+send_file 发出的文件（静态资源、图片代理）和流式响应不经过这里：静态资源已有预压缩版本（见 app/assets.py）。
+"""
+import gzip
+
+from flask import current_app, request
+
+from app.assets import brotli
+
+
+def _compress(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESS_BR_QUALITY'])
+    return gzip.compress(data, compresslevel=config['COMPRESS_LEVEL'], mtime=0)
+
+
+def compress_response(response):
+    config = current_app.config
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in config['COMPRESS_MIMETYPES']):
+        return response
+    if response.calculate_content_length() < config['COMPRESS_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if encoding is None:
+        return response
+    response.set_data(_compress(response.get_data(), encoding, config))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)  # 编码后的字节与原文不同，强校验值不再成立
+    return response
+
+
+def init_compress(app):
+    app.after_request(compress_response)
@@ -0,0 +1,103 @@
+"""
+模型变更事件：事务提交成功后广播商品 / 悬赏的增删改，供搜索补全、结果缓存等内存索引增量更新
+
+接收方式：
+    from app.events import product_changed
+
+    @product_changed.connect
+    def on_product_changed(app, changes):
+        for change in changes:   # Change(op, id, old, new)
+            ...
+op 为 'insert' / 'update' / 'delete'；old / new 是 TRACKED 中所列字段的取值字典（插入时 old 为 None，删除时 new 为 None）
+"""
+from collections import namedtuple
+
+from blinker import Namespace
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+
+from app.models import Product, Bounty
+from app.replicas import RoutingSession
+
+_signals = Namespace()
+product_changed = _signals.signal('product-changed')
+bounty_changed = _signals.signal('bounty-changed')
+
+Change = namedtuple('Change', ['op', 'id', 'old', 'new'])
+
+# 模型名 -> (信号, 需要跟踪的字段)
+TRACKED = {
+    'Product': (product_changed, ('title', 'price', 'category', 'status', 'seller_id')),
+    'Bounty': (bounty_changed, ('title', 'desc', 'budget', 'status', 'user_id')),
+}
+
+
+def _noop(target, value, oldvalue, initiator):
+    pass
+
+
+# 对象过期（例如 commit 之后）再赋值时，SQLAlchemy 默认不加载旧值；
+# 打开 active_history，保证变更里的 old 是真正的旧值
+for _model in (Product, Bounty):
+    for _field in TRACKED[_model.__name__][1]:
+        event.listen(getattr(_model, _field), 'set', _noop, active_history=True)
+
+
+def _snapshot(obj, fields, use_old=False):
+    state = inspect(obj)
+    values = {}
+    for name in fields:
+        if use_old:
+            history = state.attrs[name].history
+            if history.deleted:
+                values[name] = history.deleted[0]
+                continue
+        values[name] = getattr(obj, name)
+    return values
+
+
+def record_changes(db_session, model_name, changes):
+    """登记不经过 ORM flush 的变更（例如 Core 批量 UPDATE），提交后与其他变更一起广播"""
+    pending = db_session.info.setdefault('model_changes', {})
+    pending.setdefault(model_name, []).extend(changes)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _collect_changes(db_session, flush_context):
+    for op, objects in (('insert', db_session.new), ('update', db_session.dirty),
+                        ('delete', db_session.deleted)):
+        for obj in objects:
+            model_name = type(obj).__name__
+            if model_name not in TRACKED:
+                continue
+            fields = TRACKED[model_name][1]
+            if op == 'insert':
+                change = Change(op, obj.id, None, _snapshot(obj, fields))
+            elif op == 'delete':
+                change = Change(op, obj.id, _snapshot(obj, fields, use_old=True), None)
+            else:
+                old = _snapshot(obj, fields, use_old=True)
+                new = _snapshot(obj, fields)
+                if old == new:
+                    continue
+                change = Change(op, obj.id, old, new)
+            record_changes(db_session, model_name, [change])
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _send_changes(db_session):
+    pending = db_session.info.pop('model_changes', None)
+    if not pending or not has_app_context():
+        return
+    app = current_app._get_current_object()
+    for model_name, changes in pending.items():
+        # 事务已经提交，接收方出错只记日志，不能从 commit() 里抛出去
+        try:
+            TRACKED[model_name][0].send(app, changes=changes)
+        except Exception:
+            app.logger.exception('%s change handler failed', model_name)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _drop_changes(db_session):
+    db_session.info.pop('model_changes', None)
@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, PasswordField, SubmitField, FloatField, SelectField, TextAreaField, IntegerField, EmailField
 from wtforms.validators import DataRequired, Length, NumberRange, Optional
 
@@ -21,8 +22,8 @@ class ProductForm(FlaskForm):
         ('creative', '校园文创 (设计)'), 
         ('agri', '助农特产 (食品)')
     ])
-    # 模拟图片上传，实际项目用FileField，这里填URL演示方便
-    image_url = StringField('图片链接 (可留空用默认图)')
+    image_file = FileField('上传图片', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp'], '只支持图片文件')])
+    image_url = StringField('或填写图片链接 (都留空用默认图)')
     desc = TextAreaField('商品描述 / 产地 / 新旧程度')
     submit = SubmitField('立即发布')
 
@@ -0,0 +1,91 @@
+"""
+浏览历史：写入、分页查询与保留策略
+
+- (user_id, product_id) 唯一，重复浏览只刷新 viewed_at（SQLite upsert）；
+- 历史页在 SQL 里与在售商品连接并分页，不再把用户的全部记录取回 Python 去重过滤；
+- 清理任务（随 flask sweep 执行）：删除超过 BROWSING_HISTORY_TTL_DAYS 的记录，
+  每个用户只保留最近 BROWSING_HISTORY_MAX_PER_USER 条，均按 BROWSING_HISTORY_PRUNE_BATCH 分批提交。
+"""
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.models import BrowsingHistory, Product
+
+
+def record_view(user_id, product_id, now=None):
+    """记录一次浏览（调用方负责提交）"""
+    table = BrowsingHistory.__table__
+    stmt = sqlite_insert(table).values(user_id=user_id, product_id=product_id, viewed_at=now or datetime.utcnow())
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.user_id, table.c.product_id],
+                                      set_={'viewed_at': stmt.excluded.viewed_at})
+    db.session.execute(stmt)
+
+
+def history_page(user_id, page, per_page=24):
+    """用户浏览过的在售商品，按最近浏览时间倒序分页"""
+    return (
+        BrowsingHistory.query.join(BrowsingHistory.product)
+        .filter(BrowsingHistory.user_id == user_id, Product.status == 1)
+        .options(db.contains_eager(BrowsingHistory.product))
+        .order_by(BrowsingHistory.viewed_at.desc())
+        .paginate(page=page, per_page=per_page, error_out=False)
+    )
+
+
+def _expired_ids(cutoff, batch):
+    return db.select(BrowsingHistory.id).where(BrowsingHistory.viewed_at < cutoff).order_by(
+        BrowsingHistory.viewed_at).limit(batch)
+
+
+def _over_cap_ids(user_ids, cap):
+    ranked = db.select(
+        BrowsingHistory.id,
+        db.func.row_number().over(
+            partition_by=BrowsingHistory.user_id,
+            order_by=(BrowsingHistory.viewed_at.desc(), BrowsingHistory.id.desc()),
+        ).label('rn'),
+    ).where(BrowsingHistory.user_id.in_(user_ids)).subquery()
+    return db.select(ranked.c.id).where(ranked.c.rn > cap)
+
+
+def prune_history(now=None, dry_run=False):
+    """按保留期与每人上限清理浏览历史，返回 {'history_expired': 条数, 'history_capped': 条数}"""
+    config = current_app.config
+    now = now or datetime.utcnow()
+    cutoff = now - timedelta(days=config['BROWSING_HISTORY_TTL_DAYS'])
+    cap = config['BROWSING_HISTORY_MAX_PER_USER']
+    batch = config['BROWSING_HISTORY_PRUNE_BATCH']
+    table = BrowsingHistory.__table__
+
+    expired = 0
+    if dry_run:
+        expired = db.session.query(db.func.count(BrowsingHistory.id)).filter(
+            BrowsingHistory.viewed_at < cutoff).scalar()
+    else:
+        while True:
+            deleted = db.session.execute(table.delete().where(table.c.id.in_(_expired_ids(cutoff, batch)))).rowcount
+            db.session.commit()
+            expired += deleted
+            if deleted < batch:
+                break
+
+    # 超出上限的用户：沿 (user_id, viewed_at) 索引分组计数，再按用户分批删除多出的旧记录
+    heavy = db.session.query(BrowsingHistory.user_id, db.func.count(BrowsingHistory.id)).group_by(
+        BrowsingHistory.user_id).having(db.func.count(BrowsingHistory.id) > cap).all()
+    capped = 0
+    if dry_run:
+        capped = sum(count - cap for _, count in heavy)
+    else:
+        users, rows = [], 0
+        for i, (user_id, count) in enumerate(heavy):
+            users.append(user_id)
+            rows += count - cap
+            if rows >= batch or i == len(heavy) - 1:
+                capped += db.session.execute(table.delete().where(
+                    table.c.id.in_(_over_cap_ids(users, cap)))).rowcount
+                db.session.commit()
+                users, rows = [], 0
+    return {'history_expired': expired, 'history_capped': capped}
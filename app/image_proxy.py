@@ -0,0 +1,255 @@
+"""
+外部图片代理：/img/<尺寸名>?url=...
+
+- 只代理 IMAGE_PROXY_HOSTS 中的站点（重定向后的地址同样检查），其余请求一律 404；
+- 第一次请求时下载原图（不超过 IMAGE_PROXY_MAX_BYTES），按 UPLOAD_THUMBNAIL_SIZES 缩放后写入磁盘缓存；
+  SVG（dicebear 头像等）和 Pillow 未安装时原样缓存；
+- 磁盘缓存以 (尺寸, 地址) 的哈希命名，按修改时间做 LRU：命中时刷新时间，总量超过 IMAGE_PROXY_CACHE_BYTES
+  就从最久未用的文件删起；
+- 响应带 ETag 与 IMAGE_PROXY_MAX_AGE 秒的 Cache-Control，浏览器复验时直接返回 304；
+- 源站出错时 302 到原地址，页面照常显示；同时留下失败标记，IMAGE_PROXY_FAILURE_TTL 秒内同一张图
+  直接跳转，不再每次请求都等一遍超时。
+
+模板里统一用 {{ url | thumb('sm') }}：本站上传的图片取缩略图，允许代理的外部图片改写为代理地址。
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlsplit
+
+from flask import Blueprint, abort, current_app, redirect, request, send_file, url_for
+
+from app.uploads import Image, thumb_url, thumbnail_format
+
+bp = Blueprint('image_proxy', __name__)
+
+_CONTENT_TYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp',
+                  'svg': 'image/svg+xml'}
+
+
+class ProxyError(Exception):
+    """源站不可用或返回的不是图片"""
+
+
+def is_allowed(url, hosts):
+    parts = urlsplit(url)
+    return parts.scheme in ('http', 'https') and parts.hostname in hosts
+
+
+class _CheckedRedirects(urllib.request.HTTPRedirectHandler):
+    def __init__(self, hosts):
+        self.hosts = hosts
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        if not is_allowed(newurl, self.hosts):
+            raise ProxyError(f'redirect to disallowed host: {newurl}')
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def fetch(url, hosts, timeout, max_bytes):
+    """下载图片，返回 (内容, 扩展名)"""
+    opener = urllib.request.build_opener(_CheckedRedirects(hosts))
+    req = urllib.request.Request(url, headers={'User-Agent': 'CampusMarket-ImageProxy/1.0'})
+    try:
+        with opener.open(req, timeout=timeout) as resp:
+            content_type = resp.headers.get_content_type()
+            data = resp.read(max_bytes + 1)
+    except (OSError, urllib.error.URLError) as e:
+        raise ProxyError(str(e)) from e
+    if len(data) > max_bytes:
+        raise ProxyError('image too large')
+    ext = next((ext for ext, ctype in _CONTENT_TYPES.items() if ctype == content_type), None)
+    if ext is None:
+        raise ProxyError(f'not an image: {content_type}')
+    return data, ext
+
+
+def resize(data, ext, edge, quality):
+    """缩放到最长边 edge；SVG 或没有 Pillow 时原样返回"""
+    if Image is None or ext == 'svg':
+        return data, ext
+    out_ext, fmt = thumbnail_format()
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft('RGB', (edge, edge))
+        if img.mode not in ('RGB', 'RGBA') or (fmt == 'JPEG' and img.mode == 'RGBA'):
+            img = img.convert('RGB')
+        img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        buf = io.BytesIO()
+        img.save(buf, fmt, quality=quality)
+    return buf.getvalue(), out_ext
+
+
+class DiskLRU:
+    """按修改时间淘汰的磁盘缓存，多进程共用同一目录"""
+
+    TOUCH_INTERVAL = 3600  # 命中时最多每小时刷新一次修改时间，避免每次都写元数据
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.size = None  # 懒统计；本进程写入时累加，超限时重新扫描目录
+
+    def path(self, key, ext):
+        return os.path.join(self.folder, key[:2], f'{key}.{ext}')
+
+    def get(self, key):
+        """返回 (路径, 扩展名)，未缓存返回 None"""
+        subdir = os.path.join(self.folder, key[:2])
+        for ext in _CONTENT_TYPES:
+            path = os.path.join(subdir, f'{key}.{ext}')
+            try:
+                mtime = os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if time.time() - mtime > self.TOUCH_INTERVAL:
+                os.utime(path)
+            return path, ext
+        return None
+
+    def failed(self, key, ttl):
+        """ttl 秒内下载失败过"""
+        try:
+            return time.time() - os.stat(self.path(key, 'failed')).st_mtime < ttl
+        except FileNotFoundError:
+            return False
+
+    def mark_failed(self, key):
+        path = self.path(key, 'failed')
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb'):
+            pass
+        os.utime(path)
+
+    def key_lock(self, key):
+        """同一张图同时只下载一次"""
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    def release(self, key):
+        with self.lock:
+            self.key_locks.pop(key, None)
+
+    def put(self, key, data, ext):
+        path = self.path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{os.getpid()}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self.lock:
+            if self.size is None:
+                self.size = self._scan_size()
+            else:
+                self.size += len(data)
+            if self.size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _entries(self):
+        for root, _, files in os.walk(self.folder):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield st.st_mtime, st.st_size, path
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """删到上限的 90%，留出余量，避免每次写入都触发扫描"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+
+
+def get_cache(app=None):
+    app = app or current_app._get_current_object()
+    cache = app.extensions.get('image_proxy')
+    if cache is None:
+        cache = app.extensions.setdefault('image_proxy', DiskLRU(
+            app.config['IMAGE_PROXY_CACHE_DIR'], app.config['IMAGE_PROXY_CACHE_BYTES']))
+    return cache
+
+
+def cache_key(size, url):
+    return hashlib.sha256(f'{size}\n{url}'.encode()).hexdigest()
+
+
+@bp.route('/img/<size>')
+def proxy(size):
+    config = current_app.config
+    url = request.args.get('url', '')
+    sizes = config['UPLOAD_THUMBNAIL_SIZES']
+    hosts = config['IMAGE_PROXY_HOSTS']
+    if size not in sizes or not is_allowed(url, hosts):
+        abort(404)
+
+    cache = get_cache()
+    key = cache_key(size, url)
+    failure_ttl = config['IMAGE_PROXY_FAILURE_TTL']
+    hit = cache.get(key)
+    if hit is None:
+        if cache.failed(key, failure_ttl):
+            return redirect(url)
+        try:
+            with cache.key_lock(key):
+                hit = cache.get(key)
+                if hit is None:
+                    if cache.failed(key, failure_ttl):  # 等锁期间别的请求刚失败过
+                        return redirect(url)
+                    data, ext = fetch(url, hosts, config['IMAGE_PROXY_TIMEOUT'], config['IMAGE_PROXY_MAX_BYTES'])
+                    data, ext = resize(data, ext, sizes[size], config['UPLOAD_THUMBNAIL_QUALITY'])
+                    hit = cache.put(key, data, ext), ext
+        except Exception as e:
+            current_app.logger.warning('image proxy failed for %s: %s', url, e)
+            try:
+                cache.mark_failed(key)
+            except OSError:
+                pass
+            return redirect(url)
+        finally:
+            cache.release(key)
+
+    path, ext = hit
+    # 缓存文件的修改时间会因 LRU 刷新而变，ETag 用内容无关的缓存键
+    response = send_file(path, mimetype=_CONTENT_TYPES[ext], etag=key, max_age=config['IMAGE_PROXY_MAX_AGE'],
+                         conditional=True)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    # SVG 被直接打开时也不允许执行脚本
+    response.headers['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+    return response
+
+
+def image_url(url, size='sm'):
+    """模板过滤器 thumb：本站上传的图片取缩略图，允许代理的外部图片改写为代理地址，其余原样返回"""
+    if url and is_allowed(url, current_app.config['IMAGE_PROXY_HOSTS']):
+        if size in current_app.config['UPLOAD_THUMBNAIL_SIZES']:
+            return url_for('image_proxy.proxy', size=size, url=url)
+        return url
+    return thumb_url(url, size)
+
+
+def init_image_proxy(app):
+    app.register_blueprint(bp)
+    app.add_template_filter(image_url, 'thumb')
@@ -0,0 +1,242 @@
+"""
+悬赏 ↔ 商品匹配
+
+- 待接单悬赏（status 0）的标题切成词项（中文按双字、英文与数字按词），作为常驻查询建倒排索引；
+- 商品新增或改了标题 / 价格 / 上架状态时，用商品标题的词项查倒排表，只检查命中过词项的悬赏：
+  悬赏词项被覆盖的比例达到 BOUNTY_MATCH_MIN_OVERLAP，且价格不超过预算的 (1 + BOUNTY_MATCH_BUDGET_TOLERANCE) 倍；
+- 新发布（或修改）的悬赏反向查一次已有在售商品；
+- 匹配结果写入 notifications（kind='bounty_match'），同一悬赏与商品只提醒一次；
+- 其他进程发布 / 接单的悬赏靠轮询发现：每 BOUNTY_MATCH_REFRESH_SECONDS 秒比较一次待接单悬赏的
+  (最大 id, 条数, id 之和)，变化时整体重建（待接单悬赏不多，重建很便宜）。
+
+处理函数挂在 product_changed / bounty_changed 上，在提交之后执行，此时 db.session 不能再发 SQL，
+因此读写都用独立的 engine 连接。
+"""
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app import db
+from app.events import bounty_changed, product_changed
+from app.models import Bounty, Notification, Product
+
+# 悬赏标题里的客套话与成色描述，不参与匹配
+STOPWORDS = ['有没有', '求购', '想要', '想买', '收一', '蹲一', '求一', '二手', '全新', '一个', '一台', '一本', '一双']
+
+_TERM_RE = re.compile(r'[a-z]+|[0-9]+|[一-鿿]+')
+
+MATCH_KIND = 'bounty_match'
+
+
+def match_terms(text):
+    """'求购 iPhone13 自行车' -> {'iphone', '13', '自行', '行车'}"""
+    text = (text or '').lower()
+    for word in STOPWORDS:
+        text = text.replace(word, ' ')
+    terms = set()
+    for token in _TERM_RE.findall(text):
+        if '一' <= token[0] <= '鿿':
+            if len(token) == 1:
+                terms.add(token)
+            terms.update(token[i:i + 2] for i in range(len(token) - 1))
+        elif len(token) >= 2 or token.isdigit():
+            terms.add(token)
+    return frozenset(terms)
+
+
+def is_match(bounty_terms, product_terms, budget, price, min_overlap, tolerance):
+    if not bounty_terms:
+        return False
+    if len(bounty_terms & product_terms) / len(bounty_terms) < min_overlap:
+        return False
+    return budget is None or price is None or price <= budget * (1 + tolerance)
+
+
+class BountyMatcher:
+    """待接单悬赏的倒排索引，线程安全"""
+
+    def __init__(self, min_overlap, tolerance, refresh_seconds=30):
+        self.min_overlap = min_overlap
+        self.tolerance = tolerance
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()
+        self.bounties = {}   # 悬赏 id -> (词项, 预算, 发布者, 标题)
+        self.postings = {}   # 词项 -> {悬赏 id}
+        self.built = False
+        self.version = None
+        self.next_check = 0.0
+
+    def ensure_built(self, conn):
+        """首次使用时建索引；之后到期检查待接单悬赏的版本，其他进程改过则重建"""
+        now = time.monotonic()
+        with self.lock:
+            if self.built and now < self.next_check:
+                return
+            self.next_check = now + self.refresh_seconds
+            version = tuple(conn.execute(
+                db.select(db.func.max(Bounty.id), db.func.count(Bounty.id), db.func.sum(Bounty.id))
+                .where(Bounty.status == 0)).one())
+            if self.built and version == self.version:
+                return
+            self.bounties, self.postings = {}, {}
+            rows = conn.execute(db.select(Bounty.id, Bounty.title, Bounty.budget, Bounty.user_id)
+                                .where(Bounty.status == 0))
+            for bounty_id, title, budget, user_id in rows:
+                self._add(bounty_id, title, budget, user_id)
+            self.version = version
+            self.built = True
+
+    def _add(self, bounty_id, title, budget, user_id):
+        self._remove(bounty_id)
+        terms = match_terms(title)
+        self.bounties[bounty_id] = (terms, budget, user_id, title)
+        for term in terms:
+            self.postings.setdefault(term, set()).add(bounty_id)
+
+    def _remove(self, bounty_id):
+        entry = self.bounties.pop(bounty_id, None)
+        if entry is None:
+            return
+        for term in entry[0]:
+            ids = self.postings.get(term)
+            if ids is not None:
+                ids.discard(bounty_id)
+                if not ids:
+                    del self.postings[term]
+
+    def add(self, bounty_id, title, budget, user_id):
+        with self.lock:
+            self._add(bounty_id, title, budget, user_id)
+
+    def remove(self, bounty_id):
+        with self.lock:
+            self._remove(bounty_id)
+
+    def match_product(self, title, price, seller_id):
+        """返回与该商品匹配的 [(悬赏 id, 发布者, 悬赏标题)]"""
+        terms = match_terms(title)
+        with self.lock:
+            hits = Counter()
+            for term in terms:
+                hits.update(self.postings.get(term, ()))
+            matched = []
+            for bounty_id in hits:
+                bounty_terms, budget, user_id, bounty_title = self.bounties[bounty_id]
+                if user_id != seller_id and is_match(bounty_terms, terms, budget, price,
+                                                     self.min_overlap, self.tolerance):
+                    matched.append((bounty_id, user_id, bounty_title))
+            return matched
+
+
+def get_matcher(app=None):
+    app = app or current_app
+    matcher = app.extensions.get('bounty_matcher')
+    if matcher is None:
+        matcher = app.extensions.setdefault('bounty_matcher', BountyMatcher(
+            app.config['BOUNTY_MATCH_MIN_OVERLAP'], app.config['BOUNTY_MATCH_BUDGET_TOLERANCE'],
+            app.config['BOUNTY_MATCH_REFRESH_SECONDS']))
+    return matcher
+
+
+def find_products(conn, title, budget, user_id, min_overlap, tolerance, limit=20, scan=500):
+    """为一条悬赏查找已有的在售商品：先用任一词项的 LIKE 粗筛最近 scan 件，再按覆盖率精筛"""
+    terms = match_terms(title)
+    if not terms:
+        return []
+    query = db.select(Product.id, Product.title, Product.price).where(
+        Product.status == 1,
+        Product.seller_id != user_id,
+        db.or_(*[Product.title.contains(term) for term in terms]),
+    )
+    if budget is not None:
+        query = query.where(Product.price <= budget * (1 + tolerance))
+    query = query.order_by(Product.timestamp.desc()).limit(scan)
+    matched = []
+    for product_id, product_title, price in conn.execute(query):
+        if is_match(terms, match_terms(product_title), budget, price, min_overlap, tolerance):
+            matched.append((product_id, product_title))
+            if len(matched) >= limit:
+                break
+    return matched
+
+
+def save_matches(conn, matches):
+    """
+    matches 为 [(悬赏 id, 发布者, 悬赏标题, 商品 id, 商品标题)]，已提醒过的跳过
+    同一事务里先插入再修改的商品会带来重复的配对，别的 worker 也可能同时写入同一对，
+    因此先在本批内去重，再靠 (kind, bounty_id, product_id) 唯一约束忽略已存在的行
+    """
+    now = datetime.utcnow()
+    rows = {}
+    for bounty_id, user_id, bounty_title, product_id, product_title in matches:
+        rows.setdefault((bounty_id, product_id), {
+            'user_id': user_id, 'kind': MATCH_KIND, 'bounty_id': bounty_id, 'product_id': product_id,
+            'message': f'你的悬赏「{bounty_title}」有匹配的商品：{product_title}',
+            'is_read': False, 'created_at': now})
+    if not rows:
+        return 0
+    result = conn.execute(sqlite_insert(Notification.__table__).on_conflict_do_nothing(), list(rows.values()))
+    return result.rowcount
+
+
+@product_changed.connect
+def _on_product_changed(app, changes):
+    # 在 commit() 之后执行：匹配失败只记日志，不能让已经成功的写请求报错
+    try:
+        _match_products(app, changes)
+    except Exception:
+        app.logger.exception('bounty matching failed for product changes')
+
+
+@bounty_changed.connect
+def _on_bounty_changed(app, changes):
+    try:
+        _match_bounties(app, changes)
+    except Exception:
+        app.logger.exception('bounty matching failed for bounty changes')
+
+
+def _match_products(app, changes):
+    relevant = []
+    for change in changes:
+        new, old = change.new, change.old
+        if new is None or new['status'] != 1:
+            continue
+        if old is not None and old['status'] == 1 and old['title'] == new['title'] and old['price'] == new['price']:
+            continue
+        relevant.append(change)
+    if not relevant:
+        return
+    matcher = get_matcher(app)
+    with db.engine.begin() as conn:
+        matcher.ensure_built(conn)
+        matches = [
+            (bounty_id, user_id, bounty_title, change.id, change.new['title'])
+            for change in relevant
+            for bounty_id, user_id, bounty_title in matcher.match_product(
+                change.new['title'], change.new['price'], change.new['seller_id'])
+        ]
+        save_matches(conn, matches)
+
+
+def _match_bounties(app, changes):
+    matcher = get_matcher(app)
+    config = app.config
+    with db.engine.begin() as conn:
+        matcher.ensure_built(conn)
+        for change in changes:
+            new, old = change.new, change.old
+            if new is None or new['status'] != 0:
+                matcher.remove(change.id)
+                continue
+            matcher.add(change.id, new['title'], new['budget'], new['user_id'])
+            if old is not None and old['status'] == 0 and old['title'] == new['title'] and old['budget'] == new['budget']:
+                continue
+            products = find_products(conn, new['title'], new['budget'], new['user_id'],
+                                     config['BOUNTY_MATCH_MIN_OVERLAP'], config['BOUNTY_MATCH_BUDGET_TOLERANCE'])
+            save_matches(conn, [(change.id, new['user_id'], new['title'], pid, title) for pid, title in products])
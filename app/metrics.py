@@ -0,0 +1,421 @@
+"""
+请求性能指标：按视图统计延迟分布、SQL 耗时占比、模板渲染耗时与响应大小
+
+- 每个 (endpoint, method) 一组统计，延迟用对数-线性分桶的直方图（HDR 风格）记录：
+  每个 2 的幂区间再均分 32 份，相对误差约 3%，记录一次只是一次整数运算加一次字典累加；
+- SQL 耗时由引擎的 before/after_cursor_execute 事件累加到当前请求；模板耗时由 Flask 的模板信号累加
+  （模板里触发的延迟加载查询同时计入两者）；响应大小取压缩后的 Content-Length；
+- 每个进程在内存里累计，后台线程每 METRICS_FLUSH_INTERVAL 秒把快照写到 METRICS_DIR/<pid>.json，
+  导出时合并目录下所有进程的快照（直方图按桶相加即可合并），gunicorn 多 worker 时看到的是整体数据；
+  超过 STALE_FLUSHES 个写入间隔未更新的快照（进程已退出，如 max_requests 轮换）在合并时删除；
+- 清零写入 METRICS_DIR/reset（清零时间），各进程写快照前检查到更新的清零时间即丢弃自己的累计值，
+  合并时也跳过清零之前的快照，所有 worker 一起清零；
+- /metrics 以 Prometheus 文本格式导出，只允许 METRICS_ALLOWED_IPS 访问；/admin/performance 是管理员看的汇总表。
+"""
+import atexit
+import json
+import os
+import threading
+import time
+
+from flask import Blueprint, Response, abort, current_app, g, has_request_context, request
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+bp = Blueprint('metrics', __name__)
+
+PREFIX = 'campus_market'
+
+# Prometheus 直方图的桶上界（秒），由精细分桶在导出时折算
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+RESET_FILE = 'reset'
+
+# 快照这么多个写入间隔没有更新，视为进程已退出
+STALE_FLUSHES = 4
+
+
+class Histogram:
+    """对数-线性分桶直方图，值为非负整数（这里是微秒）"""
+
+    SUB_BITS = 6
+    SUB = 1 << SUB_BITS   # 小于 SUB 的值每个值一个桶
+    HALF = SUB >> 1       # 之后每个 2 的幂区间 HALF 个桶
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def index(cls, value):
+        if value < cls.SUB:
+            return value
+        shift = value.bit_length() - cls.SUB_BITS
+        return cls.SUB + (shift - 1) * cls.HALF + (value >> shift) - cls.HALF
+
+    @classmethod
+    def bounds(cls, index):
+        """桶 index 覆盖的区间 [下界, 上界)"""
+        if index < cls.SUB:
+            return index, index + 1
+        shift, offset = divmod(index - cls.SUB, cls.HALF)
+        mantissa = offset + cls.HALF
+        return mantissa << (shift + 1), (mantissa + 1) << (shift + 1)
+
+    def record(self, value):
+        i = self.index(value)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in other.counts.items():
+            self.counts[i] = self.counts.get(i, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, q):
+        """第 q 分位（0~1）所在桶的上界，不超过最大值"""
+        if not self.count:
+            return 0
+        rank = q * self.count
+        seen = 0
+        for i in sorted(self.counts):
+            seen += self.counts[i]
+            if seen >= rank:
+                return min(self.bounds(i)[1] - 1, self.max)
+        return self.max
+
+    def cumulative(self, limits):
+        """每个上界 limit 以内（桶上界不超过 limit）的累计个数"""
+        result = [0] * len(limits)
+        for i, n in self.counts.items():
+            upper = self.bounds(i)[1] - 1
+            for j, limit in enumerate(limits):
+                if upper <= limit:
+                    result[j] += n
+        return result
+
+    def to_dict(self):
+        return {'counts': dict(self.counts), 'count': self.count, 'total': self.total, 'max': self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        h = cls()
+        h.counts = {int(i): n for i, n in data['counts'].items()}
+        h.count, h.total, h.max = data['count'], data['total'], data['max']
+        return h
+
+
+class EndpointStats:
+    """一个 (endpoint, method) 的累计值；耗时单位为微秒"""
+
+    FIELDS = ('sql_us', 'sql_queries', 'template_us', 'response_bytes', 'errors')
+
+    __slots__ = ('latency',) + FIELDS
+
+    def __init__(self):
+        self.latency = Histogram()
+        for name in self.FIELDS:
+            setattr(self, name, 0)
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        for name in self.FIELDS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def to_dict(self):
+        return dict({name: getattr(self, name) for name in self.FIELDS}, latency=self.latency.to_dict())
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name in cls.FIELDS:
+            setattr(stats, name, data.get(name, 0))
+        stats.latency = Histogram.from_dict(data['latency'])
+        return stats
+
+
+class Metrics:
+    """进程内的指标注册表，线程安全"""
+
+    def __init__(self, app):
+        self.app = app
+        self.folder = app.config['METRICS_DIR']
+        self.interval = app.config['METRICS_FLUSH_INTERVAL']
+        self.lock = threading.Lock()
+        self.endpoints = {}
+        self.started_at = time.time()
+        self.epoch = 0.0  # 本进程已应用的清零时间
+        self.thread = None
+        self.pid = None
+
+    def record(self, endpoint, method, status, seconds, sql_seconds, sql_queries, template_seconds, size):
+        key = (endpoint, method)
+        with self.lock:
+            if self.pid != os.getpid():
+                self._start_process()
+            stats = self.endpoints.get(key)
+            if stats is None:
+                stats = self.endpoints[key] = EndpointStats()
+            stats.latency.record(int(seconds * 1_000_000))
+            stats.sql_us += int(sql_seconds * 1_000_000)
+            stats.sql_queries += sql_queries
+            stats.template_us += int(template_seconds * 1_000_000)
+            stats.response_bytes += size
+            if status >= 500:
+                stats.errors += 1
+
+    def _start_process(self):
+        """
+        每个进程第一次记录时调用：懒启动写快照的线程（预先 fork 的 worker 不会继承父进程的线程），
+        并丢掉 fork 前（预热请求）的数据，它们已由父进程自己记录
+        """
+        if self.pid is not None:
+            self.endpoints = {}
+        self.pid = os.getpid()
+        self.epoch = self._reset_epoch()
+        if self.folder:
+            self.thread = threading.Thread(target=self._run, name='metrics-flush', daemon=True)
+            self.thread.start()
+            atexit.register(self.flush)
+
+    def _reset_epoch(self):
+        """最近一次清零的时间（没有清零过为 0）"""
+        if not self.folder:
+            return 0.0
+        try:
+            with open(os.path.join(self.folder, RESET_FILE), encoding='utf-8') as f:
+                return float(f.read())
+        except (OSError, ValueError):
+            return 0.0
+
+    def _apply_reset(self, epoch):
+        """其他进程清零过，丢弃本进程清零之前的累计值"""
+        with self.lock:
+            if epoch > self.epoch:
+                self.endpoints = {}
+                self.epoch = epoch
+
+    def snapshot(self):
+        with self.lock:
+            return {'pid': os.getpid(), 'started_at': self.started_at, 'epoch': self.epoch, 'endpoints': [
+                {'endpoint': endpoint, 'method': method, **stats.to_dict()}
+                for (endpoint, method), stats in self.endpoints.items()]}
+
+    def flush(self):
+        """把本进程的累计值写入 METRICS_DIR/<pid>.json"""
+        if not self.folder:
+            return
+        os.makedirs(self.folder, exist_ok=True)
+        self._apply_reset(self._reset_epoch())
+        path = os.path.join(self.folder, f'{os.getpid()}.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + '.tmp', path)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except OSError:
+                self.app.logger.exception('metrics flush failed')
+
+    def _snapshots(self):
+        """所有进程清零之后的快照；本进程用内存中的最新值，顺带删除已退出进程的快照"""
+        epoch = self._reset_epoch()
+        self._apply_reset(epoch)
+        own = self.snapshot()
+        snapshots = [own]
+        if self.folder and os.path.isdir(self.folder):
+            stale_before = time.time() - self.interval * STALE_FLUSHES
+            for name in os.listdir(self.folder):
+                if not name.endswith('.json') or name == f"{own['pid']}.json":
+                    continue
+                path = os.path.join(self.folder, name)
+                try:
+                    if os.path.getmtime(path) < stale_before:
+                        os.remove(path)
+                        continue
+                    with open(path, encoding='utf-8') as f:
+                        snapshot = json.load(f)
+                except (OSError, ValueError):
+                    continue  # 正在被替换或已删除
+                if snapshot.get('epoch', 0) >= epoch:
+                    snapshots.append(snapshot)
+        return snapshots
+
+    def collect(self):
+        """合并后的 {(endpoint, method): EndpointStats}"""
+        merged = {}
+        for snapshot in self._snapshots():
+            for data in snapshot['endpoints']:
+                key = (data['endpoint'], data['method'])
+                stats = EndpointStats.from_dict(data)
+                if key in merged:
+                    merged[key].merge(stats)
+                else:
+                    merged[key] = stats
+        return merged
+
+    def reset(self):
+        """清空所有进程的数据：写入清零时间，其他进程在下次写快照时各自清零"""
+        epoch = time.time()
+        with self.lock:
+            self.endpoints = {}
+            self.epoch = epoch
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+            path = os.path.join(self.folder, RESET_FILE)
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(repr(epoch))
+            os.replace(tmp, path)
+            for name in os.listdir(self.folder):
+                if name.endswith('.json'):
+                    try:
+                        os.remove(os.path.join(self.folder, name))
+                    except FileNotFoundError:
+                        pass
+
+
+def get_metrics(app=None):
+    app = app or current_app._get_current_object()
+    metrics = app.extensions.get('metrics')
+    if metrics is None:
+        metrics = app.extensions.setdefault('metrics', Metrics(app))
+    return metrics
+
+
+def summarize(collected):
+    """管理页面用的汇总行，按总耗时降序"""
+    rows = []
+    for (endpoint, method), stats in collected.items():
+        h = stats.latency
+        if not h.count:
+            continue
+        rows.append({
+            'endpoint': endpoint,
+            'method': method,
+            'count': h.count,
+            'total_s': h.total / 1e6,
+            'mean_ms': h.total / h.count / 1000,
+            'p50_ms': h.percentile(0.5) / 1000,
+            'p90_ms': h.percentile(0.9) / 1000,
+            'p99_ms': h.percentile(0.99) / 1000,
+            'max_ms': h.max / 1000,
+            'sql_share': stats.sql_us / h.total if h.total else 0,
+            'sql_queries': stats.sql_queries / h.count,
+            'template_ms': stats.template_us / h.count / 1000,
+            'response_kb': stats.response_bytes / h.count / 1024,
+            'errors': stats.errors,
+        })
+    rows.sort(key=lambda row: -row['total_s'])
+    return rows
+
+
+def _labels(**labels):
+    return ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in labels.items())
+
+
+def prometheus_text(collected):
+    lines = []
+
+    def header(name, kind, text):
+        lines.append(f'# HELP {PREFIX}_{name} {text}')
+        lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+
+    items = sorted(collected.items())
+    limits = [int(b * 1_000_000) for b in LATENCY_BUCKETS]
+    header('request_duration_seconds', 'histogram', 'Request latency by endpoint.')
+    for (endpoint, method), stats in items:
+        h = stats.latency
+        labels = _labels(endpoint=endpoint, method=method)
+        for bucket, n in zip(LATENCY_BUCKETS, h.cumulative(limits)):
+            lines.append(f'{PREFIX}_request_duration_seconds_bucket{{{labels},le="{bucket}"}} {n}')
+        lines.append(f'{PREFIX}_request_duration_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+        lines.append(f'{PREFIX}_request_duration_seconds_sum{{{labels}}} {h.total / 1e6:.6f}')
+        lines.append(f'{PREFIX}_request_duration_seconds_count{{{labels}}} {h.count}')
+
+    counters = [
+        ('request_sql_seconds_total', 'Time spent in SQL statements.', lambda s: f'{s.sql_us / 1e6:.6f}'),
+        ('request_sql_queries_total', 'SQL statements executed.', lambda s: s.sql_queries),
+        ('request_template_seconds_total', 'Time spent rendering templates.', lambda s: f'{s.template_us / 1e6:.6f}'),
+        ('response_bytes_total', 'Response body bytes (after compression).', lambda s: s.response_bytes),
+        ('request_errors_total', 'Responses with status >= 500.', lambda s: s.errors),
+    ]
+    for name, text, value in counters:
+        header(name, 'counter', text)
+        for (endpoint, method), stats in items:
+            lines.append(f'{PREFIX}_{name}{{{_labels(endpoint=endpoint, method=method)}}} {value(stats)}')
+    return '\n'.join(lines) + '\n'
+
+
+# ---------- 采集 ----------
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+    if has_request_context() and 'metrics_started' in g:
+        g.metrics_sql += time.perf_counter() - started
+        g.metrics_queries += 1
+
+
+def _before_render(app, template, context, **extra):
+    if 'metrics_started' in g:
+        g.metrics_render_started = time.perf_counter()
+
+
+def _rendered(app, template, context, **extra):
+    started = g.pop('metrics_render_started', None)
+    if started is not None:
+        g.metrics_template += time.perf_counter() - started
+
+
+def _start():
+    g.metrics_started = time.perf_counter()
+    g.metrics_sql = 0.0
+    g.metrics_queries = 0
+    g.metrics_template = 0.0
+
+
+def _finish(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        get_metrics().record(
+            request.endpoint or '<unmatched>', request.method, response.status_code,
+            time.perf_counter() - started, g.metrics_sql, g.metrics_queries, g.metrics_template,
+            response.content_length or 0)
+    return response
+
+
+@bp.route('/metrics')
+def prometheus():
+    if request.remote_addr not in current_app.config['METRICS_ALLOWED_IPS']:
+        abort(404)
+    return Response(prometheus_text(get_metrics().collect()), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    """注册采集钩子与 /metrics；应在压缩之前注册，使统计到压缩后的大小"""
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(_start)
+    app.after_request(_finish)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    app.register_blueprint(bp)
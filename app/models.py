@@ -1,8 +1,10 @@
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from app import db, login
+from app.passwords import PasswordHasherBusy, get_password_hasher
 import json
+import random
+import string
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -35,10 +37,19 @@ class User(UserMixin, db.Model):
     cart_items = db.relationship('Cart', backref='user', lazy='dynamic', cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = get_password_hasher().hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """校验密码；通过且哈希的算法或强度已过时则顺带升级（由调用方提交）"""
+        hasher = get_password_hasher()
+        if not hasher.verify(self.password_hash, password):
+            return False
+        if hasher.needs_rehash(self.password_hash):
+            try:
+                self.password_hash = hasher.hash(password)
+            except PasswordHasherBusy:
+                pass  # 密码已校验通过，升级留到下次登录，不能因为排满就拒绝这次登录
+        return True
     
     def average_rating(self):
         reviews = self.reviews_received.all()
@@ -59,6 +70,12 @@ class Product(db.Model):
     category = db.Column(db.String(20))
     status = db.Column(db.Integer, default=1)
     _attributes = db.Column('attributes', db.Text, default='{}')
+    # 从 attributes JSON 中提取的虚拟生成列（SQLite JSON1），建索引后可直接按属性查询，无需逐行解析 JSON
+    origin_bounty_id = db.Column(
+        db.Integer,
+        db.Computed("json_extract(attributes, '$.origin_bounty_id')", persisted=False),
+        index=True
+    )
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     seller = db.relationship('User', foreign_keys=[seller_id], backref='products')
@@ -67,12 +84,28 @@ class Product(db.Model):
     orders = db.relationship('Order', backref='product', lazy='dynamic')
     cart_items = db.relationship('Cart', backref='product', lazy='dynamic', cascade='all, delete-orphan')
 
+    __table_args__ = (
+        db.Index('idx_products_status_timestamp', 'status', 'timestamp'),  # 首页在售商品按最新排序、在售计数
+        db.Index('idx_products_status_price', 'status', 'price'),  # 按价格排序、价格范围
+        db.Index('idx_products_status_category_price', 'status', 'category', 'price'),  # 分类 + 价格筛选，覆盖分面统计
+        db.Index('idx_products_seller_timestamp', 'seller_id', 'timestamp'),  # 卖家后台、我的发布
+        db.Index('idx_products_timestamp', 'timestamp'),  # 管理后台最新商品
+    )
+
     @property
     def attributes(self):
-        return json.loads(self._attributes)
+        # 按原始 JSON 文本缓存解析结果；文本被重新加载（refresh / 过期）后自动重新解析。
+        # 返回浅拷贝：调用方就地修改（原来每次都是新解析的字典）不会污染缓存，改完照旧赋值回 attributes 保存
+        cached = self.__dict__.get('_attributes_cache')
+        raw = self._attributes
+        if cached is None or cached[0] is not raw:
+            cached = (raw, json.loads(raw))
+            self.__dict__['_attributes_cache'] = cached
+        return dict(cached[1])
     @attributes.setter
     def attributes(self, value):
         self._attributes = json.dumps(value)
+        self.__dict__.pop('_attributes_cache', None)
 
 class Bounty(db.Model):
     """悬赏模型 - 增强版"""
@@ -93,6 +126,13 @@ class Bounty(db.Model):
     author = db.relationship('User', foreign_keys=[user_id], backref='posted_bounties')
     accepter = db.relationship('User', foreign_keys=[accepter_id], backref='accepted_bounties')
     
+    __table_args__ = (
+        db.Index('idx_bounties_status_accepted', 'status', 'accepted_at'),  # 超时清理：找出长期无进展的悬赏
+        db.Index('idx_bounties_status_created', 'status', 'created_at'),  # 首页悬赏墙
+        db.Index('idx_bounties_user_created', 'user_id', 'created_at'),  # 我发布的悬赏
+        db.Index('idx_bounties_accepter_accepted', 'accepter_id', 'accepted_at'),  # 我接单的悬赏
+    )
+    
     def status_text(self):
         status_map = {0: '待接单', 1: '沟通中', 2: '已完成', 3: '已取消'}
         return status_map.get(self.status, '未知')
@@ -111,6 +151,12 @@ class Review(db.Model):
     # 这里的 relationship 保持不变，因为指定了 foreign_keys=[buyer_id]
     buyer = db.relationship('User', foreign_keys=[buyer_id], backref='reviews_written')
 
+    __table_args__ = (
+        db.Index('idx_reviews_product_timestamp', 'product_id', 'timestamp'),  # 商品详情页的评价列表
+        db.Index('idx_reviews_buyer_product', 'buyer_id', 'product_id'),  # 是否已评价
+        db.Index('idx_reviews_seller', 'seller_id'),  # 卖家收到的评价
+    )
+
 class Order(db.Model):
     """订单模型"""
     __tablename__ = 'orders'
@@ -133,6 +179,20 @@ class Order(db.Model):
     shipped_at = db.Column(db.DateTime)  # 发货时间
     completed_at = db.Column(db.DateTime)  # 完成时间
     
+    __table_args__ = (
+        # 超时清理：按状态 + 时间分批扫描
+        db.Index('idx_orders_status_shipped', 'status', 'shipped_at'),
+        db.Index('idx_orders_status_created', 'status', 'created_at'),
+        db.Index('idx_orders_buyer_created', 'buyer_id', 'created_at'),  # 我的订单
+        db.Index('idx_orders_seller_created', 'seller_id', 'created_at'),  # 卖家订单、待处理订单数
+        db.Index('idx_orders_product', 'product_id'),  # 删除商品时解除订单关联
+    )
+    
+    @staticmethod
+    def generate_order_no():
+        """生成 12 位随机订单号（大写字母 + 数字）"""
+        return ''.join(random.choices(string.ascii_uppercase + string.digits, k=12))
+
     def status_text(self):
         status_map = {0: '待付款', 1: '待发货', 2: '待收货', 3: '已完成', 4: '已取消'}
         return status_map.get(self.status, '未知')
@@ -143,9 +203,12 @@ class Favorite(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_favorite'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='unique_favorite'),
+        db.Index('idx_favorites_product', 'product_id'),  # 降价提醒按商品找收藏者
+    )
 
 class Cart(db.Model):
     """购物车模型"""
@@ -157,7 +220,10 @@ class Cart(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    __table_args__ = (db.UniqueConstraint('user_id', 'product_id', name='unique_cart_item'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'product_id', name='unique_cart_item'),
+        db.Index('idx_carts_product', 'product_id'),  # 降价提醒按商品找加购者
+    )
 
 class Message(db.Model):
     """买家卖家沟通消息模型"""
@@ -177,6 +243,13 @@ class Message(db.Model):
     bounty = db.relationship('Bounty', backref='messages')  # 新增：悬赏消息关系
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
+    
+    __table_args__ = (
+        db.Index('idx_messages_bounty_created', 'bounty_id', 'created_at'),  # 悬赏聊天、超时清理查最近的沟通时间
+        db.Index('idx_messages_receiver_read', 'receiver_id', 'is_read'),  # 收到的消息、未读数
+        db.Index('idx_messages_sender_receiver', 'sender_id', 'receiver_id'),  # 发出的消息、两人之间的对话
+        db.Index('idx_messages_product_created', 'product_id', 'created_at'),  # 商品详情页的聊天记录
+    )
 
 class BrowsingHistory(db.Model):
     """浏览历史模型"""
@@ -189,5 +262,68 @@ class BrowsingHistory(db.Model):
     user = db.relationship('User', backref='browsing_history')
     product = db.relationship('Product', backref='browsing_records')
     
-    __table_args__ = (db.Index('idx_user_viewed', 'user_id', 'viewed_at'),)
+    __table_args__ = (
+        db.Index('unique_browsing', 'user_id', 'product_id', unique=True),  # 同一商品只保留一条，重复浏览刷新时间
+        db.Index('idx_user_viewed', 'user_id', 'viewed_at'),
+        db.Index('idx_viewed_at', 'viewed_at'),  # 推荐增量更新、过期清理按时间扫描
+        db.Index('idx_browsing_product', 'product_id'),  # 删除商品时解除浏览记录关联
+    )
+
+class ProductNeighbors(db.Model):
+    """相似商品：离线批量计算的 Top-K 邻居，详情页按主键一次取出"""
+    __tablename__ = 'product_neighbors'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    neighbors = db.Column(db.Text, default='[]')  # JSON: [[商品 id, 相似度], ...]，按相似度降序
+    built_at = db.Column(db.DateTime, index=True)
 
+    @property
+    def neighbor_list(self):
+        return json.loads(self.neighbors or '[]')
+
+class Notification(db.Model):
+    """站内通知（目前用于悬赏匹配提醒）"""
+    __tablename__ = 'notifications'
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
+    kind = db.Column(db.String(32))  # bounty_match: 有在售商品匹配了用户的悬赏；price_drop: 收藏 / 加购的商品降价
+    message = db.Column(db.String(256))
+    bounty_id = db.Column(db.Integer, db.ForeignKey('bounties.id'))
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    bounty = db.relationship('Bounty')
+    product = db.relationship('Product')
+
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'bounty_id', 'product_id', name='unique_notification_ref'),
+        db.Index('idx_notification_user_read', 'user_id', 'is_read'),
+        db.Index('idx_notification_bounty', 'bounty_id'),
+    )
+
+class ProductStats(db.Model):
+    """商品热度统计：由内存计数器定期批量写入"""
+    __tablename__ = 'product_stats'
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    views = db.Column(db.Integer, default=0)
+    favorites = db.Column(db.Integer, default=0)
+    # 时间衰减热度的对数：log(Σ 权重 × e^(λ·(事件时间 - 纪元)))，各商品共享同一纪元，可直接排序
+    score_log = db.Column(db.Float, index=True)
+    updated_at = db.Column(db.DateTime)
+
+class PriceHistory(db.Model):
+    """商品价格变动记录（只追加），与改价在同一事务中写入"""
+    __tablename__ = 'price_history'
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'))
+    old_price = db.Column(db.Float)  # 首次上架时为空
+    new_price = db.Column(db.Float)
+    changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    notified = db.Column(db.Boolean, default=False)  # 降价提醒任务是否已处理
+
+    product = db.relationship('Product', backref=db.backref('price_history', lazy='dynamic'))
+
+    __table_args__ = (
+        db.Index('idx_price_history_product', 'product_id', 'changed_at'),
+        db.Index('idx_price_history_notified', 'notified'),
+    )
@@ -0,0 +1,91 @@
+"""
+密码哈希：可配置的算法与强度、登录时透明升级、限流的计算线程池
+
+- PASSWORD_HASH_METHOD 为 werkzeug 的 method 字符串（如 scrypt:32768:8:1、pbkdf2:sha256:600000），
+  新密码按它生成；登录成功时若已存哈希的算法或参数与之不同，用刚校验过的明文重新生成，调整强度不需要用户改密码；
+- 哈希与校验放进每个进程的线程池（hashlib 的 scrypt / pbkdf2 计算时释放 GIL），同时计算的不超过
+  PASSWORD_HASH_WORKERS 个，另有最多 PASSWORD_HASH_QUEUE 个排队；队列已满时等待空位，连同计算总共超过
+  PASSWORD_HASH_TIMEOUT 秒抛出 PasswordHasherBusy，登录页提示稍后再试。登录高峰因此占不满 worker 的 CPU，
+  浏览请求照常处理，普通的并发登录只会稍等而不会被拒绝。
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    """哈希计算已排满或等待超时"""
+
+
+class PasswordHasher:
+    def __init__(self, method, workers=1, queue=1, timeout=5.0):
+        self.method = method
+        self.workers = workers
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(workers + queue)  # 计算中 + 排队中的总数
+        self.lock = threading.Lock()
+        self.executor = None
+        self.pid = None
+        self._prefix = None
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['PASSWORD_HASH_METHOD'], config['PASSWORD_HASH_WORKERS'],
+                   config['PASSWORD_HASH_QUEUE'], config['PASSWORD_HASH_TIMEOUT'])
+
+    def _executor(self):
+        # 按进程懒创建：预先 fork 的 worker 不会继承父进程的线程
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password')
+                    self.pid = os.getpid()
+        return self.executor
+
+    def _run(self, fn, *args):
+        deadline = time.monotonic() + self.timeout
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PasswordHasherBusy()
+        try:
+            future = self._executor().submit(fn, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        # 计算真正结束（或排队中被取消）时才归还名额，等待超时的请求不会让并发数超出上限
+        future.add_done_callback(lambda f: self.slots.release())
+        try:
+            return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeout:
+            future.cancel()
+            raise PasswordHasherBusy() from None
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    @property
+    def prefix(self):
+        """当前配置生成的哈希的前缀（werkzeug 会补全省略的参数，如 scrypt -> scrypt:32768:8:1）"""
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.prefix
+
+
+def get_password_hasher(app=None):
+    app = app or current_app._get_current_object()
+    return app.extensions['passwords']
+
+
+def init_passwords(app):
+    app.extensions['passwords'] = PasswordHasher.from_config(app.config)
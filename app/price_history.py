@@ -0,0 +1,116 @@
+"""
+商品价格历史与降价提醒
+
+- Session 的 before_flush 里发现商品新建或 price 变化，就追加一条 PriceHistory，
+  与改价在同一个事务中提交（改价、议价、编辑商品等所有入口都覆盖）；
+- 降价提醒任务（flask prices notify）用一条 INSERT ... SELECT 把所有未处理的降价记录
+  与收藏 / 加购了该商品的用户做连接，批量生成 price_drop 通知，再把这些记录标记为已处理；
+- 卖家后台用价格历史画迷你走势图。
+"""
+import time
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import event, inspect
+
+from app import db
+from app.models import Cart, Favorite, Notification, PriceHistory, Product
+from app.replicas import RoutingSession
+
+DROP_KIND = 'price_drop'
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _record_price_changes(db_session, flush_context, instances):
+    for obj in db_session.new:
+        if isinstance(obj, Product) and obj.price is not None:
+            db_session.add(PriceHistory(product=obj, old_price=None, new_price=obj.price))
+    for obj in db_session.dirty:
+        if not isinstance(obj, Product):
+            continue
+        history = inspect(obj).attrs.price.history
+        if not history.has_changes():
+            continue
+        old_price = history.deleted[0] if history.deleted else None
+        if old_price != obj.price:
+            db_session.add(PriceHistory(product=obj, old_price=old_price, new_price=obj.price))
+
+
+def notify_price_drops():
+    """处理所有未处理的价格记录，返回 (处理的记录数, 生成的通知数)"""
+    history = PriceHistory.__table__
+    products = Product.__table__
+    with db.engine.begin() as conn:
+        # 先定下本轮的上界，任务运行期间新写入的记录留给下一轮
+        upper = conn.execute(db.select(db.func.max(history.c.id)).where(history.c.notified == db.false())).scalar()
+        if upper is None:
+            return 0, 0
+        pending = db.and_(history.c.notified == db.false(), history.c.id <= upper)
+
+        # 收藏和加购同一件商品的用户只提醒一次
+        watchers = db.union(
+            db.select(Favorite.user_id, Favorite.product_id),
+            db.select(Cart.user_id, Cart.product_id),
+        ).subquery()
+        message = (
+            db.literal('你关注的「') + products.c.title + db.literal('」降价了：¥')
+            + db.cast(history.c.old_price, db.String) + db.literal(' → ¥') + db.cast(history.c.new_price, db.String)
+        )
+        source = (
+            db.select(watchers.c.user_id, db.literal(DROP_KIND), message, history.c.product_id,
+                      db.literal(False), db.literal(datetime.utcnow()))
+            .select_from(history)
+            .join(products, products.c.id == history.c.product_id)
+            .join(watchers, watchers.c.product_id == history.c.product_id)
+            .where(pending, history.c.new_price < history.c.old_price,
+                   products.c.status == 1, watchers.c.user_id != products.c.seller_id)
+        )
+        inserted = conn.execute(Notification.__table__.insert().from_select(
+            ['user_id', 'kind', 'message', 'product_id', 'is_read', 'created_at'], source)).rowcount
+        processed = conn.execute(history.update().where(pending).values(notified=True)).rowcount
+    return processed, inserted
+
+
+def price_series(product_ids, limit=20):
+    """批量取出多件商品最近 limit 次的价格，{商品 id: [价格, ...]}（按时间升序）"""
+    if not product_ids:
+        return {}
+    rows = db.session.query(PriceHistory.product_id, PriceHistory.new_price).filter(
+        PriceHistory.product_id.in_(product_ids), PriceHistory.new_price.isnot(None)
+    ).order_by(PriceHistory.product_id, PriceHistory.changed_at.desc(), PriceHistory.id.desc())
+    series = {}
+    for product_id, price in rows:
+        prices = series.setdefault(product_id, [])
+        if len(prices) < limit:
+            prices.append(price)
+    return {pid: prices[::-1] for pid, prices in series.items()}
+
+
+def sparkline_points(prices, width=80, height=20, pad=2):
+    """价格序列 -> SVG polyline 的 points 字符串；少于两个点时返回空串"""
+    prices = [p for p in prices if p is not None]
+    if len(prices) < 2:
+        return ''
+    lo, hi = min(prices), max(prices)
+    span = (hi - lo) or 1
+    step = (width - 2 * pad) / (len(prices) - 1)
+    return ' '.join(
+        f'{pad + i * step:.1f},{height - pad - (p - lo) / span * (height - 2 * pad):.1f}'
+        for i, p in enumerate(prices)
+    )
+
+
+prices_cli = AppGroup('prices', help='价格历史与降价提醒')
+
+
+@prices_cli.command('notify')
+@click.option('--interval', type=int, default=0, help='大于 0 时按该秒数循环执行')
+def notify_command(interval):
+    """为收藏 / 加购了降价商品的用户生成提醒"""
+    while True:
+        processed, inserted = notify_price_drops()
+        click.echo(f'处理 {processed} 条价格记录，生成 {inserted} 条降价提醒')
+        if interval <= 0:
+            break
+        time.sleep(interval)
@@ -0,0 +1,313 @@
+"""
+按需采样分析器：管理员在 /admin/profiler 开启一次分析，导出火焰图文件
+
+- 一次分析（session）指定目标视图（可不限）、采样比例与持续时间，写入 PROFILER_DIR/active.json；
+  各 worker 每秒最多检查一次该文件的修改时间，未开启时每个请求只多一次时间比较；
+- 被选中的请求所在线程登记到采样表，进程内的采样线程每 PROFILER_INTERVAL_MS 毫秒用 sys._current_frames()
+  取这些线程的调用栈累加计数（按墙钟时间采样，等待数据库 / 网络的时间同样可见）；
+- 采样结果按进程写到 PROFILER_DIR/<session>/<pid>.json，导出时合并，
+  输出 collapsed stack（flamegraph.pl / speedscope 均可读取）或 speedscope JSON。
+"""
+import json
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app, g, request
+
+_APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + os.sep
+
+ACTIVE = 'active.json'
+META = 'meta.json'
+
+
+def _frame_name(code):
+    filename = code.co_filename
+    if filename.startswith(_APP_ROOT):
+        filename = filename[len(_APP_ROOT):]
+    else:
+        # 第三方库只保留 site-packages 之后的部分
+        marker = filename.rfind('site-packages' + os.sep)
+        if marker >= 0:
+            filename = filename[marker + len('site-packages') + 1:]
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+class Profiler:
+    """每个进程一个；读取共享的开关文件，按需启动采样线程"""
+
+    CHECK_INTERVAL = 1.0
+    FLUSH_INTERVAL = 2.0
+
+    def __init__(self, app):
+        self.app = app
+        self.folder = app.config['PROFILER_DIR']
+        self.lock = threading.Lock()
+        self.session = None       # 当前生效的 active.json 内容
+        self.next_check = 0.0
+        self.mtime = None
+        self.targets = {}         # 线程 id -> 视图名
+        self.samples = {}         # (视图名, 帧...) -> 次数
+        self.requests = 0
+        self.sampler = None
+        self.sampling = None      # 采样线程对应的分析 id
+        self.pid = None
+
+    # ---------- 开关 ----------
+
+    def active(self):
+        """当前生效的分析；开关文件最多每秒检查一次"""
+        now = time.monotonic()
+        if now >= self.next_check:
+            self.next_check = now + self.CHECK_INTERVAL
+            self._reload()
+        session = self.session
+        if session is not None and time.time() >= session['until']:
+            return None
+        return session
+
+    def _reload(self):
+        path = os.path.join(self.folder, ACTIVE)
+        try:
+            mtime = os.stat(path).st_mtime
+        except FileNotFoundError:
+            self.session, self.mtime = None, None
+            return
+        if mtime == self.mtime:
+            return
+        try:
+            with open(path, encoding='utf-8') as f:
+                self.session = json.load(f)
+            self.mtime = mtime
+        except (OSError, ValueError):
+            self.session = None  # 正在被替换，下次再读
+
+    def start(self, endpoint=None, rate=1.0, duration=60, interval_ms=None):
+        session = {
+            'id': datetime.now().strftime('%Y%m%d-%H%M%S-') + secrets.token_hex(2),
+            'endpoint': endpoint or None,
+            'rate': rate,
+            'interval_ms': interval_ms or self.app.config['PROFILER_INTERVAL_MS'],
+            'started': time.time(),
+            'until': time.time() + duration,
+        }
+        folder = os.path.join(self.folder, session['id'])
+        os.makedirs(folder, exist_ok=True)
+        _write_json(os.path.join(folder, META), session)
+        _write_json(os.path.join(self.folder, ACTIVE), session)
+        self.next_check = 0.0
+        return session
+
+    def stop(self):
+        path = os.path.join(self.folder, ACTIVE)
+        try:
+            with open(path, encoding='utf-8') as f:
+                session = json.load(f)
+        except (OSError, ValueError):
+            return None
+        session['until'] = min(session['until'], time.time())
+        _write_json(os.path.join(self.folder, session['id'], META), session)
+        os.remove(path)
+        self.next_check = 0.0
+        return session
+
+    # ---------- 采样 ----------
+
+    def begin(self, endpoint):
+        """请求开始时调用：按目标视图与采样比例决定是否登记当前线程"""
+        session = self.active()
+        if session is None:
+            return False
+        if session['endpoint'] and session['endpoint'] != endpoint:
+            return False
+        if random.random() >= session['rate']:
+            return False
+        with self.lock:
+            if self.pid != os.getpid() or self.sampler is None or not self.sampler.is_alive():
+                self.pid = os.getpid()
+                self.samples, self.requests = {}, 0
+                self.sampling = session['id']
+                self.sampler = threading.Thread(target=self._run, args=(session,), name='profiler', daemon=True)
+                self.sampler.start()
+            elif self.sampling != session['id']:
+                return False  # 上一次分析的采样线程还在收尾
+            self.targets[threading.get_ident()] = endpoint or '<unmatched>'
+            self.requests += 1
+        return True
+
+    def end(self):
+        with self.lock:
+            self.targets.pop(threading.get_ident(), None)
+
+    def _run(self, session):
+        interval = session['interval_ms'] / 1000
+        last_flush = time.monotonic()
+        while True:
+            time.sleep(interval)
+            frames = sys._current_frames()
+            with self.lock:
+                for ident, endpoint in self.targets.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        key = (endpoint, *_stack(frame))
+                        self.samples[key] = self.samples.get(key, 0) + 1
+                idle = not self.targets
+            del frames
+            current = self.active()
+            finished = idle and (current is None or current['id'] != session['id'])
+            if finished or time.monotonic() - last_flush >= self.FLUSH_INTERVAL:
+                self._flush(session)
+                last_flush = time.monotonic()
+            if finished:
+                with self.lock:
+                    self.sampler = None
+                return
+
+    def _flush(self, session):
+        with self.lock:
+            data = {'pid': os.getpid(), 'requests': self.requests,
+                    'samples': [[list(key), n] for key, n in self.samples.items()]}
+        try:
+            _write_json(os.path.join(self.folder, session['id'], f'{os.getpid()}.json'), data)
+        except OSError:
+            self.app.logger.exception('profiler flush failed')
+
+    # ---------- 结果 ----------
+
+    def sessions(self):
+        """历次分析，最新的在前"""
+        result = []
+        if not os.path.isdir(self.folder):
+            return result
+        for name in sorted(os.listdir(self.folder), reverse=True):
+            meta = os.path.join(self.folder, name, META)
+            if os.path.isfile(meta):
+                with open(meta, encoding='utf-8') as f:
+                    session = json.load(f)
+                session.update(collect_counts(os.path.join(self.folder, name)))
+                result.append(session)
+        return result
+
+    def load(self, session_id):
+        """合并各进程的样本，返回 (meta, {(帧...): 次数})；不存在时返回 None"""
+        folder = os.path.join(self.folder, os.path.basename(session_id))
+        meta_path = os.path.join(folder, META)
+        if not os.path.isfile(meta_path):
+            return None
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        samples = {}
+        for data in _worker_files(folder):
+            for stack, n in data['samples']:
+                key = tuple(stack)
+                samples[key] = samples.get(key, 0) + n
+        meta.update(collect_counts(folder))
+        return meta, samples
+
+
+def _write_json(path, data):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(path + '.tmp', path)
+
+
+def _worker_files(folder):
+    for name in os.listdir(folder):
+        if name.endswith('.json') and name != META:
+            try:
+                with open(os.path.join(folder, name), encoding='utf-8') as f:
+                    yield json.load(f)
+            except (OSError, ValueError):
+                continue
+
+
+def collect_counts(folder):
+    requests = samples = 0
+    for data in _worker_files(folder):
+        requests += data['requests']
+        samples += sum(n for _, n in data['samples'])
+    return {'requests': requests, 'samples': samples}
+
+
+def to_collapsed(samples):
+    """flamegraph.pl 的 collapsed stack 格式：帧;帧;帧 次数"""
+    lines = [';'.join(frame.replace(';', ':') for frame in stack) + f' {n}'
+             for stack, n in sorted(samples.items())]
+    return '\n'.join(lines) + '\n'
+
+
+def to_speedscope(meta, samples):
+    """speedscope 的 sampled 格式，权重为毫秒"""
+    frames, index = [], {}
+    stacks, weights = [], []
+    for stack, n in sorted(samples.items()):
+        ids = []
+        for name in stack:
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({'name': name})
+            ids.append(index[name])
+        stacks.append(ids)
+        weights.append(n * meta['interval_ms'])
+    total = sum(weights)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled', 'name': f"{meta.get('endpoint') or 'all endpoints'} ({meta['id']})",
+            'unit': 'milliseconds', 'startValue': 0, 'endValue': total,
+            'samples': stacks, 'weights': weights,
+        }],
+        'name': f"campus_market {meta['id']}",
+        'exporter': 'campus_market profiler',
+    }
+
+
+def top_frames(samples, n=20):
+    """按自身耗时（栈顶）与累计耗时（出现在栈中）统计最热的帧"""
+    own, cumulative = {}, {}
+    total = sum(samples.values()) or 1
+    for stack, count in samples.items():
+        if len(stack) > 1:
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+        for name in set(stack[1:]):
+            cumulative[name] = cumulative.get(name, 0) + count
+    rows = [{'frame': name, 'self': own.get(name, 0) / total, 'total': cumulative[name] / total}
+            for name in cumulative]
+    rows.sort(key=lambda row: -row['self'])
+    return rows[:n]
+
+
+def get_profiler(app=None):
+    app = app or current_app._get_current_object()
+    profiler = app.extensions.get('profiler')
+    if profiler is None:
+        profiler = app.extensions.setdefault('profiler', Profiler(app))
+    return profiler
+
+
+def init_profiler(app):
+    profiler = get_profiler(app)
+
+    @app.before_request
+    def _profile_request():
+        if profiler.begin(request.endpoint):
+            g.profiling = True
+
+    @app.teardown_request
+    def _end_profile(exc):
+        if g.pop('profiling', False):
+            profiler.end()
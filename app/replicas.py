@@ -0,0 +1,149 @@
+"""
+读写分离：只读视图的查询分发到从库，写操作（flush / UPDATE / DELETE）始终走主库
+"""
+import random
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+import click
+from flask import current_app, g, has_app_context, has_request_context, session
+from flask.cli import AppGroup
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+def init_replicas(app):
+    """把 SQLALCHEMY_REPLICA_URIS 注册为 replica_N 绑定（需在 db.init_app 之前调用）"""
+    uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    keys = []
+    for i, uri in enumerate(uris):
+        key = f'{REPLICA_BIND_PREFIX}{i}'
+        binds[key] = uri
+        keys.append(key)
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['db_replicas'] = keys
+    app.cli.add_command(replica_cli)
+
+
+def _replica_engines(db):
+    keys = current_app.extensions.get('db_replicas') or []
+    engines = db.engines
+    return [engines[k] for k in keys]
+
+
+class RoutingSession(Session):
+    """根据请求上下文选择主库 / 从库的 Session"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            # 写操作：标记本次请求已写入，之后的读也回到主库
+            if self._flushing or getattr(clause, 'is_dml', False):
+                self.info['db_wrote'] = True
+            elif g.get('db_read_only') and not self.info.get('db_wrote'):
+                engines = _replica_engines(self._db)
+                if engines:
+                    return random.choice(engines)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(db_session):
+    """提交了写操作时记下时间，供 read-your-writes 视图在复制延迟窗口内改读主库"""
+    if not db_session.info.get('db_wrote') or db_session.info.get('db_incidental') or not has_request_context():
+        return
+    if current_app.extensions.get('db_replicas'):
+        session['db_wrote_at'] = int(time.time())
+
+
+@contextmanager
+def incidental_writes(db_session):
+    """
+    包住附带写入及其提交（浏览记录、已读标记等用户不会马上回读的数据）：不记 db_wrote_at，
+    之后的 read-your-writes 视图照常读从库，本请求余下的查询也继续走从库。
+    进入前本请求已有正常写入时不做特殊处理。
+        with incidental_writes(db.session):
+            record_view(...)
+            db.session.commit()
+    """
+    if db_session.info.get('db_wrote'):
+        yield
+        return
+    db_session.info['db_incidental'] = True
+    try:
+        yield
+    finally:
+        db_session.info.pop('db_incidental', None)
+        db_session.info.pop('db_wrote', None)
+
+
+def read_only(view=None, read_your_writes=False):
+    """
+    标记只读视图，查询走从库
+    read_your_writes=True 时，当前用户在 REPLICA_LAG_SECONDS 内提交过写操作则仍读主库
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            use_replica = True
+            if read_your_writes:
+                wrote_at = session.get('db_wrote_at', 0)
+                use_replica = time.time() - wrote_at > current_app.config['REPLICA_LAG_SECONDS']
+            g.db_read_only = use_replica
+            return f(*args, **kwargs)
+        return wrapper
+
+    if view is not None:
+        return decorator(view)
+    return decorator
+
+
+def _sqlite_path(uri):
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or not url.database:
+        return None
+    return url.database
+
+
+def snapshot_replicas(app):
+    """用 SQLite 在线备份接口把主库复制到各个 SQLite 从库，返回已刷新的从库路径"""
+    primary = _sqlite_path(app.config['SQLALCHEMY_DATABASE_URI'])
+    if primary is None:
+        raise click.ClickException('只有 SQLite 主库支持快照复制')
+
+    refreshed = []
+    for uri in app.config.get('SQLALCHEMY_REPLICA_URIS') or []:
+        target = _sqlite_path(uri)
+        if target is None:
+            continue
+        # 备份接口一步完成整库拷贝并锁住目标库，读请求不会看到一半的快照；
+        # 直接写入原文件（而不是替换文件），从库连接池里已打开的连接也能读到新数据
+        src = sqlite3.connect(primary)
+        dst = sqlite3.connect(target, timeout=30)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+            src.close()
+        refreshed.append(target)
+    return refreshed
+
+
+replica_cli = AppGroup('replica', help='读写分离从库管理')
+
+
+@replica_cli.command('snapshot')
+@click.option('--interval', type=int, default=0, help='大于 0 时按该秒数循环快照')
+def snapshot_command(interval):
+    """把主库快照复制到 SQLite 从库"""
+    while True:
+        refreshed = snapshot_replicas(current_app)
+        click.echo(f'已刷新 {len(refreshed)} 个从库: {", ".join(refreshed) or "-"}')
+        if interval <= 0:
+            break
+        time.sleep(interval)
@@ -0,0 +1,105 @@
+"""
+商品搜索：筛选条件解析、查询构建与分面统计
+"""
+from collections import namedtuple
+
+from flask import current_app
+
+from app import db
+from app.models import Product, ProductStats
+
+CATEGORIES = ['second', 'creative', 'agri']
+
+SearchFilters = namedtuple('SearchFilters', ['q', 'category', 'min_price', 'max_price', 'sort_by'])
+
+
+def filters_from_args(args):
+    """从请求参数解析筛选条件"""
+    return SearchFilters(
+        q=args.get('q', ''),
+        category=args.get('category', ''),
+        min_price=args.get('min_price', type=float),
+        max_price=args.get('max_price', type=float),
+        sort_by=args.get('sort_by', 'latest'),  # latest, price_asc, price_desc, trending
+    )
+
+
+def apply_filters(query, filters, skip=()):
+    """在查询上叠加筛选条件；skip 中的维度（'category' / 'price'）不参与过滤，用于分面统计"""
+    query = query.filter(Product.status == 1)
+
+    # 搜索筛选
+    if filters.q:
+        query = query.filter(Product.title.contains(filters.q))
+
+    # 分类筛选
+    if filters.category and 'category' not in skip:
+        query = query.filter(Product.category == filters.category)
+
+    # 价格区间筛选
+    if 'price' not in skip:
+        if filters.min_price is not None:
+            query = query.filter(Product.price >= filters.min_price)
+        if filters.max_price is not None:
+            query = query.filter(Product.price <= filters.max_price)
+    return query
+
+
+def apply_sort(query, sort_by):
+    if sort_by == 'price_asc':
+        return query.order_by(Product.price.asc())
+    if sort_by == 'price_desc':
+        return query.order_by(Product.price.desc())
+    if sort_by == 'trending':
+        # 内连接 + 只按 product_stats 的列排序，查询沿 score_log 索引倒序扫描、无需额外排序；
+        # 没有热度记录的商品（尚未落库）暂不出现
+        return query.join(ProductStats, ProductStats.product_id == Product.id).order_by(
+            ProductStats.score_log.desc(), ProductStats.product_id.desc())
+    return query.order_by(Product.timestamp.desc())  # latest
+
+
+def price_buckets():
+    """由 PRICE_FACET_BUCKETS 边界生成 [(下界, 上界或 None), ...]"""
+    edges = current_app.config['PRICE_FACET_BUCKETS']
+    return [(lo, edges[i + 1] if i + 1 < len(edges) else None) for i, lo in enumerate(edges)]
+
+
+def facet_counts(filters):
+    """
+    统计当前搜索条件下各分类、各价格区间的商品数
+    分类计数忽略分类条件、价格计数忽略价格条件（选中一个分类后仍能看到其他分类有多少件），
+    两者用一条 GROUP BY (分类, 价格区间, 是否命中价格条件) 的聚合查询一次扫描得到
+    """
+    buckets = price_buckets()
+    bucket_expr = db.case(
+        *[(Product.price < hi, i) for i, (lo, hi) in enumerate(buckets) if hi is not None],
+        else_=len(buckets) - 1
+    )
+    in_price = db.true()
+    if filters.min_price is not None:
+        in_price = db.and_(in_price, Product.price >= filters.min_price)
+    if filters.max_price is not None:
+        in_price = db.and_(in_price, Product.price <= filters.max_price)
+    in_price_expr = db.case((in_price, 1), else_=0)
+
+    query = db.session.query(Product.category, bucket_expr, in_price_expr, db.func.count(Product.id))
+    query = apply_filters(query, filters, skip=('category', 'price'))
+    rows = query.group_by(Product.category, bucket_expr, in_price_expr).all()
+
+    categories = {c: 0 for c in CATEGORIES}
+    bucket_counts = [0] * len(buckets)
+    for category, bucket, matches_price, count in rows:
+        if matches_price:
+            categories[category] = categories.get(category, 0) + count
+        if not filters.category or category == filters.category:
+            bucket_counts[bucket] += count
+
+    # 区间按 [下界, 上界) 统计，而 max_price 筛选包含上界；链接的 max_price 取上界减一分，
+    # 点开后的结果与区间计数一致，边界价格（如恰好 ¥50）只落在较高的区间里
+    return {
+        'categories': categories,
+        'price_buckets': [
+            {'min': lo, 'max': hi, 'max_price': round(hi - 0.01, 2) if hi is not None else None, 'count': n}
+            for (lo, hi), n in zip(buckets, bucket_counts)
+        ],
+    }
@@ -0,0 +1,195 @@
+"""
+首页搜索结果缓存
+
+- 以规范化后的筛选条件为 key，只缓存排好序的商品 id 列表（array('i')）和总数，不缓存 ORM 对象；
+- 按估算内存大小做 LRU 淘汰（SEARCH_CACHE_MAX_BYTES）；
+- 商品变更时只淘汰"变更前或变更后的商品满足其筛选条件"的条目；
+  其他进程（多 worker 部署）里的变更收不到，靠 SEARCH_CACHE_TTL 兜底过期；
+- 记录命中率和热门搜索，供容量规划（/admin/search_stats）。
+"""
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+
+from app.events import product_changed
+from app.models import Product
+from app.search import SearchFilters, apply_filters, apply_sort
+
+CacheKey = namedtuple('CacheKey', ['q', 'category', 'min_price', 'max_price', 'sort_by'])
+
+SORT_OPTIONS = ('latest', 'price_asc', 'price_desc', 'trending')
+
+
+def cache_key(filters):
+    """
+    同义的筛选条件归一到同一个 key：多余空格、未知排序方式、整数价格。
+    搜索词保留大小写：LIKE 只对 ASCII 不区分大小写，小写化会让结果不同的非 ASCII 搜索共用一个条目
+    """
+    return CacheKey(
+        q=' '.join(filters.q.split()),
+        category=filters.category or '',
+        min_price=float(filters.min_price) if filters.min_price is not None else None,
+        max_price=float(filters.max_price) if filters.max_price is not None else None,
+        sort_by=filters.sort_by if filters.sort_by in SORT_OPTIONS else 'latest',
+    )
+
+
+def matches(key, product):
+    """product 为变更快照（字段字典），判断它是否落在 key 的结果集内（宁多勿少：搜索词两边都小写后比较）"""
+    if product is None or product['status'] != 1:
+        return False
+    if key.q and key.q.lower() not in (product['title'] or '').lower():
+        return False
+    if key.category and product['category'] != key.category:
+        return False
+    price = product['price']
+    if key.min_price is not None and (price is None or price < key.min_price):
+        return False
+    if key.max_price is not None and (price is None or price > key.max_price):
+        return False
+    return True
+
+
+class SearchCache:
+    def __init__(self, max_bytes, max_ids, ttl):
+        self.max_bytes = max_bytes
+        self.max_ids = max_ids
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()   # key -> (ids, total, 估算字节数, 过期时间)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.query_counts = Counter()
+
+    @staticmethod
+    def _entry_size(key, ids):
+        return sys.getsizeof(ids) + sys.getsizeof(key) + sys.getsizeof(key.q) + 64
+
+    def get(self, key):
+        with self.lock:
+            if key.q:
+                self.query_counts[key.q] += 1
+            entry = self.entries.get(key)
+            if entry is not None and entry[3] < time.monotonic():
+                self.bytes -= self.entries.pop(key)[2]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, ids, total):
+        ids = array('i', ids[:self.max_ids])
+        size = self._entry_size(key, ids)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[2]
+            self.entries[key] = (ids, total, size, time.monotonic() + self.ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= evicted[2]
+                self.evictions += 1
+
+    def invalidate(self, changes):
+        with self.lock:
+            stale = [
+                key for key in self.entries
+                if any(matches(key, c.old) or matches(key, c.new) for c in changes)
+            ]
+            for key in stale:
+                self.bytes -= self.entries.pop(key)[2]
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self, top=20):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'top_queries': self.query_counts.most_common(top),
+            }
+
+
+def get_search_cache(app=None):
+    app = app or current_app
+    cache = app.extensions.get('search_cache')
+    if cache is None:
+        cache = app.extensions.setdefault('search_cache', SearchCache(
+            app.config['SEARCH_CACHE_MAX_BYTES'], app.config['SEARCH_CACHE_MAX_IDS'],
+            app.config['SEARCH_CACHE_TTL']))
+    return cache
+
+
+class IdListPagination(Pagination):
+    """在缓存的 id 列表上分页，每页只按主键取出当前页的商品"""
+
+    def _query_items(self):
+        ids = self._query_args['ids'][self._query_offset:self._query_offset + self.per_page]
+        if not ids:
+            return []
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(list(ids)))}
+        return [products[i] for i in ids if i in products]
+
+    def _query_count(self):
+        return self._query_args['total']
+
+
+def paginate_search(filters, page, per_page):
+    """首页商品分页：优先走缓存的 id 列表，超出缓存长度的页直接查库"""
+    if not current_app.config['SEARCH_CACHE_ENABLED']:
+        return apply_sort(apply_filters(Product.query, filters), filters.sort_by).paginate(
+            page=page, per_page=per_page, error_out=False)
+
+    cache = get_search_cache()
+    key = cache_key(filters)
+    # 查库与缓存 key 用同一组规范化后的条件，同一个 key 下的结果不会因原始写法不同而不同
+    filters = SearchFilters(*key)
+    cached = cache.get(key)
+    if cached is None:
+        query = apply_sort(apply_filters(Product.query.with_entities(Product.id), filters), filters.sort_by)
+        ids = [row[0] for row in query.limit(cache.max_ids)]
+        if len(ids) < cache.max_ids:
+            total = len(ids)
+        else:
+            # 与列表同一个查询计数（按热度排序时内连接 product_stats，没有热度记录的商品不计入）
+            total = apply_sort(apply_filters(Product.query, filters), filters.sort_by).order_by(None).count()
+        cache.put(key, ids, total)
+    else:
+        ids, total = cached
+
+    if page * per_page > len(ids) and len(ids) < total:
+        return apply_sort(apply_filters(Product.query, filters), filters.sort_by).paginate(
+            page=page, per_page=per_page, error_out=False)
+    return IdListPagination(page=page, per_page=per_page, error_out=False, ids=ids, total=total)
+
+
+@product_changed.connect
+def _on_product_changed(app, changes):
+    cache = app.extensions.get('search_cache')
+    if cache is not None:
+        cache.invalidate(changes)
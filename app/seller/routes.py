@@ -4,8 +4,16 @@ from app import db
 from . import bp 
 from app.models import Product, Bounty, Order, Message
 from app.forms import ProductForm
+from app.price_history import price_series, sparkline_points
+from app import batch
+from app.uploads import UploadError, save_upload
 from datetime import datetime
-import random
+
+def _product_image(form):
+    """表单里上传的图片优先，其次是填写的链接"""
+    if form.image_file.data:
+        return save_upload(form.image_file.data)
+    return form.image_url.data
 
 @bp.route('/dashboard', methods=['GET', 'POST'])
 @login_required
@@ -16,7 +24,11 @@ def dashboard():
         
     form = ProductForm()
     if form.validate_on_submit():
-        img = form.image_url.data or f"https://picsum.photos/seed/{random.randint(1,1000)}/300/300"
+        try:
+            img = _product_image(form) or url_for('static', filename='img/placeholder.svg')
+        except UploadError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('seller.dashboard'))
         product = Product(
             title=form.title.data,
             price=form.price.data,
@@ -40,9 +52,14 @@ def dashboard():
     # 未读消息数
     unread_messages = Message.query.filter_by(receiver_id=current_user.id, is_read=False).count()
     
+    # 价格走势迷你图（一次查询取出所有商品的价格历史）
+    series = price_series([p.id for p in my_products])
+    sparklines = {pid: sparkline_points(prices) for pid, prices in series.items()}
+    
     return render_template('seller_dashboard.html', 
                          form=form, 
                          products=my_products, 
+                         sparklines=sparklines,
                          sales=total_sales,
                          pending_orders=pending_orders,
                          unread_messages=unread_messages)
@@ -66,6 +83,8 @@ def respond_bounty(bounty_id):
     )
     
     bounty.status = 1
+    bounty.accepter_id = current_user.id
+    bounty.accepted_at = datetime.utcnow()  # 与买家接单一致，超时清理按它判断是否长期无进展
     db.session.add(product)
     db.session.commit()
     
@@ -120,8 +139,13 @@ def edit_product(product_id):
         product.title = form.title.data
         product.price = form.price.data
         product.category = form.category.data
-        if form.image_url.data:
-            product.image_url = form.image_url.data
+        try:
+            image = _product_image(form)
+        except UploadError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('seller.edit_product', product_id=product.id))
+        if image:
+            product.image_url = image
         product.attributes = {'desc': form.desc.data}
         
         db.session.commit()
@@ -192,11 +216,25 @@ def delete_product(product_id):
     if product.status in [2, 3]:  # 已下单或已售出的商品不能删除
         return jsonify({'success': False, 'message': '该商品有订单记录，无法删除'})
     
+    batch.delete_derived_rows([product.id])
     db.session.delete(product)
     db.session.commit()
     
     return jsonify({'success': True, 'message': '商品已删除'})
 
+@bp.route('/products/batch', methods=['POST'])
+@login_required
+def batch_products():
+    """批量改价/上下架/删除：{"ops": [{"id": 1, "op": "price", "price": 99}, {"id": 2, "op": "unlist"}, ...]}
+    op 取 price / list / unlist / delete
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        results = batch.seller_products(current_user.id, data.get('ops'))
+    except batch.BatchError as e:
+        return jsonify({'success': False, 'message': str(e)})
+    return jsonify({'success': True, 'results': results})
+
 @bp.route('/messages')
 @login_required
 def my_messages():
@@ -0,0 +1,215 @@
+"""
+慢查询日志
+
+- 引擎的 before/after_cursor_execute 事件计时，超过 SLOW_QUERY_MS 毫秒的语句写入 SLOW_QUERY_LOG（按大小轮转，
+  每行一个 JSON）；计时为 cursor.execute 的耗时，SQLite 里即执行到产生第一行结果为止；
+- 每条记录包含：归一化的 SQL（字面量换成 ?，IN (?, ?, ...) 折叠）及其指纹、脱敏后的参数
+  （数字、日期、布尔保留，字符串只记长度）、当前视图、调用它的源码位置（app/ 下最近的一帧）；
+- 每个进程对每个指纹第一次记录时附带 EXPLAIN QUERY PLAN（只对 SELECT 执行），之后同一指纹不再重复；
+- flask slowlog top 与 /admin/performance 读取日志（含已轮转的文件），按指纹聚合出总耗时最高的 N 条。
+
+多个 worker 写同一个文件时轮转是尽力而为的：个别记录可能落进已轮转的文件，但聚合时会一并读取。
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+import time
+from datetime import date, datetime
+from logging.handlers import RotatingFileHandler
+
+import click
+from flask import current_app, has_app_context, has_request_context, request
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__)) + os.sep
+_ROOT_DIR = os.path.dirname(_APP_DIR.rstrip(os.sep)) + os.sep
+# 这些模块里的帧是在执行查询的过程中，不是查询的发起者
+_SKIP_FILES = {os.path.join(_APP_DIR, name) for name in ('slow_queries.py', 'metrics.py', 'replicas.py')}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(statement):
+    sql = _STRING.sub('?', statement)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def redact(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (str, bytes)):
+        return f'<{type(value).__name__} len={len(value)}>'
+    return f'<{type(value).__name__}>'
+
+
+def redact_parameters(parameters, executemany):
+    if executemany:
+        rows = list(parameters)
+        return {'rows': len(rows), 'first': redact_parameters(rows[0], False) if rows else None}
+    if isinstance(parameters, dict):
+        return {k: redact(v) for k, v in parameters.items()}
+    return [redact(v) for v in parameters or ()]
+
+
+def call_site():
+    """发起查询的源码位置：调用栈上离得最近的、app/ 下的帧"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(_APP_DIR) and filename not in _SKIP_FILES:
+            return f'{os.path.relpath(filename, _ROOT_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def explain(cursor, statement, parameters, executemany):
+    """在同一个连接上执行 EXPLAIN QUERY PLAN，返回每一步的说明"""
+    if executemany or not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return None
+    explain_cursor = cursor.connection.cursor()
+    try:
+        explain_cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[-1] for row in explain_cursor.fetchall()]
+    except Exception as e:  # 计划只是附加信息，取不到也不影响原查询
+        return [f'<explain failed: {e}>']
+    finally:
+        explain_cursor.close()
+
+
+class SlowQueryLog:
+    def __init__(self, app):
+        config = app.config
+        self.threshold = config['SLOW_QUERY_MS'] / 1000
+        self.capture_plan = config['SLOW_QUERY_EXPLAIN']
+        self.path = config['SLOW_QUERY_LOG']
+        self.backups = config['SLOW_QUERY_LOG_BACKUPS']
+        self.explained = set()
+        # 直接写 handler，不挂在 logger 上：alembic 的 fileConfig 会禁用已存在的 logger
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.handler = RotatingFileHandler(self.path, maxBytes=config['SLOW_QUERY_LOG_BYTES'],
+                                           backupCount=self.backups, encoding='utf-8', delay=True)
+
+    def record(self, conn, cursor, statement, parameters, executemany, seconds):
+        normalized = normalize(statement)
+        fp = fingerprint(normalized)
+        entry = {
+            'ts': datetime.utcnow().isoformat(timespec='seconds'),
+            'fingerprint': fp,
+            'ms': round(seconds * 1000, 2),
+            'sql': normalized,
+            'params': redact_parameters(parameters, executemany),
+            'route': f'{request.method} {request.endpoint}' if has_request_context() else None,
+            'caller': call_site(),
+            'pid': os.getpid(),
+        }
+        if self.capture_plan and fp not in self.explained and conn.dialect.name == 'sqlite':
+            self.explained.add(fp)
+            entry['plan'] = explain(cursor, statement, parameters, executemany)
+        self.handler.handle(logging.makeLogRecord({'msg': json.dumps(entry, ensure_ascii=False, default=str)}))
+
+    def files(self):
+        """当前日志与已轮转的日志，从旧到新"""
+        candidates = [f'{self.path}.{i}' for i in range(self.backups, 0, -1)] + [self.path]
+        return [path for path in candidates if os.path.exists(path)]
+
+    def top(self, n=20, sort='total_ms'):
+        """按指纹聚合日志，返回排在前 n 的条目"""
+        groups = {}
+        for path in self.files():
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    group = groups.get(entry['fingerprint'])
+                    if group is None:
+                        group = groups[entry['fingerprint']] = {
+                            'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0,
+                            'total_ms': 0.0, 'max_ms': 0.0, 'plan': None, 'routes': {}, 'callers': {},
+                            'last_seen': None}
+                    group['count'] += 1
+                    group['total_ms'] += entry['ms']
+                    group['max_ms'] = max(group['max_ms'], entry['ms'])
+                    group['last_seen'] = entry['ts']
+                    if entry.get('plan'):
+                        group['plan'] = entry['plan']
+                    for key, value in (('routes', entry.get('route')), ('callers', entry.get('caller'))):
+                        if value:
+                            group[key][value] = group[key].get(value, 0) + 1
+        for group in groups.values():
+            group['mean_ms'] = group['total_ms'] / group['count']
+        rows = sorted(groups.values(), key=lambda g: -g[sort])[:n]
+        for group in rows:
+            for key in ('routes', 'callers'):
+                group[key] = sorted(group[key].items(), key=lambda item: -item[1])
+        return rows
+
+
+def get_slow_query_log(app=None):
+    app = app or current_app._get_current_object()
+    return app.extensions.get('slow_queries')
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('slow_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info['slow_query_started'].pop()
+    if not has_app_context():
+        return
+    log = current_app.extensions.get('slow_queries')
+    if log is not None and seconds >= log.threshold:
+        try:
+            log.record(conn, cursor, statement, parameters, executemany, seconds)
+        except Exception:
+            current_app.logger.exception('failed to record slow query')
+
+
+def init_slow_queries(app):
+    if app.config['SLOW_QUERY_MS'] is not None:
+        app.extensions['slow_queries'] = SlowQueryLog(app)
+    app.cli.add_command(slowlog_cli)
+
+
+slowlog_cli = AppGroup('slowlog', help='慢查询日志')
+
+
+@slowlog_cli.command('top')
+@click.option('-n', '--limit', default=20, help='显示的条数')
+@click.option('--sort', type=click.Choice(['total_ms', 'count', 'max_ms', 'mean_ms']), default='total_ms')
+def top_command(limit, sort):
+    """按 SQL 指纹汇总慢查询"""
+    log = get_slow_query_log()
+    if log is None:
+        raise click.ClickException('慢查询日志未开启（SLOW_QUERY_MS = None）')
+    for row in log.top(limit, sort):
+        click.echo(f"[{row['fingerprint']}] {row['count']} 次，总 {row['total_ms']:.0f}ms，"
+                   f"平均 {row['mean_ms']:.1f}ms，最大 {row['max_ms']:.1f}ms")
+        click.echo(f"  {row['sql'][:300]}")
+        for route, count in row['routes'][:3]:
+            click.echo(f'  视图 {route} ×{count}')
+        for caller, count in row['callers'][:3]:
+            click.echo(f'  位置 {caller} ×{count}')
+        for step in row['plan'] or []:
+            click.echo(f'  计划 {step}')
+        click.echo('')
@@ -0,0 +1,358 @@
+"""
+搜索补全：在售商品标题与热门搜索词的内存前缀索引（支持拼音首字母）
+
+索引由"基础段 + 增量段"组成：
+- 基础段是按 key 排序的三个并行数组（key 字符串列表、商品 id、版本号），用 bisect 做前缀查找；
+- 增量段是同结构的小有序列表，商品新增 / 修改时插入，超过阈值后与基础段合并重建；
+- 商品下架、删除或改名时只更新 live 表中的版本号，旧条目在查询时按版本号过滤掉。
+
+本进程的变更由 product_changed 增量更新；其他 worker、flask sweep、批量命令的变更靠轮询发现：
+每 SUGGEST_REFRESH_SECONDS 秒比较一次在售商品的 (最大 id, 件数, id 之和)，变化时对齐在售 id 集合；
+改名不改变这组数字，因此每 SUGGEST_REBUILD_SECONDS 秒整体重建一次。
+构建与轮询都在每个进程的后台线程里进行（新索引建好后在锁内整体替换），请求里只查当前的索引；
+启动时由 warmup 先建好，未预热时首次请求触发后台构建，建好之前商品补全为空。
+"""
+import bisect
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+
+from flask import current_app
+
+from app import db
+from app.events import product_changed
+
+try:
+    from pypinyin import lazy_pinyin, Style
+except ImportError:  # 可选依赖：未安装时用 GB2312 一级汉字区间推算首字母
+    lazy_pinyin = None
+
+# GB2312 一级汉字按拼音排序，各声母的起始编码
+_GB2312_INITIALS = [
+    (0xB0A1, 'a'), (0xB0C5, 'b'), (0xB2C1, 'c'), (0xB4EE, 'd'), (0xB6EA, 'e'), (0xB7A2, 'f'),
+    (0xB8C1, 'g'), (0xB9FE, 'h'), (0xBBF7, 'j'), (0xBFA6, 'k'), (0xC0AC, 'l'), (0xC2E8, 'm'),
+    (0xC4C3, 'n'), (0xC5B6, 'o'), (0xC5BE, 'p'), (0xC6DA, 'q'), (0xC8BB, 'r'), (0xC8F6, 's'),
+    (0xCBFA, 't'), (0xCDDA, 'w'), (0xCEF4, 'x'), (0xD1B9, 'y'), (0xD4D1, 'z'),
+]
+_GB2312_CODES = [code for code, _ in _GB2312_INITIALS]
+_GB2312_LEVEL1_END = 0xD7F9
+
+_TOKEN_RE = re.compile(r'[\w一-鿿]+')
+_KEY_LEN = 24
+
+
+def _is_cjk(ch):
+    return '一' <= ch <= '鿿'
+
+
+def _initial(ch):
+    if not _is_cjk(ch):
+        return ch if ch.isalnum() else ''
+    if lazy_pinyin is not None:
+        return lazy_pinyin(ch, style=Style.FIRST_LETTER)[0][:1].lower()
+    try:
+        raw = ch.encode('gb2312')
+    except UnicodeEncodeError:
+        return ''
+    code = raw[0] << 8 | raw[1]
+    if code < _GB2312_CODES[0] or code > _GB2312_LEVEL1_END:
+        return ''  # 二级汉字按部首排列，无法推算
+    return _GB2312_INITIALS[bisect.bisect_right(_GB2312_CODES, code) - 1][1]
+
+
+def pinyin_initials(text):
+    """'二手自行车' -> 'eszxc'；非汉字的字母数字原样保留"""
+    return ''.join(_initial(ch) for ch in text.lower())
+
+
+def normalize(text):
+    return ' '.join(text.lower().split())
+
+
+def index_keys(text, max_suffixes):
+    """
+    为一段文本生成前缀索引的 key：每个词的开头，以及中文词内部前 max_suffixes 个位置的后缀，
+    再加上它们的拼音首字母形式。这样输入"自行车"或"zxc"都能补全"二手自行车"。
+    """
+    text = normalize(text)
+    keys = set()
+    for m in _TOKEN_RE.finditer(text):
+        start, token = m.start(), m.group()
+        positions = [start]
+        if _is_cjk(token[0]):
+            positions += [start + i for i in range(1, min(len(token), max_suffixes + 1))]
+        for pos in positions:
+            rest = text[pos:]
+            keys.add(rest[:_KEY_LEN])
+            initials = pinyin_initials(rest)[:_KEY_LEN]
+            if initials:
+                keys.add(initials)
+    return keys
+
+
+class PrefixIndex:
+    """id -> 文本 的前缀索引，线程安全"""
+
+    def __init__(self, max_suffixes=4, merge_threshold=2000):
+        self.max_suffixes = max_suffixes
+        self.merge_threshold = merge_threshold
+        self.lock = threading.Lock()
+        self.live = {}            # id -> (文本, 版本号)
+        self._keys = []           # 基础段
+        self._ids = array('i')
+        self._gens = array('i')
+        self._delta = []          # 增量段：(key, id, 版本号) 有序列表
+        self._gen = 0
+
+    def build(self, items):
+        """用 (id, 文本) 序列整体重建"""
+        live = {}
+        entries = []
+        for gen, (item_id, text) in enumerate(items, start=1):
+            live[item_id] = (text, gen)
+            entries.extend((key, item_id, gen) for key in index_keys(text, self.max_suffixes))
+        entries.sort()
+        with self.lock:
+            self.live = live
+            self._gen = len(live)
+            self._load(entries)
+            self._delta = []
+
+    def _load(self, entries):
+        self._keys = [e[0] for e in entries]
+        self._ids = array('i', (e[1] for e in entries))
+        self._gens = array('i', (e[2] for e in entries))
+
+    def upsert(self, item_id, text):
+        with self.lock:
+            current = self.live.get(item_id)
+            if current is not None and current[0] == text:
+                return
+            self._gen += 1
+            self.live[item_id] = (text, self._gen)
+            for key in index_keys(text, self.max_suffixes):
+                bisect.insort(self._delta, (key, item_id, self._gen))
+            if len(self._delta) > self.merge_threshold:
+                self._merge()
+
+    def remove(self, item_id):
+        with self.lock:
+            self.live.pop(item_id, None)
+
+    def _merge(self):
+        """把增量段合并进基础段，顺便清掉已失效的条目"""
+        entries = [
+            (k, i, g) for k, i, g in zip(self._keys, self._ids, self._gens)
+            if self.live.get(i, (None, 0))[1] == g
+        ]
+        entries += [e for e in self._delta if self.live.get(e[1], (None, 0))[1] == e[2]]
+        entries.sort()
+        self._load(entries)
+        self._delta = []
+
+    def search(self, prefix, limit, max_scan=500):
+        """返回前缀匹配的 [(id, 文本)]，按 key 字典序，去重"""
+        prefix = normalize(prefix)[:_KEY_LEN]
+        if not prefix:
+            return []
+        results = {}
+        with self.lock:
+            for keys, ids, gens in ((self._keys, self._ids, self._gens), (self._delta, None, None)):
+                start = bisect.bisect_left(keys, (prefix,) if ids is None else prefix)
+                for pos in range(start, min(len(keys), start + max_scan)):
+                    if ids is None:
+                        key, item_id, gen = keys[pos]
+                    else:
+                        key, item_id, gen = keys[pos], ids[pos], gens[pos]
+                    if not key.startswith(prefix):
+                        break
+                    current = self.live.get(item_id)
+                    if current is not None and current[1] == gen:
+                        results.setdefault(item_id, current[0])
+                        if len(results) >= limit:
+                            break
+                if len(results) >= limit:
+                    break
+        return list(results.items())
+
+    def __len__(self):
+        return len(self.live)
+
+
+class Suggester:
+    """商品标题 + 热门搜索词"""
+
+    def __init__(self, config):
+        self.products = PrefixIndex(config['SUGGEST_MAX_SUFFIXES'], config['SUGGEST_MERGE_THRESHOLD'])
+        self.queries = PrefixIndex(config['SUGGEST_MAX_SUFFIXES'], config['SUGGEST_MERGE_THRESHOLD'])
+        self.max_queries = config['SUGGEST_MAX_QUERIES']
+        self.query_counts = Counter()
+        self.query_ids = {}
+        self.query_lock = threading.Lock()
+        self.refresh_seconds = config['SUGGEST_REFRESH_SECONDS']
+        self.rebuild_seconds = config['SUGGEST_REBUILD_SECONDS']
+        self.built = False
+        self.built_at = 0.0
+        self.version = None
+        self.build_lock = threading.Lock()
+        # 构建期间到达的商品变更先暂存，新索引替换上去之后补上
+        self.pending_lock = threading.Lock()
+        self.pending = None
+        self.thread_lock = threading.Lock()
+        self.thread_pid = None
+
+    def ensure_built(self):
+        """同步构建（warmup、后台线程首次运行时调用）"""
+        if self.built:
+            return
+        with self.build_lock:
+            if not self.built:
+                self._rebuild()
+
+    def _rebuild(self):
+        """整体重建，调用方持有 build_lock"""
+        with self.pending_lock:
+            self.pending = []
+        try:
+            self._build()
+        except BaseException:
+            with self.pending_lock:
+                self.pending = None
+            raise
+        # 在锁内补上暂存的变更：之后到达的变更等补完再应用，保持先后顺序
+        with self.pending_lock:
+            pending, self.pending = self.pending, None
+            self.built = True
+            self._apply(pending)
+
+    def start_refresher(self, app):
+        """按进程懒启动后台刷新线程：预先 fork 的 worker 不会继承父进程的线程"""
+        if self.thread_pid == os.getpid():
+            return
+        with self.thread_lock:
+            if self.thread_pid != os.getpid():
+                threading.Thread(target=self._refresh_loop, args=(app,), name='suggest-refresh', daemon=True).start()
+                self.thread_pid = os.getpid()
+
+    def _refresh_loop(self, app):
+        while True:
+            with app.app_context():
+                try:
+                    if self.built:
+                        self.refresh()
+                    else:
+                        self.ensure_built()
+                except Exception:
+                    app.logger.exception('suggest index refresh failed')
+                    db.session.rollback()
+            time.sleep(self.refresh_seconds)
+
+    def _build(self):
+        from app.models import Product
+        started = time.perf_counter()
+        # 先取版本再读数据：读的过程中发生的变更会让下次检查看到不同的版本
+        version = _on_sale_version()
+        rows = Product.query.with_entities(Product.id, Product.title).filter(
+            Product.status == 1).yield_per(10000)
+        self.products.build((pid, title or '') for pid, title in rows)
+        self.version = version
+        self.built_at = time.monotonic()
+        current_app.logger.info('suggest index built: %d products in %.2fs',
+                                len(self.products), time.perf_counter() - started)
+
+    def refresh(self):
+        """发现其他进程的变更：比较版本，变化则对齐在售 id 集合；超过重建周期则整体重建（在后台线程里调用）"""
+        with self.build_lock:
+            if time.monotonic() - self.built_at >= self.rebuild_seconds:
+                self._rebuild()
+                return
+            version = _on_sale_version()
+            if version != self.version:
+                self._sync()
+                self.version = version
+
+    def _sync(self):
+        from app.models import Product
+        on_sale = {pid for pid, in Product.query.with_entities(Product.id).filter(Product.status == 1)}
+        with self.products.lock:
+            indexed = set(self.products.live)
+        for pid in indexed - on_sale:
+            self.products.remove(pid)
+        missing = list(on_sale - indexed)
+        for i in range(0, len(missing), 500):
+            rows = Product.query.with_entities(Product.id, Product.title).filter(
+                Product.id.in_(missing[i:i + 500]))
+            for pid, title in rows:
+                self.products.upsert(pid, title or '')
+
+    def record_query(self, text):
+        """记录一次有结果的搜索，进入热门搜索词补全"""
+        text = normalize(text)
+        if not text or len(text) > 64:
+            return
+        with self.query_lock:
+            if text not in self.query_ids:
+                if len(self.query_ids) >= self.max_queries:
+                    # 淘汰最冷门的一半，防止长尾搜索词无限增长
+                    keep = dict(self.query_counts.most_common(self.max_queries // 2))
+                    self.query_counts = Counter(keep)
+                    self.query_ids = {q: i for i, q in enumerate(keep, start=1)}
+                    self.queries.build((i, q) for q, i in self.query_ids.items())
+                self.query_ids[text] = len(self.query_ids) + 1
+                self.queries.upsert(self.query_ids[text], text)
+            self.query_counts[text] += 1
+
+    def suggest(self, prefix, limit=8):
+        self.start_refresher(current_app._get_current_object())
+        queries = self.queries.search(prefix, limit * 4)
+        queries.sort(key=lambda item: -self.query_counts[item[1]])
+        results = [{'text': q, 'type': 'query', 'count': self.query_counts[q]} for _, q in queries[:limit // 2]]
+        seen = {r['text'] for r in results}
+        for pid, title in self.products.search(prefix, limit):
+            if len(results) >= limit:
+                break
+            if title not in seen:
+                seen.add(title)
+                results.append({'text': title, 'type': 'product', 'id': pid})
+        return results
+
+    def apply_changes(self, changes):
+        # 构建中的变更暂存一份：新索引可能是在变更之前读的数据，替换上去之后要再补一遍（重复应用无副作用）
+        with self.pending_lock:
+            if self.pending is not None:
+                self.pending.extend(changes)
+            if not self.built:
+                return
+        self._apply(changes)
+
+    def _apply(self, changes):
+        for change in changes:
+            if change.new is not None and change.new['status'] == 1:
+                self.products.upsert(change.id, change.new['title'] or '')
+            else:
+                self.products.remove(change.id)
+
+
+def _on_sale_version():
+    """在售商品的 (最大 id, 件数, id 之和)：新上架、售出、下架都会改变它，走 (status, ...) 覆盖索引"""
+    from app.models import Product
+    return tuple(db.session.query(db.func.max(Product.id), db.func.count(Product.id), db.func.sum(Product.id))
+                 .filter(Product.status == 1).one())
+
+
+def get_suggester(app=None):
+    app = app or current_app
+    suggester = app.extensions.get('suggester')
+    if suggester is None:
+        suggester = app.extensions.setdefault('suggester', Suggester(app.config))
+    return suggester
+
+
+@product_changed.connect
+def _on_product_changed(app, changes):
+    suggester = app.extensions.get('suggester')
+    if suggester is not None:
+        suggester.apply_changes(changes)
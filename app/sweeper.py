@@ -0,0 +1,156 @@
+"""
+超时清理：订单自动确认 / 取消、悬赏过期
+
+规则（时长见 config.py）：
+- 已发货（2）超过 ORDER_AUTO_CONFIRM_DAYS 天未确认收货 -> 自动完成，商品标记已售出；
+- 待付款（0）超过 ORDER_UNPAID_TIMEOUT_HOURS 小时、待发货（1）超过 ORDER_UNSHIPPED_TIMEOUT_DAYS 天
+  -> 自动取消，被预订（2）的商品恢复在售；
+- 沟通中（1）的悬赏接单超过 BOUNTY_IDLE_DAYS 天且期间没有新消息 -> 过期取消；
+- 浏览历史按保留期与每人上限清理（见 app.history.prune_history）。
+
+每条规则沿 (status, 时间) 索引每次取 SWEEPER_BATCH 条，改完立即提交，写锁只在一批之内持有；
+已处理的记录状态改变后不再满足条件，下一批直接从索引头部继续。
+状态修改是带条件的 UPDATE（WHERE status = 读到的状态）：读出之后被买家 / 卖家或另一个 worker 的清理
+抢先改掉的记录，条件不成立就跳过，不会把已付款的订单取消、已确认的订单再确认一次。
+商品 / 悬赏的变更用 events.record_changes 登记，照常触发 product_changed（搜索缓存、补全、悬赏匹配随之更新）。
+
+运行方式：flask sweep（配合 cron），或设置 SWEEPER_INTERVAL 在 web 进程内定时执行。
+"""
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app, request
+
+from app import db
+from app.events import TRACKED, Change, record_changes
+from app.history import prune_history
+from app.models import Bounty, Message, Order
+from app.warmup import WARMUP_ENVIRON_KEY
+
+
+def _transition(obj, expected, **values):
+    """仅当记录的状态仍为 expected 时修改，返回是否修改成功"""
+    model = type(obj)
+    table = model.__table__
+    result = db.session.execute(table.update().where(table.c.id == obj.id, table.c.status == expected)
+                                .values(**values))
+    if result.rowcount != 1:
+        return False
+    if model.__name__ in TRACKED:
+        fields = TRACKED[model.__name__][1]
+        old = {name: getattr(obj, name) for name in fields}
+        new = dict(old, **{name: value for name, value in values.items() if name in fields})
+        record_changes(db.session, model.__name__, [Change('update', obj.id, old, new)])
+    return True
+
+
+def _confirm(order, now):
+    if not _transition(order, 2, status=3, completed_at=now):
+        return False
+    if order.product is not None and order.product.status != 3:
+        _transition(order.product, order.product.status, status=3)
+    return True
+
+
+def _cancel(order, now):
+    if not _transition(order, order.status, status=4):
+        return False
+    if order.product is not None:
+        _transition(order.product, 2, status=1)
+    return True
+
+
+def _expire(bounty, now):
+    return _transition(bounty, 1, status=3)
+
+
+def _rules(now, config):
+    """(名称, 查询, 处理函数)"""
+    orders = Order.query.options(db.selectinload(Order.product))
+    confirm_before = now - timedelta(days=config['ORDER_AUTO_CONFIRM_DAYS'])
+    unpaid_before = now - timedelta(hours=config['ORDER_UNPAID_TIMEOUT_HOURS'])
+    unshipped_before = now - timedelta(days=config['ORDER_UNSHIPPED_TIMEOUT_DAYS'])
+    idle_before = now - timedelta(days=config['BOUNTY_IDLE_DAYS'])
+    recent_message = db.select(Message.id).where(
+        Message.bounty_id == Bounty.id, Message.created_at >= idle_before).exists()
+    return [
+        ('auto_confirmed', orders.filter(Order.status == 2, Order.shipped_at < confirm_before)
+         .order_by(Order.shipped_at), _confirm),
+        ('unpaid_cancelled', orders.filter(Order.status == 0, Order.created_at < unpaid_before)
+         .order_by(Order.created_at), _cancel),
+        ('unshipped_cancelled', orders.filter(Order.status == 1, Order.created_at < unshipped_before)
+         .order_by(Order.created_at), _cancel),
+        ('bounties_expired', Bounty.query.filter(Bounty.status == 1, Bounty.accepted_at < idle_before, ~recent_message)
+         .order_by(Bounty.accepted_at), _expire),
+    ]
+
+
+def sweep(now=None, dry_run=False):
+    """执行一轮清理，返回 {规则名: 处理条数}"""
+    config = current_app.config
+    now = now or datetime.utcnow()
+    batch = config['SWEEPER_BATCH']
+    results = {}
+    for name, query, apply in _rules(now, config):
+        if dry_run:
+            results[name] = query.order_by(None).count()
+            continue
+        done = 0
+        while True:
+            items = query.limit(batch).all()
+            done += sum(1 for item in items if apply(item, now))
+            db.session.commit()
+            if len(items) < batch:
+                break
+        results[name] = done
+    results.update(prune_history(now, dry_run=dry_run))
+    return results
+
+
+def init_sweeper(app):
+    """SWEEPER_INTERVAL > 0 时，在第一个请求到来后启动后台清理线程（每个 worker 进程一个）"""
+    interval = app.config['SWEEPER_INTERVAL']
+    if interval <= 0:
+        return
+    lock = threading.Lock()
+    started = []  # 已启动线程的进程号：fork 出的 worker 不会继承父进程的线程，需按进程各自启动
+
+    def loop():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    results = sweep()
+                    if any(results.values()):
+                        app.logger.info('sweeper: %s', results)
+                except Exception:
+                    app.logger.exception('sweeper run failed')
+                    db.session.rollback()
+
+    @app.before_request
+    def _start_sweeper():
+        # preload 时 master 里的预热请求不启动：线程留在 master，worker 反而会以为已经启动过
+        if (started and started[-1] == os.getpid()) or request.environ.get(WARMUP_ENVIRON_KEY):
+            return
+        with lock:
+            if not started or started[-1] != os.getpid():
+                threading.Thread(target=loop, name='sweeper', daemon=True).start()
+                started.append(os.getpid())
+
+
+@click.command('sweep')
+@click.option('--dry-run', is_flag=True, help='只统计各规则待处理的条数，不修改数据')
+@click.option('--interval', type=int, default=0, help='大于 0 时按该秒数循环执行')
+def sweep_command(dry_run, interval):
+    """自动确认 / 取消超时订单，过期无进展的悬赏"""
+    while True:
+        started = time.perf_counter()
+        results = sweep(dry_run=dry_run)
+        summary = ', '.join(f'{name}={count}' for name, count in results.items())
+        click.echo(f'{"[dry-run] " if dry_run else ""}{summary} ({time.perf_counter() - started:.2f}s)')
+        if interval <= 0:
+            break
+        time.sleep(interval)
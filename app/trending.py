@@ -0,0 +1,228 @@
+"""
+商品热度：内存计数 + 后台批量落库
+
+- 请求里只在进程内的字典上累加浏览 / 收藏次数，不产生任何数据库写入；
+- 后台线程每 TRENDING_FLUSH_INTERVAL 秒把累计值按批 upsert 到 product_stats；
+- 热度按半衰期 TRENDING_HALF_LIFE_HOURS 指数衰减。为了不必定期重算所有商品，存的是
+  score_log = log(Σ wᵢ·e^(λ·(tᵢ - EPOCH)))：所有商品共用同一个 e^(-λ·(now - EPOCH)) 因子，
+  按 score_log 排序就是按当前衰减热度排序，新事件只需 score_log = logaddexp(score_log, log w + λ·(t - EPOCH))，
+  score_log 上的索引可直接用于 sort_by=trending；
+- 新上架的商品记一次权重 1 的事件，保证它们在"热度"排序里也有位置。
+
+logaddexp / logsumexp 以自定义函数的形式注册到 SQLite 连接上（项目只使用 SQLite）。
+"""
+import atexit
+import math
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+
+from app import db
+from app.events import product_changed
+from app.models import BrowsingHistory, Favorite, Product, ProductStats
+
+EPOCH = datetime(2025, 1, 1)
+
+
+def logaddexp(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b) + math.log1p(math.exp(-abs(a - b)))
+
+
+class _LogSumExp:
+    """SQLite 聚合函数 logsumexp(x)"""
+
+    def __init__(self):
+        self.value = None
+
+    def step(self, x):
+        if x is not None:
+            self.value = logaddexp(self.value, x)
+
+    def finalize(self):
+        return self.value
+
+
+@event.listens_for(Engine, 'connect')
+def _register_functions(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.create_function('logaddexp', 2, logaddexp, deterministic=True)
+        dbapi_connection.create_aggregate('logsumexp', 1, _LogSumExp)
+
+
+def decay_rate(config):
+    """每秒的衰减系数 λ"""
+    return math.log(2) / (config['TRENDING_HALF_LIFE_HOURS'] * 3600)
+
+
+def event_score(weight, when, rate):
+    return math.log(weight) + (when - EPOCH).total_seconds() * rate
+
+
+class TrendingCounters:
+    """进程内的计数缓冲，线程安全"""
+
+    def __init__(self, app):
+        self.app = app
+        self.rate = decay_rate(app.config)
+        self.favorite_weight = app.config['TRENDING_FAVORITE_WEIGHT']
+        self.interval = app.config['TRENDING_FLUSH_INTERVAL']
+        self.batch = app.config['TRENDING_FLUSH_BATCH']
+        self.lock = threading.Lock()
+        self.pending = {}   # 商品 id -> [浏览增量, 收藏增量, 期间事件的 score_log]
+        self.thread = None
+        self.pid = None
+        self.flushed = 0
+
+    def _add(self, product_id, views=0, favorites=0, weight=0.0, when=None):
+        score = event_score(weight, when or datetime.utcnow(), self.rate) if weight > 0 else None
+        with self.lock:
+            if self.pid != os.getpid():
+                self._start_process()
+            entry = self.pending.get(product_id)
+            if entry is None:
+                self.pending[product_id] = [views, favorites, score]
+            else:
+                entry[0] += views
+                entry[1] += favorites
+                entry[2] = logaddexp(entry[2], score)
+
+    def _start_process(self):
+        """
+        每个进程第一次计数时调用：懒启动落库线程（预先 fork 的 worker 不会继承父进程的线程），
+        并丢掉 fork 前的缓冲，它们由父进程自己落库
+        """
+        if self.pid is not None:
+            self.pending = {}
+        self.pid = os.getpid()
+        self.thread = threading.Thread(target=self._run, name='trending-flush', daemon=True)
+        self.thread.start()
+        atexit.register(self.flush)
+
+    def view(self, product_id):
+        self._add(product_id, views=1, weight=1.0)
+
+    def favorite(self, product_id, added=True):
+        # 取消收藏只减计数，已经累计的热度自然衰减即可
+        if added:
+            self._add(product_id, favorites=1, weight=self.favorite_weight)
+        else:
+            self._add(product_id, favorites=-1)
+
+    def listed(self, product_id, when=None):
+        self._add(product_id, weight=1.0, when=when)
+
+    def flush(self):
+        """把缓冲区写入 product_stats，返回写入的商品数"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+        table = ProductStats.__table__
+        now = datetime.utcnow()
+        rows = [
+            {'product_id': pid, 'views': v, 'favorites': f, 'score_log': s, 'updated_at': now}
+            for pid, (v, f, s) in pending.items()
+        ]
+        stmt = sqlite_insert(table)
+        stmt = stmt.on_conflict_do_update(index_elements=[table.c.product_id], set_={
+            'views': table.c.views + stmt.excluded.views,
+            'favorites': table.c.favorites + stmt.excluded.favorites,
+            'score_log': db.func.logaddexp(table.c.score_log, stmt.excluded.score_log),
+            'updated_at': stmt.excluded.updated_at,
+        })
+        with self.app.app_context():
+            try:
+                with db.engine.begin() as conn:
+                    for start in range(0, len(rows), self.batch):
+                        conn.execute(stmt, rows[start:start + self.batch])
+            except Exception:
+                current_app.logger.exception('trending flush failed, keeping %d products for retry', len(rows))
+                self._merge_back(pending)
+                return 0
+        self.flushed += len(rows)
+        return len(rows)
+
+    def _merge_back(self, pending):
+        with self.lock:
+            for pid, (v, f, s) in pending.items():
+                entry = self.pending.setdefault(pid, [0, 0, None])
+                entry[0] += v
+                entry[1] += f
+                entry[2] = logaddexp(entry[2], s)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+def get_counters(app=None):
+    app = app or current_app._get_current_object()  # 后台线程需要真实的 app 对象
+    counters = app.extensions.get('trending')
+    if counters is None:
+        counters = app.extensions.setdefault('trending', TrendingCounters(app))
+    return counters
+
+
+def rebuild_stats(conn, config):
+    """按商品上架时间、浏览记录与收藏整体重算 product_stats"""
+    rate_per_day = decay_rate(config) * 86400
+    epoch = EPOCH.strftime('%Y-%m-%d %H:%M:%S')
+
+    def events(ts, weight, is_view=0, is_favorite=0):
+        return (math.log(weight) + (db.func.julianday(ts) - db.func.julianday(epoch)) * rate_per_day,
+                db.literal(is_view), db.literal(is_favorite))
+
+    def select(pid, ts, weight, **kinds):
+        x, v, f = events(ts, weight, **kinds)
+        return db.select(pid.label('product_id'), x.label('x'), v.label('v'), f.label('f'))
+
+    ev = db.union_all(
+        select(Product.id, Product.timestamp, 1.0),
+        select(BrowsingHistory.product_id, BrowsingHistory.viewed_at, 1.0, is_view=1),
+        select(Favorite.product_id, Favorite.created_at, config['TRENDING_FAVORITE_WEIGHT'], is_favorite=1),
+    ).subquery()
+    source = db.select(
+        ev.c.product_id, db.func.sum(ev.c.v), db.func.sum(ev.c.f), db.func.logsumexp(ev.c.x),
+        db.literal(datetime.utcnow()),
+    ).where(ev.c.product_id.isnot(None)).group_by(ev.c.product_id)
+
+    table = ProductStats.__table__
+    conn.execute(table.delete())
+    conn.execute(table.insert().from_select(
+        ['product_id', 'views', 'favorites', 'score_log', 'updated_at'], source))
+    return conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+
+
+@product_changed.connect
+def _on_product_changed(app, changes):
+    counters = None
+    for change in changes:
+        if change.op == 'insert':
+            counters = counters or get_counters(app)
+            counters.listed(change.id)
+
+
+trending_cli = AppGroup('trending', help='商品热度')
+
+
+@trending_cli.command('rebuild')
+def rebuild_command():
+    """按浏览记录与收藏重算全部商品热度"""
+    started = time.perf_counter()
+    with db.engine.begin() as conn:
+        count = rebuild_stats(conn, current_app.config)
+    click.echo(f'已重算 {count} 件商品的热度，用时 {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,205 @@
+"""
+商品图片上传：流式落盘、按内容寻址去重、后台生成缩略图
+
+- 上传文件按 UPLOAD_CHUNK_SIZE 分块读取，边写临时文件边算 SHA-256，不在内存中整体缓存；
+- 文件以哈希命名存放在 UPLOAD_FOLDER/<前两位>/<哈希>.<扩展名>，相同内容只保存一份；
+- 新文件提交到进程内线程池，按 UPLOAD_THUMBNAIL_SIZES 生成各尺寸缩略图（<哈希>_<尺寸名>.webp，
+  Pillow 不支持 WebP 时用 JPEG）；
+- 模板里用 {{ url | thumb('sm') }} 取缩略图（过滤器在 image_proxy 中注册），缩略图尚未生成时返回原图。
+
+缩略图依赖 Pillow（可选）：未安装时只保存原图；安装后执行 flask uploads thumbnails 补齐。
+"""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import click
+from flask import current_app, url_for
+from flask.cli import AppGroup
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # 可选依赖：未安装时不生成缩略图，页面使用原图
+    Image = None
+
+# 文件头 -> 扩展名；只接受这几种图片
+_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+]
+
+
+class UploadError(ValueError):
+    """上传的文件不是支持的图片"""
+
+
+def _detect_type(head):
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def thumbnail_format():
+    """缩略图的 (扩展名, Pillow 格式名)"""
+    if Image is not None and features.check('webp'):
+        return 'webp', 'WEBP'
+    return 'jpg', 'JPEG'
+
+
+def _upload_url(relpath):
+    folder = current_app.config['UPLOAD_FOLDER']
+    static = current_app.static_folder
+    return url_for('static', filename=os.path.relpath(os.path.join(folder, relpath), static).replace(os.sep, '/'))
+
+
+def save_upload(file_storage):
+    """保存上传的图片，返回它的访问地址（内容相同的文件返回同一地址）"""
+    config = current_app.config
+    folder = config['UPLOAD_FOLDER']
+    chunk_size = config['UPLOAD_CHUNK_SIZE']
+    os.makedirs(folder, exist_ok=True)
+
+    digest = hashlib.sha256()
+    ext = None
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(chunk_size)
+                if not chunk:
+                    break
+                if ext is None:
+                    ext = _detect_type(chunk)
+                    if ext is None:
+                        raise UploadError('只支持 JPG / PNG / GIF / WebP 图片')
+                digest.update(chunk)
+                out.write(chunk)
+        if ext is None:
+            raise UploadError('上传的文件为空')
+
+        name = digest.hexdigest()
+        relpath = os.path.join(name[:2], f'{name}.{ext}')
+        path = os.path.join(folder, relpath)
+        if os.path.exists(path):
+            os.remove(tmp_path)  # 已有相同内容的文件
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            schedule_thumbnails(path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return _upload_url(relpath)
+
+
+def thumbnail_paths(path, sizes):
+    """原图路径 -> {尺寸名: 缩略图路径}"""
+    stem = os.path.splitext(path)[0]
+    ext = thumbnail_format()[0]
+    return {label: f'{stem}_{label}.{ext}' for label in sizes}
+
+
+def make_thumbnails(path, sizes, quality=80, force=False):
+    """为一张原图生成所有尺寸的缩略图，返回新生成的数量"""
+    if Image is None:
+        return 0
+    targets = thumbnail_paths(path, sizes)
+    todo = {label: target for label, target in targets.items() if force or not os.path.exists(target)}
+    if not todo:
+        return 0
+    fmt = thumbnail_format()[1]
+    with Image.open(path) as img:
+        img.draft('RGB', (max(sizes.values()),) * 2)  # JPEG 直接按缩小比例解码
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA') or (fmt == 'JPEG' and img.mode == 'RGBA'):
+            img = img.convert('RGB')
+        # 从大到小逐级缩小，每一级都以上一级为输入
+        for label, edge in sorted(sizes.items(), key=lambda item: -item[1]):
+            img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+            if label not in todo:
+                continue
+            tmp = todo[label] + '.tmp'
+            img.save(tmp, fmt, quality=quality)
+            os.replace(tmp, todo[label])
+    return len(todo)
+
+
+class Thumbnailer:
+    """进程内的缩略图线程池（Pillow 在缩放和编码时会释放 GIL）"""
+
+    def __init__(self, app):
+        self.app = app
+        self.sizes = app.config['UPLOAD_THUMBNAIL_SIZES']
+        self.quality = app.config['UPLOAD_THUMBNAIL_QUALITY']
+        self.pool = ThreadPoolExecutor(max_workers=app.config['UPLOAD_THUMBNAIL_WORKERS'],
+                                       thread_name_prefix='thumbnail')
+
+    def _run(self, path, force):
+        try:
+            return make_thumbnails(path, self.sizes, self.quality, force)
+        except Exception:
+            self.app.logger.exception('thumbnail failed for %s', path)
+            return 0
+
+    def submit(self, path, force=False):
+        return self.pool.submit(self._run, path, force)
+
+
+def get_thumbnailer(app=None):
+    app = app or current_app._get_current_object()
+    thumbnailer = app.extensions.get('thumbnailer')
+    if thumbnailer is None:
+        thumbnailer = app.extensions.setdefault('thumbnailer', Thumbnailer(app))
+    return thumbnailer
+
+
+def schedule_thumbnails(path):
+    if Image is not None:
+        get_thumbnailer().submit(path)
+
+
+def thumb_url(url, size='sm'):
+    """本站上传图片的缩略图地址；缩略图还没生成、或不是本站上传的图片时原样返回"""
+    if not url:
+        return url
+    prefix = current_app.static_url_path + '/'
+    if not url.startswith(prefix):
+        return url
+    path = os.path.normpath(os.path.join(current_app.static_folder, url[len(prefix):]))
+    if not path.startswith(current_app.config['UPLOAD_FOLDER']):
+        return url
+    target = thumbnail_paths(path, [size])[size]
+    ready = current_app.extensions.setdefault('thumbnails_ready', set())
+    if target not in ready:
+        if not os.path.exists(target):
+            return url
+        ready.add(target)
+    return url[:-len(os.path.basename(path))] + os.path.basename(target)
+
+
+uploads_cli = AppGroup('uploads', help='上传图片')
+
+
+@uploads_cli.command('thumbnails')
+@click.option('--force', is_flag=True, help='重新生成已存在的缩略图')
+def thumbnails_command(force):
+    """为所有已上传的图片补齐缩略图"""
+    if Image is None:
+        raise click.ClickException('未安装 Pillow，无法生成缩略图（pip install Pillow）')
+    folder = current_app.config['UPLOAD_FOLDER']
+    thumbnailer = get_thumbnailer()
+    futures = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            stem, ext = os.path.splitext(name)
+            if len(stem) == 64 and ext[1:] in ('jpg', 'png', 'gif', 'webp'):
+                futures.append(thumbnailer.submit(os.path.join(root, name), force))
+    created = sum(f.result() for f in futures)
+    click.echo(f'检查了 {len(futures)} 张图片，生成 {created} 张缩略图')
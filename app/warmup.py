@@ -0,0 +1,130 @@
+"""
+启动预热：在开始接收请求之前把首个请求要付出的一次性开销提前做掉
+
+- 配置 ORM 映射（否则由第一条查询触发，约需几十毫秒）；
+- 编译全部模板（放进 Jinja 的模板缓存）；
+- 构建搜索补全与悬赏匹配的内存索引；
+- 对主库和每个从库执行一次 SELECT 1，确认可用并把连接放进连接池；
+- 以匿名用户请求一遍 WARMUP_PATHS，让 SQL 编译缓存、搜索缓存等在首个真实请求之前就绪。
+
+gunicorn 使用 preload_app 时，wsgi.py 在 master 里调用 warmup，fork 出的 worker 共享已编译的模板与索引；
+数据库连接不能跨进程共用，post_fork 里用 reset_connections 丢弃继承来的连接，再由 open_connections 为每个 worker 重新建立。
+
+模板编译结果另外写入 JINJA_BYTECODE_CACHE_DIR（init_template_cache），新进程只需加载字节码、不必重新解析模板；
+发布时可执行 flask templates compile 预先生成。
+"""
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy.orm import configure_mappers
+
+from app import db
+
+# 预热请求的 environ 标记：只在真实请求里才需要做的事（如启动后台线程）据此跳过
+WARMUP_ENVIRON_KEY = 'app.warmup'
+
+def init_template_cache(app):
+    """为模板启用磁盘字节码缓存（模板源码变化时按校验和自动失效）"""
+    folder = app.config.get('JINJA_BYTECODE_CACHE_DIR')
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(folder)
+
+
+def compile_templates(app):
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def open_connections(app, count=1):
+    """为每个数据库引擎预先建立 count 个连接（不超过连接池大小）"""
+    with app.app_context():
+        for engine in db.engines.values():
+            conns = []
+            try:
+                for _ in range(count):
+                    conn = engine.connect()
+                    conn.execute(db.text('SELECT 1'))
+                    conns.append(conn)
+            finally:
+                for conn in conns:
+                    conn.close()
+        return len(db.engines)
+
+
+def reset_connections(app):
+    """fork 之后调用：丢弃从父进程继承的连接池（不关闭父进程仍在使用的连接）"""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def warm_requests(app):
+    """用测试客户端依次请求 WARMUP_PATHS，返回非 200 的路径"""
+    failed = []
+    with app.test_client() as client:
+        client.environ_base[WARMUP_ENVIRON_KEY] = True
+        for path in app.config['WARMUP_PATHS']:
+            if client.get(path).status_code != 200:
+                failed.append(path)
+    return failed
+
+
+def warmup(app):
+    """依次执行各项预热，返回 {步骤: 耗时秒数}"""
+    from app.matcher import get_matcher
+    from app.suggest import get_suggester
+
+    timings = {}
+
+    def step(name, func):
+        started = time.perf_counter()
+        func()
+        timings[name] = round(time.perf_counter() - started, 3)
+
+    with app.app_context():
+        step('mappers', configure_mappers)
+        step('templates', lambda: compile_templates(app))
+        step('connections', lambda: open_connections(app))
+        step('suggest_index', lambda: get_suggester(app).ensure_built())
+
+        def build_matcher():
+            with db.engine.connect() as conn:
+                get_matcher(app).ensure_built(conn)
+        step('bounty_matcher', build_matcher)
+    failed = []
+    step('requests', lambda: failed.extend(warm_requests(app)))
+    if failed:
+        app.logger.warning('warmup requests failed: %s', failed)
+    app.logger.info('warmup done: %s', timings)
+    return timings
+
+
+templates_cli = AppGroup('templates', help='模板缓存')
+
+
+@templates_cli.command('compile')
+def compile_command():
+    """编译全部模板并写入字节码缓存"""
+    app = current_app._get_current_object()
+    cache = app.jinja_env.bytecode_cache
+    if cache is None:
+        raise click.ClickException('未配置 JINJA_BYTECODE_CACHE_DIR，字节码缓存已关闭')
+    started = time.perf_counter()
+    count = compile_templates(app)
+    click.echo(f'编译 {count} 个模板，用时 {time.perf_counter() - started:.2f}s，缓存目录 {cache.directory}')
+
+
+@templates_cli.command('clear')
+def clear_command():
+    """清空字节码缓存"""
+    cache = current_app.jinja_env.bytecode_cache
+    if cache is not None:
+        cache.clear()
+    click.echo('已清空模板字节码缓存')
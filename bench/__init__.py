@@ -0,0 +1,3 @@
+"""
+性能测试工具：数据生成、压测与基准（在项目根目录用 python -m bench.xxx 运行）
+"""
@@ -0,0 +1,355 @@
+"""
+大规模模拟数据生成器
+
+用 SQLAlchemy Core 分块批量插入用户、商品、订单、评价、消息、收藏、购物车和浏览历史，
+数据带有真实的长尾分布：少数"大卖家"发布大部分商品、少数爆款吸走大部分浏览和收藏、
+少数聊天串特别长。
+
+用法：
+    python -m bench.datagen --users 100000 --products 500000 --history 2000000
+    python -m bench.datagen --scale 0.01 --db sqlite:////tmp/bench.db --reset
+所有生成的用户名为 user<id>，密码统一为 --password（默认 123456）。
+"""
+import argparse
+import bisect
+import os
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_migrate import upgrade
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+# 默认规模（--scale 1.0）
+DEFAULTS = {
+    'users': 200_000,
+    'products': 1_000_000,
+    'orders': 300_000,
+    'messages': 2_000_000,
+    'favorites': 1_000_000,
+    'carts': 200_000,
+    'history': 3_000_000,
+    'bounties': 50_000,
+}
+
+CATEGORIES = ['second', 'creative', 'agri']
+CATEGORY_WEIGHTS = [70, 15, 15]
+
+# 标题词库：中英文混合，便于测试搜索、补全和推荐
+TITLE_WORDS = {
+    'second': ['iPhone', 'iPad', 'MacBook', 'Kindle', '自行车', '教材', '高等数学', '台灯', '耳机', '键盘',
+               '鼠标', '显示器', '吉他', '滑板', '冰箱', '电动车', '相机', '运动鞋', '手环', '书桌'],
+    'creative': ['明信片', '帆布包', '徽章', '手绘', '围巾', '摄影集', '书签', '钥匙扣', '校徽', '笔记本'],
+    'agri': ['土鸡蛋', '枇杷', '大闸蟹', '蜂蜜', '碧螺春', '杨梅', '大米', '茶叶', '橘子', '板栗'],
+}
+TITLE_SUFFIX = ['9成新', '全新', '自用', '毕业甩卖', '包邮', '可小刀', '限量', '急出', '128G', '二手']
+PRICE_RANGE = {'second': (5, 6000), 'creative': (5, 200), 'agri': (10, 300)}
+
+
+class Zipf:
+    """按 1/rank^s 权重抽样的长尾分布，rank 再经随机置换映射到实际编号"""
+
+    def __init__(self, n, s, rng, offset=1):
+        self.n = n
+        self.rng = rng
+        total = 0.0
+        self.cum = array('d')
+        for rank in range(1, n + 1):
+            total += 1.0 / rank ** s
+            self.cum.append(total)
+        self.total = total
+        self.ids = array('i', range(offset, offset + n))
+        rng.shuffle(self.ids)
+
+    def sample(self):
+        i = bisect.bisect_left(self.cum, self.rng.random() * self.total)
+        return self.ids[min(i, self.n - 1)]
+
+
+def chunked_insert(conn, table, rows_iter, chunk, prefix=None, label=None):
+    """把行生成器按 chunk 分块写入，返回写入行数"""
+    stmt = table.insert()
+    if prefix:
+        stmt = stmt.prefix_with(prefix)
+    count = 0
+    batch = []
+    started = time.perf_counter()
+    for row in rows_iter:
+        batch.append(row)
+        if len(batch) >= chunk:
+            conn.execute(stmt, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        conn.execute(stmt, batch)
+        count += len(batch)
+    elapsed = time.perf_counter() - started
+    if label:
+        rate = count / elapsed if elapsed else 0
+        print(f'  {label:<16} {count:>10} 行  {elapsed:7.1f}s  {rate:,.0f} 行/秒')
+    return count
+
+
+def random_time(rng, now, days):
+    return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+
+def generate(db, counts, chunk=10_000, seed=42, password='123456', reset=False):
+    from app.models import (User, Product, Order, Review, Message, Favorite, Cart,
+                            BrowsingHistory, Bounty)
+    from app.passwords import get_password_hasher
+    from app.trending import rebuild_stats
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    engine = db.engine
+    if reset:
+        db.drop_all()
+    db.create_all()
+    upgrade(directory=MIGRATIONS_DIR)
+
+    n_users = counts['users']
+    n_products = counts['products']
+    # 写入 id 时从已有最大值之后开始，可以在现有库上追加
+    with engine.connect() as conn:
+        user_base = conn.execute(db.select(db.func.coalesce(db.func.max(User.id), 0))).scalar()
+        product_base = conn.execute(db.select(db.func.coalesce(db.func.max(Product.id), 0))).scalar()
+        order_base = conn.execute(db.select(db.func.coalesce(db.func.max(Order.id), 0))).scalar()
+        bounty_base = conn.execute(db.select(db.func.coalesce(db.func.max(Bounty.id), 0))).scalar()
+
+    or_ignore = 'OR IGNORE' if engine.dialect.name == 'sqlite' else None
+    pw_hash = get_password_hasher().hash(password)  # 与应用配置的哈希强度一致
+
+    # 约 8% 用户是卖家，卖家按长尾分布发布商品（大卖家）
+    n_sellers = max(1, n_users * 8 // 100)
+    seller_ids = rng.sample(range(user_base + 1, user_base + n_users + 1), n_sellers)
+    seller_set = set(seller_ids)
+
+    print(f'生成数据: {counts}')
+    with engine.begin() as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.exec_driver_sql('PRAGMA synchronous=OFF')
+            conn.exec_driver_sql('PRAGMA journal_mode=WAL')
+
+        def user_rows():
+            for i in range(user_base + 1, user_base + n_users + 1):
+                yield {
+                    'id': i,
+                    'username': f'user{i}',
+                    'password_hash': pw_hash,
+                    'email': f'user{i}@suda.edu.cn',
+                    'role': 'seller' if i in seller_set else 'buyer',
+                    'avatar': f'https://api.dicebear.com/7.x/notionists/svg?seed={i}',
+                    'credit_score': 100,
+                }
+        chunked_insert(conn, User.__table__, user_rows(), chunk, label='users')
+
+        # 商品：记录卖家、价格和状态，后续订单、购物车要用
+        seller_zipf = Zipf(n_sellers, 1.1, rng, offset=0)
+        p_seller = array('i')
+        p_price = array('d')
+        p_status = array('b')
+
+        def product_rows():
+            for i in range(product_base + 1, product_base + n_products + 1):
+                category = rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+                lo, hi = PRICE_RANGE[category]
+                price = round(min(hi, lo * rng.paretovariate(0.8)), 1)
+                status = rng.choices([1, 0, 2, 3], [80, 5, 5, 10])[0]
+                seller_id = seller_ids[seller_zipf.sample()]
+                p_seller.append(seller_id)
+                p_price.append(price)
+                p_status.append(status)
+                title = f'{rng.choice(TITLE_WORDS[category])} {rng.choice(TITLE_WORDS[category])} - {rng.choice(TITLE_SUFFIX)}'
+                yield {
+                    'id': i,
+                    'seller_id': seller_id,
+                    'title': title,
+                    'price': price,
+                    'image_url': f'https://picsum.photos/seed/{i}/300/300',
+                    'category': category,
+                    'status': status,
+                    'attributes': '{"desc": "%s"}' % rng.choice(TITLE_SUFFIX),
+                    'timestamp': random_time(rng, now, 365),
+                }
+        chunked_insert(conn, Product.__table__, product_rows(), chunk, label='products')
+
+        # 爆款：浏览、收藏、购物车、咨询都按同一长尾分布集中在少数商品上
+        hot = Zipf(n_products, 1.05, rng, offset=0)
+        user_activity = Zipf(n_users, 0.9, rng, offset=user_base + 1)
+
+        def pid(idx):
+            return product_base + 1 + idx
+
+        # 订单：已下单 / 已售出的商品各有一笔订单，另加若干已取消订单
+        reviewed = []
+
+        def order_rows():
+            order_id = order_base
+            ordered = [i for i in range(n_products) if p_status[i] in (2, 3)]
+            rng.shuffle(ordered)
+            for i in ordered[:counts['orders']]:
+                order_id += 1
+                buyer_id = user_activity.sample()
+                status = 3 if p_status[i] == 3 else rng.choice([1, 2])
+                created = random_time(rng, now, 180)
+                if status == 3 and rng.random() < 0.6:
+                    reviewed.append((buyer_id, p_seller[i], pid(i), created))
+                yield {
+                    'id': order_id,
+                    'order_no': f'B{order_id:011d}',
+                    'buyer_id': buyer_id,
+                    'seller_id': p_seller[i],
+                    'product_id': pid(i),
+                    'price': p_price[i],
+                    'status': status,
+                    'address': '苏州大学独墅湖校区',
+                    'contact': '13800000000',
+                    'is_bounty_order': False,
+                    'created_at': created,
+                    'paid_at': created,
+                    'shipped_at': created + timedelta(days=1) if status >= 2 else None,
+                    'completed_at': created + timedelta(days=3) if status == 3 else None,
+                }
+            for _ in range(max(0, counts['orders'] - len(ordered))):
+                order_id += 1
+                i = hot.sample()
+                created = random_time(rng, now, 180)
+                yield {
+                    'id': order_id,
+                    'order_no': f'B{order_id:011d}',
+                    'buyer_id': user_activity.sample(),
+                    'seller_id': p_seller[i],
+                    'product_id': pid(i),
+                    'price': p_price[i],
+                    'status': 4,
+                    'address': '苏州大学天赐庄校区',
+                    'contact': '13900000000',
+                    'is_bounty_order': False,
+                    'created_at': created,
+                    'paid_at': None,
+                    'shipped_at': None,
+                    'completed_at': None,
+                }
+        chunked_insert(conn, Order.__table__, order_rows(), chunk, label='orders')
+
+        def review_rows():
+            for buyer_id, seller_id, product_id, created in reviewed:
+                yield {
+                    'buyer_id': buyer_id,
+                    'seller_id': seller_id,
+                    'product_id': product_id,
+                    'rating': rng.choices([5, 4, 3, 2, 1], [55, 25, 10, 5, 5])[0],
+                    'content': '东西不错，卖家很好沟通',
+                    'timestamp': created + timedelta(days=4),
+                }
+        chunked_insert(conn, Review.__table__, review_rows(), chunk, label='reviews')
+
+        # 消息：按"商品 + 买家"组成聊天串，串长服从帕累托分布（少数超长聊天）
+        def message_rows():
+            written = 0
+            while written < counts['messages']:
+                i = hot.sample()
+                buyer_id = user_activity.sample()
+                seller_id = p_seller[i]
+                if buyer_id == seller_id:
+                    continue
+                length = min(500, int(rng.paretovariate(1.2)) * 2)
+                t = random_time(rng, now, 120)
+                for k in range(min(length, counts['messages'] - written)):
+                    from_buyer = k % 2 == 0
+                    is_offer = from_buyer and rng.random() < 0.1
+                    t += timedelta(seconds=rng.randint(5, 3600))
+                    yield {
+                        'product_id': pid(i),
+                        'sender_id': buyer_id if from_buyer else seller_id,
+                        'receiver_id': seller_id if from_buyer else buyer_id,
+                        'content': '还在吗？能便宜点吗' if from_buyer else '在的，价格可以商量',
+                        'message_type': 'price_offer' if is_offer else 'text',
+                        'offer_price': round(p_price[i] * 0.8, 1) if is_offer else None,
+                        'is_read': rng.random() < 0.8,
+                        'created_at': t,
+                    }
+                    written += 1
+        chunked_insert(conn, Message.__table__, message_rows(), chunk, label='messages')
+
+        def pair_rows(n, time_key, days, extra=None):
+            for _ in range(n):
+                row = {
+                    'user_id': user_activity.sample(),
+                    'product_id': pid(hot.sample()),
+                    time_key: random_time(rng, now, days),
+                }
+                if extra:
+                    row.update(extra())
+                yield row
+
+        # 收藏与购物车有 (user_id, product_id) 唯一约束，重复的组合直接忽略
+        chunked_insert(conn, Favorite.__table__, pair_rows(counts['favorites'], 'created_at', 365),
+                       chunk, prefix=or_ignore, label='favorites')
+        chunked_insert(conn, Cart.__table__, pair_rows(counts['carts'], 'created_at', 60,
+                                                       lambda: {'quantity': rng.choice([1, 1, 1, 2])}),
+                       chunk, prefix=or_ignore, label='carts')
+        chunked_insert(conn, BrowsingHistory.__table__, pair_rows(counts['history'], 'viewed_at', 90),
+                       chunk, prefix=or_ignore, label='browsing_history')
+
+        def bounty_rows():
+            for i in range(bounty_base + 1, bounty_base + counts['bounties'] + 1):
+                category = rng.choices(CATEGORIES, CATEGORY_WEIGHTS)[0]
+                word = rng.choice(TITLE_WORDS[category])
+                status = rng.choices([0, 1, 2, 3], [60, 15, 15, 10])[0]
+                created = random_time(rng, now, 180)
+                yield {
+                    'id': i,
+                    'user_id': user_activity.sample(),
+                    'title': f'求购{word}',
+                    'budget': float(rng.randint(*PRICE_RANGE[category])),
+                    'desc': f'想要一个{word}，{rng.choice(TITLE_SUFFIX)}的也行',
+                    'status': status,
+                    'created_at': created,
+                    'accepter_id': seller_ids[seller_zipf.sample()] if status in (1, 2) else None,
+                    'accepted_at': created + timedelta(hours=6) if status in (1, 2) else None,
+                }
+        chunked_insert(conn, Bounty.__table__, bounty_rows(), chunk, label='bounties')
+
+        # 商品热度由浏览与收藏汇总得出
+        started = time.perf_counter()
+        rebuild_stats(conn, current_app.config)
+        print(f'  product_stats: 重算完成，用时 {time.perf_counter() - started:.1f}s')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='批量生成校园集市模拟数据')
+    parser.add_argument('--scale', type=float, default=1.0, help='按比例缩放所有默认数量')
+    for name, default in DEFAULTS.items():
+        parser.add_argument(f'--{name}', type=int, help=f'{name} 数量（默认 {default}×scale）')
+    parser.add_argument('--chunk', type=int, default=10_000, help='每批插入行数')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--password', default='123456', help='所有生成用户的密码')
+    parser.add_argument('--db', help='数据库连接串，默认使用 Config.SQLALCHEMY_DATABASE_URI')
+    parser.add_argument('--reset', action='store_true', help='先删除所有表再生成')
+    args = parser.parse_args(argv)
+
+    counts = {}
+    for name, default in DEFAULTS.items():
+        value = getattr(args, name)
+        counts[name] = value if value is not None else max(1, int(default * args.scale))
+
+    from app import create_app, db
+    from config import Config
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = args.db or Config.SQLALCHEMY_DATABASE_URI
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        started = time.perf_counter()
+        generate(db, counts, chunk=args.chunk, seed=args.seed, password=args.password, reset=args.reset)
+        print(f'✅ 完成，用时 {time.perf_counter() - started:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
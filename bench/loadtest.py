@@ -0,0 +1,243 @@
+"""
+脚本化压测：模拟用户 浏览 → 详情 → 收藏 → 加购 → 结算 → 聊天 的完整路径
+
+两种运行方式：
+    # 压测已启动的服务（python run.py / 生产服务）
+    python -m bench.loadtest --url http://127.0.0.1:5000 --concurrency 16 --duration 60
+    # 不启动服务，直接在进程内用 Flask test client 压测（适合对比代码改动）
+    python -m bench.loadtest --inprocess --concurrency 4 --iterations 50
+
+用户使用 bench.datagen 生成的 user<id>/123456，结束后按接口输出吞吐量和 p50/p95/p99 延迟；
+服务主动拒绝的 503（如密码哈希排队超时）单独计为 rejected，不算进错误数。
+"""
+import argparse
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+PRODUCT_RE = re.compile(r'/product/(\d+)')
+SEARCH_TERMS = ['', '', '', 'iPhone', '教材', '自行车', '耳机', '蜂蜜', '明信片', 'MacBook']
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Recorder:
+    """线程安全地收集每个接口的延迟、错误数与被拒绝（503）数"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    def add(self, label, seconds, status):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            if status == 503:
+                self.rejected[label] += 1
+            elif not 200 <= status < 400:
+                self.errors[label] += 1
+
+    def report(self, elapsed):
+        rows = []
+        for label in sorted(self.latencies):
+            values = sorted(self.latencies[label])
+            rows.append({
+                'endpoint': label,
+                'requests': len(values),
+                'errors': self.errors[label],
+                'rejected': self.rejected[label],
+                'rps': len(values) / elapsed if elapsed else 0.0,
+                'p50_ms': percentile(values, 50) * 1000,
+                'p95_ms': percentile(values, 95) * 1000,
+                'p99_ms': percentile(values, 99) * 1000,
+            })
+        total = sum(r['requests'] for r in rows)
+        return {'elapsed_s': elapsed, 'total_requests': total,
+                'total_rps': total / elapsed if elapsed else 0.0, 'endpoints': rows}
+
+
+class HttpClient:
+    """基于 urllib 的会话客户端（每个虚拟用户一个 cookie jar）"""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, method, path, data=None, json_body=None):
+        headers = {}
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urllib.parse.urlencode(data).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                return resp.status, resp.read().decode('utf-8', 'replace')
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode('utf-8', 'replace')
+
+
+class InProcessClient:
+    """用 Flask test client 直接调用应用，不经过网络"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, json_body=None):
+        resp = self.client.open(path, method=method, data=data, json=json_body, follow_redirects=True)
+        return resp.status_code, resp.get_data(as_text=True)
+
+
+class VirtualUser:
+    def __init__(self, client, recorder, username, password, rng):
+        self.client = client
+        self.recorder = recorder
+        self.username = username
+        self.password = password
+        self.rng = rng
+
+    def call(self, label, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            status, body = self.client.request(method, path, **kwargs)
+        except OSError:
+            status, body = 0, ''
+        self.recorder.add(label, time.perf_counter() - started, status)
+        return status, body
+
+    def login(self):
+        _, body = self.call('auth.login[GET]', 'GET', '/auth/login')
+        token = CSRF_RE.search(body)
+        self.call('auth.login[POST]', 'POST', '/auth/login', data={
+            'csrf_token': token.group(1) if token else '',
+            'username': self.username,
+            'password': self.password,
+        })
+
+    def journey(self):
+        rng = self.rng
+        params = {'q': rng.choice(SEARCH_TERMS), 'page': rng.choice([1, 1, 1, 2, 3])}
+        if rng.random() < 0.3:
+            params['category'] = rng.choice(['second', 'creative', 'agri'])
+        _, body = self.call('buyer.index', 'GET', '/?' + urllib.parse.urlencode(params))
+        ids = PRODUCT_RE.findall(body)
+        if not ids:
+            return
+        product_id = rng.choice(ids)
+        self.call('buyer.product_detail', 'GET', f'/product/{product_id}')
+        if rng.random() < 0.3:
+            self.call('buyer.toggle_favorite', 'POST', f'/favorite/{product_id}')
+        if rng.random() < 0.2:
+            self.call('buyer.add_to_cart', 'POST', f'/add_to_cart/{product_id}')
+            self.call('buyer.cart', 'GET', '/cart')
+            if rng.random() < 0.3:
+                _, body = self.call('buyer.cart_checkout[GET]', 'GET', '/cart/checkout')
+                token = CSRF_RE.search(body)
+                if token:
+                    self.call('buyer.cart_checkout[POST]', 'POST', '/cart/checkout', data={
+                        'csrf_token': token.group(1),
+                        'address': '苏州大学独墅湖校区 1 号楼',
+                        'contact': '13800000000',
+                    })
+        if rng.random() < 0.2:
+            self.call('buyer.send_message', 'POST', f'/send_message/{product_id}',
+                      json_body={'content': '你好，请问还在吗？'})
+            self.call('buyer.my_messages', 'GET', '/messages')
+
+
+def run(make_client, users, password, concurrency, duration, iterations, seed):
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker(n):
+        rng = random.Random(seed + n)
+        vu = VirtualUser(make_client(), recorder, users[n % len(users)], password, rng)
+        vu.login()
+        done = 0
+        while True:
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if iterations and done >= iterations:
+                break
+            vu.journey()
+            done += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,), daemon=True) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder.report(time.perf_counter() - started)
+
+
+def print_report(result):
+    print(f"\n总计 {result['total_requests']} 次请求，用时 {result['elapsed_s']:.1f}s，"
+          f"吞吐 {result['total_rps']:.1f} req/s")
+    print(f"{'endpoint':<28}{'reqs':>8}{'err':>6}{'503':>6}{'rps':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}")
+    for r in result['endpoints']:
+        print(f"{r['endpoint']:<28}{r['requests']:>8}{r['errors']:>6}{r['rejected']:>6}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='校园集市端到端压测')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='被测服务地址')
+    parser.add_argument('--inprocess', action='store_true', help='不经网络，直接在进程内调用应用')
+    parser.add_argument('--db', help='进程内模式使用的数据库连接串，默认 Config.SQLALCHEMY_DATABASE_URI')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发虚拟用户数')
+    parser.add_argument('--duration', type=float, default=30, help='压测时长（秒），0 表示只按 --iterations')
+    parser.add_argument('--iterations', type=int, default=0, help='每个虚拟用户执行的路径次数上限')
+    parser.add_argument('--users', default='', help='逗号分隔的用户名，默认 user1..user<concurrency>')
+    parser.add_argument('--password', default='123456')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', help='把结果写入该 JSON 文件')
+    args = parser.parse_args(argv)
+
+    users = [u for u in args.users.split(',') if u] or [f'user{i}' for i in range(1, args.concurrency + 1)]
+
+    if args.inprocess:
+        from app import create_app
+        from config import Config
+
+        class LoadTestConfig(Config):
+            SQLALCHEMY_DATABASE_URI = args.db or Config.SQLALCHEMY_DATABASE_URI
+
+        app = create_app(LoadTestConfig)
+
+        def make_client():
+            return InProcessClient(app)
+    else:
+        def make_client():
+            return HttpClient(args.url)
+
+    result = run(make_client, users, args.password, args.concurrency, args.duration,
+                 args.iterations, args.seed)
+    print_report(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+登录吞吐与密码哈希强度
+
+    python -m bench.login --methods pbkdf2:sha256:100000,scrypt:16384:8:1,scrypt:32768:8:1 --concurrency 8
+
+对每种强度各跑一轮：新建临时 SQLite 库，按该强度生成 --users 个用户，在进程内用 --concurrency 个线程
+反复登录、登出，同时 --browsers 个线程不停请求登录页（不涉及密码哈希的普通页面），统计：
+- hash：单次哈希耗时；
+- login/s、登录 p50 / p99（毫秒）、因等待超时被拒绝（503）的次数；
+- 同时段普通页面的 p50 / p99，用于观察登录高峰对浏览请求的影响。
+
+--workers / --queue 覆盖 PASSWORD_HASH_WORKERS / PASSWORD_HASH_QUEUE，可对比放开并发上限时的情况。
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from bench.loadtest import percentile
+
+
+def run_one(method, args):
+    from werkzeug.security import generate_password_hash
+
+    from app import create_app, db
+    from app.models import User
+    from config import Config
+
+    started = time.perf_counter()
+    pw_hash = generate_password_hash(args.password, method)
+    hash_ms = (time.perf_counter() - started) * 1000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class LoginBenchConfig(Config):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'login.db')
+            WTF_CSRF_ENABLED = False
+            METRICS_ENABLED = False
+            SLOW_QUERY_MS = None
+            PASSWORD_HASH_METHOD = method
+            PASSWORD_HASH_WORKERS = args.workers or Config.PASSWORD_HASH_WORKERS
+            PASSWORD_HASH_QUEUE = args.queue if args.queue is not None else Config.PASSWORD_HASH_QUEUE
+
+        app = create_app(LoginBenchConfig)
+        with app.app_context():
+            db.create_all()
+            db.session.add_all(User(username=f'user{i}', password_hash=pw_hash, role='buyer')
+                               for i in range(1, args.users + 1))
+            db.session.commit()
+
+        logins, rejected, browsing = [], [0], []
+        lock = threading.Lock()
+        deadline = time.perf_counter() + args.duration
+
+        def login_worker(n):
+            client = app.test_client()
+            i = 0
+            while time.perf_counter() < deadline:
+                username = f'user{(n + i * args.concurrency) % args.users + 1}'
+                i += 1
+                t = time.perf_counter()
+                resp = client.post('/auth/login', data={'username': username, 'password': args.password})
+                elapsed = time.perf_counter() - t
+                with lock:
+                    if resp.status_code == 302:
+                        logins.append(elapsed)
+                    elif resp.status_code == 503:
+                        rejected[0] += 1
+                    else:
+                        raise RuntimeError(f'登录返回 {resp.status_code}')
+                if resp.status_code == 503:
+                    time.sleep(args.retry_delay)  # 被拒绝的用户稍后重试，而不是原地空转
+                else:
+                    client.get('/auth/logout')
+
+        def browse_worker():
+            client = app.test_client()
+            while time.perf_counter() < deadline:
+                t = time.perf_counter()
+                client.get('/auth/login')
+                with lock:
+                    browsing.append(time.perf_counter() - t)
+
+        threads = [threading.Thread(target=login_worker, args=(n,)) for n in range(args.concurrency)]
+        threads += [threading.Thread(target=browse_worker) for _ in range(args.browsers)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        with app.app_context():
+            db.engine.dispose()
+
+    logins.sort()
+    browsing.sort()
+    return {
+        'method': method, 'hash_ms': hash_ms, 'logins_per_s': len(logins) / elapsed, 'rejected': rejected[0],
+        'login_p50_ms': percentile(logins, 50) * 1000, 'login_p99_ms': percentile(logins, 99) * 1000,
+        'browse_p50_ms': percentile(browsing, 50) * 1000, 'browse_p99_ms': percentile(browsing, 99) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='登录吞吐与密码哈希强度的关系')
+    parser.add_argument('--methods', default='pbkdf2:sha256:100000,pbkdf2:sha256:600000,scrypt:16384:8:1,scrypt:32768:8:1',
+                        help='逗号分隔的 werkzeug 哈希 method')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--password', default='123456')
+    parser.add_argument('--concurrency', type=int, default=8, help='同时登录的线程数')
+    parser.add_argument('--browsers', type=int, default=2, help='同时请求普通页面的线程数')
+    parser.add_argument('--duration', type=float, default=10, help='每种强度的压测秒数')
+    parser.add_argument('--retry-delay', type=float, default=0.2, help='登录被拒绝（503）后等待的秒数')
+    parser.add_argument('--workers', type=int, help='覆盖 PASSWORD_HASH_WORKERS')
+    parser.add_argument('--queue', type=int, help='覆盖 PASSWORD_HASH_QUEUE')
+    args = parser.parse_args(argv)
+
+    print(f"{'method':<24}{'hash ms':>9}{'login/s':>9}{'p50':>9}{'p99':>9}{'503':>7}"
+          f"{'浏览 p50':>10}{'浏览 p99':>10}")
+    for method in [m for m in args.methods.split(',') if m]:
+        r = run_one(method, args)
+        print(f"{r['method']:<24}{r['hash_ms']:>9.1f}{r['logins_per_s']:>9.1f}{r['login_p50_ms']:>9.1f}"
+              f"{r['login_p99_ms']:>9.1f}{r['rejected']:>7}{r['browse_p50_ms']:>12.1f}{r['browse_p99_ms']:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""
+模型与路由热点的微基准
+
+每个基准函数用 @benchmark 注册，在不同规模的模拟库（bench.datagen 生成）上运行，
+结果保存为 JSON 基线，compare 子命令对比两次结果并标出超过阈值的退化。
+
+用法：
+    python -m bench.micro run --sizes s,m --save bench/results/before.json
+    python -m bench.micro run --only cart,index --rounds 20
+    python -m bench.micro compare before.json after.json --threshold 10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# 各规模对应 bench.datagen 的 --scale
+SIZES = {'s': 0.001, 'm': 0.01, 'l': 0.05}
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'campus_market_bench')
+
+BENCHMARKS = {}
+
+
+def benchmark(name, iterations=1):
+    """注册基准函数：setup(ctx) 返回每轮要重复执行的无参可调用对象"""
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, iterations)
+        return setup
+    return decorator
+
+
+class Context:
+    """一个规模下的应用、测试客户端与常用样本数据"""
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self._clients = {}
+
+    def client_for(self, user_id):
+        """返回已登录为 user_id 的测试客户端"""
+        if user_id not in self._clients:
+            from app.models import User
+            client = self.app.test_client()
+            with self.app.app_context():
+                username = self.db.session.get(User, user_id).username
+            resp = client.post('/auth/login', data={'username': username, 'password': '123456'})
+            assert resp.status_code == 302, f'登录 {username} 失败'
+            self._clients[user_id] = client
+        return self._clients[user_id]
+
+    def top_user(self, column, where=''):
+        """按某列出现次数最多的用户（例如消息最多的用户）"""
+        table, col = column.split('.')
+        sql = f'SELECT {col} FROM {table} {where} GROUP BY {col} ORDER BY COUNT(*) DESC LIMIT 1'
+        with self.app.app_context():
+            return self.db.session.execute(self.db.text(sql)).scalar()
+
+
+def request_bench(ctx, user_id, path):
+    client = ctx.client_for(user_id) if user_id else ctx.app.test_client()
+
+    def run():
+        resp = client.get(path)
+        assert resp.status_code == 200, f'{path} -> {resp.status_code}'
+    return run
+
+
+# ---------------------------------------------------------------- 模型层
+
+@benchmark('product_attributes', iterations=5)
+def bench_product_attributes(ctx):
+    """首页一屏商品，每个商品在模板里读取 3 次 attributes"""
+    from app.models import Product
+    with ctx.app.app_context():
+        products = Product.query.filter_by(status=1).limit(200).all()
+        for p in products:
+            ctx.db.session.expunge(p)
+
+    def run():
+        for p in products:
+            p.attributes.get('desc')
+            p.attributes.get('desc')
+            p.attributes.get('origin_bounty_id')
+    return run
+
+
+@benchmark('user_average_rating')
+def bench_average_rating(ctx):
+    from app.models import User
+    seller_id = ctx.top_user('reviews.seller_id')
+
+    def run():
+        with ctx.app.app_context():
+            ctx.db.session.get(User, seller_id).average_rating()
+    return run
+
+
+@benchmark('order_no_generation', iterations=1000)
+def bench_order_no(ctx):
+    from app.models import Order
+    return Order.generate_order_no
+
+
+@benchmark('index_query')
+def bench_index_query(ctx):
+    """只构建并执行首页的分页查询，不渲染"""
+    from app.models import Product
+
+    def run():
+        with ctx.app.app_context():
+            q = Product.query.filter_by(status=1).filter(Product.title.contains('iPhone'))
+            q = q.filter_by(category='second').filter(Product.price >= 10).filter(Product.price <= 5000)
+            q.order_by(Product.timestamp.desc()).paginate(page=1, per_page=12, error_out=False)
+    return run
+
+
+# ---------------------------------------------------------------- 路由（含渲染）
+
+@benchmark('index')
+def bench_index(ctx):
+    return request_bench(ctx, None, '/')
+
+
+@benchmark('index_search')
+def bench_index_search(ctx):
+    return request_bench(ctx, None, '/?q=iPhone&category=second&min_price=10&sort_by=price_asc')
+
+
+@benchmark('buyer_my_messages')
+def bench_buyer_messages(ctx):
+    return request_bench(ctx, ctx.top_user('messages.sender_id'), '/messages')
+
+
+@benchmark('seller_my_messages')
+def bench_seller_messages(ctx):
+    seller_id = ctx.top_user('messages.receiver_id',
+                             "WHERE receiver_id IN (SELECT id FROM users WHERE role = 'seller')")
+    return request_bench(ctx, seller_id, '/seller/messages')
+
+
+@benchmark('cart')
+def bench_cart(ctx):
+    return request_bench(ctx, ctx.top_user('carts.user_id'), '/cart')
+
+
+# ---------------------------------------------------------------- 运行与比较
+
+def make_context(size, data_dir):
+    from app import create_app, db
+    from flask_migrate import upgrade
+    from bench.datagen import DEFAULTS, MIGRATIONS_DIR, generate
+    from config import Config
+
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'bench_{size}.db')
+
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + path
+        WTF_CSRF_ENABLED = False
+
+    app = create_app(BenchConfig)
+    with app.app_context():
+        if not os.path.exists(path):
+            generate(db, {k: max(1, int(v * SIZES[size])) for k, v in DEFAULTS.items()})
+        else:
+            # 缓存的旧库可能落后于当前模型
+            upgrade(directory=MIGRATIONS_DIR)
+    return Context(app, db)
+
+
+def measure(fn, iterations, rounds, warmup):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            fn()
+        timings.append((time.perf_counter() - started) / iterations)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'stddev': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'rounds': rounds,
+        'iterations': iterations,
+        'ops': 1 / statistics.median(timings) if statistics.median(timings) else 0.0,
+    }
+
+
+def run_suite(sizes, only, rounds, warmup, data_dir):
+    results = {}
+    for size in sizes:
+        ctx = make_context(size, data_dir)
+        for name, (setup, iterations) in BENCHMARKS.items():
+            if only and name not in only:
+                continue
+            stats = measure(setup(ctx), iterations, rounds, warmup)
+            key = f'{size}/{name}'
+            results[key] = stats
+            print(f"{key:<32}{stats['median'] * 1e6:>12.1f} µs  (min {stats['min'] * 1e6:.1f}, "
+                  f"±{stats['stddev'] * 1e6:.1f})")
+    return {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'sizes': {s: SIZES[s] for s in sizes},
+        },
+        'results': results,
+    }
+
+
+def compare(base, new, threshold):
+    """比较中位数，返回退化超过 threshold% 的条目"""
+    regressions = []
+    print(f"{'benchmark':<32}{'base µs':>12}{'new µs':>12}{'change':>10}")
+    for key in sorted(set(base['results']) & set(new['results'])):
+        old = base['results'][key]['median']
+        cur = new['results'][key]['median']
+        change = (cur - old) / old * 100 if old else 0.0
+        flag = ''
+        if change > threshold:
+            flag = '  ← 退化'
+            regressions.append(key)
+        elif change < -threshold:
+            flag = '  ← 提升'
+        print(f'{key:<32}{old * 1e6:>12.1f}{cur * 1e6:>12.1f}{change:>9.1f}%{flag}')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='校园集市微基准')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_p = sub.add_parser('run', help='运行基准')
+    run_p.add_argument('--sizes', default='s,m', help=f'逗号分隔的规模：{",".join(SIZES)}')
+    run_p.add_argument('--only', default='', help='只运行这些基准（逗号分隔）')
+    run_p.add_argument('--rounds', type=int, default=10)
+    run_p.add_argument('--warmup', type=int, default=2)
+    run_p.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='模拟库缓存目录')
+    run_p.add_argument('--save', help='把结果写入 JSON 基线文件')
+
+    cmp_p = sub.add_parser('compare', help='对比两次结果')
+    cmp_p.add_argument('base')
+    cmp_p.add_argument('new')
+    cmp_p.add_argument('--threshold', type=float, default=10.0, help='退化阈值（百分比）')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        only = {n for n in args.only.split(',') if n}
+        sizes = [s for s in args.sizes.split(',') if s]
+        result = run_suite(sizes, only, args.rounds, args.warmup, args.data_dir)
+        if args.save:
+            os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+            with open(args.save, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            print(f'已保存到 {args.save}')
+    else:
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} 项退化超过 {args.threshold}%')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
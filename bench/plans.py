@@ -0,0 +1,385 @@
+"""
+查询计划检查：找出页面查询里对大表的全表扫描
+
+    python -m bench.datagen --scale 0.01 --db sqlite:////tmp/bench.db --reset
+    python -m bench.plans --db /tmp/bench.db
+
+在数据库的一份拷贝上先执行迁移（顺带验证索引迁移），再用 test client 以游客、买家、卖家、管理员
+身份走一遍站点，对每条 SELECT 在同一连接上执行 EXPLAIN QUERY PLAN：
+- 只读页面由 app.url_map 生成：不带参数的 GET 路由全部访问，路由参数从样本记录里取；
+- 写操作（表单提交、JSON 接口、会改数据的 GET）按 scenario 中的顺序执行：加购、批量收藏 / 购物车、
+  结算、议价、发货、确认收货、悬赏接单等，后一步用到的记录（购物车项、订单、议价消息）在执行时查出；
+- url_map 中既没有访问到、也没有登记在 EXEMPT 里的路由视为漏检。
+
+计划里出现 `SCAN 表`（不走任何索引的全表扫描）且该表行数不少于 --min-rows 的记为违规；
+ALLOWED_SCANS 里登记的是确认无需索引的扫描。存在违规、漏检的路由或请求失败（状态码 ≥ 400、
+表单没有跳转、JSON 返回 success 为 false）时退出码为 1，可以放进 CI 防止计划回退。
+"""
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from collections import namedtuple
+
+from flask import has_request_context, request, request_finished, url_for
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from bench.server import ROOT, copy_db
+
+MIGRATIONS_DIR = os.path.join(ROOT, 'migrations')
+
+# SCAN products / SCAN products AS products_1；带 USING INDEX 的是按索引扫描，不算全表扫描
+SCAN_RE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+# 确认无需索引的扫描（本身就要读整张表的统计、导出等），格式为 (视图, 表) -> 原因
+ALLOWED_SCANS = {}
+
+# 不访问的路由，格式为 (视图, 方法) -> 原因；url_map 里其余的路由都必须访问到
+EXEMPT = {
+    ('static', 'GET'): '静态文件，不查库',
+    ('assets.asset', 'GET'): '打包后的静态资源，不查库',
+    ('image_proxy.proxy', 'GET'): '外部图片代理，需要访问外网，不查库',
+    ('admin.delete_product', 'GET'): '删除商品及其关联记录，会破坏后续步骤用到的样本',
+    ('admin.ban_user', 'GET'): '删除用户及其关联记录，会破坏后续步骤用到的样本',
+    ('admin.reset_performance', 'POST'): '清空指标快照目录（与正在运行的实例共用），不查库',
+    ('admin.start_profiler', 'POST'): '采样分析器开关，不查库',
+    ('admin.stop_profiler', 'POST'): '采样分析器开关，不查库',
+    ('admin.profile_detail', 'GET'): '需要一次已完成的采样会话，只读文件、不查库',
+}
+
+# 会修改数据的 GET，只在 scenario 里按顺序访问
+MUTATING_GETS = {'auth.logout', 'buyer.confirm_receipt', 'seller.ship_order', 'seller.respond_bounty'}
+
+# 由 url_map 生成只读页面时，各蓝图用哪个身份访问（其余为买家），auth 下的页面以游客身份访问
+BLUEPRINT_ROLES = {'admin': 'admin', 'seller': 'seller', 'auth': None}
+
+# 路由参数取哪条样本记录：先按 (视图, 参数名) 找，再按参数名
+URL_VALUES = {
+    'product_id': 'product',
+    'order_id': 'order',
+    'bounty_id': 'bounty',
+    ('seller.edit_product', 'product_id'): 'own_product',
+}
+
+ADDRESS = {'address': '北京市海淀区学院路 1 号', 'contact': '13800000000'}
+
+# expect：'redirect' 表单提交成功后应跳转，'json' 应返回 success 为 true，'page' 只要求状态码 < 400
+Step = namedtuple('Step', ['method', 'endpoint', 'values', 'data', 'json', 'expect'])
+
+
+def get(endpoint, expect='page', **values):
+    return Step('GET', endpoint, values, None, None, expect)
+
+
+def post(endpoint, data=None, json=None, **values):
+    return Step('POST', endpoint, values, data, json, 'json' if json is not None else 'redirect')
+
+
+def sample_ids(db_path):
+    """
+    挑选有代表性的用户与记录：订单最多的买家、商品最多的卖家，以及卖家的三件在售商品
+    （product 加购后结算、product2 下单后取消、own_product 由卖家改价 / 上下架 / 编辑、买家议价）
+    """
+    conn = sqlite3.connect(db_path)
+    one = lambda sql, *args: (conn.execute(sql, args).fetchone() or (None,))[0]
+    try:
+        buyer = one("SELECT buyer_id FROM orders o JOIN users u ON u.id = o.buyer_id "
+                    "WHERE u.role = 'buyer' GROUP BY buyer_id ORDER BY count(*) DESC LIMIT 1")
+        seller = one("SELECT seller_id FROM products p JOIN users u ON u.id = p.seller_id "
+                     "WHERE u.role = 'seller' GROUP BY seller_id ORDER BY count(*) DESC LIMIT 1")
+        on_sale = [row[0] for row in conn.execute(
+            'SELECT id FROM products WHERE seller_id = ? AND status = 1 ORDER BY id LIMIT 3', (seller,))]
+        on_sale += [None] * (3 - len(on_sale))
+        ids = {
+            'buyer_id': buyer,
+            'seller_id': seller,
+            'buyer': one('SELECT username FROM users WHERE id = ?', buyer),
+            'seller': one('SELECT username FROM users WHERE id = ?', seller),
+            'admin': one("SELECT username FROM users WHERE id NOT IN (?, ?) ORDER BY id LIMIT 1", buyer, seller),
+            'product': on_sale[0],
+            'product2': on_sale[1],
+            'own_product': on_sale[2],
+            'order': one('SELECT id FROM orders WHERE buyer_id = ? AND status = 3 AND product_id IS NOT NULL '
+                         'ORDER BY id LIMIT 1', buyer),
+            'bounty': one('SELECT id FROM bounties WHERE user_id = ? ORDER BY id LIMIT 1', buyer),
+            'category': one('SELECT category FROM products GROUP BY category ORDER BY count(*) DESC LIMIT 1'),
+        }
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+        rows = {t: conn.execute(f'SELECT count(*) FROM "{t}"').fetchone()[0] for t in tables}
+    finally:
+        conn.close()
+    return ids, rows
+
+
+def page_steps(app, ids):
+    """由 url_map 生成的只读页面，{身份: [Step]}"""
+    pages = {}
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if 'GET' not in rule.methods or (rule.endpoint, 'GET') in EXEMPT or rule.endpoint in MUTATING_GETS:
+            continue
+        values = {}
+        for arg in rule.arguments:
+            sample = URL_VALUES.get((rule.endpoint, arg), URL_VALUES.get(arg))
+            values[arg] = ids.get(sample)
+        if None in values.values():
+            continue  # 没有可用的样本，作为漏检报告
+        role = BLUEPRINT_ROLES.get(rule.endpoint.partition('.')[0], 'buyer')
+        pages.setdefault(ids[role] if role else None, []).append(get(rule.endpoint, **values))
+    return pages
+
+
+def scenario(app, ids):
+    """
+    各身份依次执行的 [(用户名, [Step])]：游客与各身份先访问只读页面，再按顺序执行写操作。
+    Step 的路由参数可以是函数，执行到这一步时以 one(sql, *args) 为参数调用，查出前面步骤产生的记录
+    """
+    pages = page_steps(app, ids)
+    buyer_id, seller_id = ids['buyer_id'], ids['seller_id']
+    product, product2, own_product = ids['product'], ids['product2'], ids['own_product']
+
+    def cart_item(product_id):
+        return lambda one: one('SELECT id FROM carts WHERE user_id = ? AND product_id = ?', buyer_id, product_id)
+
+    def buyer_order(status, product_id=None):
+        sql = 'SELECT id FROM orders WHERE buyer_id = ? AND status = ?'
+        args = [buyer_id, status]
+        if product_id is not None:
+            sql += ' AND product_id = ?'
+            args.append(product_id)
+        return lambda one: one(sql + ' ORDER BY id DESC LIMIT 1', *args)
+
+    accepted_bounty = lambda one: one('SELECT id FROM bounties WHERE user_id = ? AND accepter_id = ? AND status = 1 '
+                                      'ORDER BY id DESC LIMIT 1', buyer_id, seller_id)
+
+    anonymous = pages.get(None, []) + [
+        get('buyer.index', q='手机'), get('buyer.index', category=ids['category']),
+        get('buyer.index', category=ids['category'], min_price=10, max_price=500, sort_by='price_asc'),
+        get('buyer.index', sort_by='price_desc', page=3), get('buyer.index', sort_by='trending'),
+        get('buyer.suggest', q='s'), get('buyer.product_detail', product_id=product),
+        post('auth.register', data={'username': 'plan_check', 'password': 'plan-check', 'role': 'buyer'}),
+    ]
+    buyer = pages.get(ids['buyer'], []) + [
+        post('buyer.toggle_favorite', json={}, product_id=product),
+        post('buyer.batch_favorites', json={'action': 'add', 'product_ids': [product, product2, own_product]}),
+        post('buyer.batch_favorites', json={'action': 'remove', 'product_ids': [product2]}),
+        post('buyer.add_to_cart', json={}, product_id=product),
+        post('buyer.update_cart', json={'quantity': 2}, cart_id=cart_item(product)),
+        post('buyer.batch_cart', json={'action': 'add', 'product_ids': [product2, own_product]}),
+        post('buyer.batch_cart', json={'action': 'update', 'items': [
+            {'cart_id': cart_item(product), 'quantity': 1}]}),
+        post('buyer.batch_cart', json={'action': 'remove', 'cart_ids': [cart_item(own_product)]}),
+        post('buyer.remove_from_cart', cart_id=cart_item(product2)),
+        get('buyer.cart'), get('buyer.cart_checkout'),
+        post('buyer.cart_checkout', data=ADDRESS),
+        post('buyer.buy_product', data=ADDRESS, product_id=product2),
+        post('buyer.cancel_order', json={}, order_id=buyer_order(1, product2)),
+        post('buyer.send_message', json={'content': '还在吗？'}, product_id=own_product),
+        post('buyer.send_price_offer', json={'offer_price': 1, 'content': '便宜点？'}, product_id=own_product),
+        post('buyer.post_bounty', data={'title': '求购二手自行车', 'budget': 200, 'desc': '能骑就行'}),
+        post('buyer.post_bounty', data={'title': '求购台灯', 'budget': 30, 'desc': '宿舍用'}),
+        post('buyer.cancel_bounty', json={}, bounty_id=lambda one: one(
+            'SELECT id FROM bounties WHERE user_id = ? AND status = 0 ORDER BY id DESC LIMIT 1', buyer_id)),
+        post('buyer.review_order', data={'rating': 5, 'content': '东西不错，卖家很爽快'}, order_id=ids['order']),
+        post('buyer.profile', data={'username': ids['buyer']}),
+        post('buyer.clear_history'),
+    ]
+    seller = pages.get(ids['seller'], []) + [
+        get('buyer.profile'), get('buyer.my_products'),
+        post('seller.accept_offer', json={}, message_id=lambda one: one(
+            "SELECT id FROM messages WHERE receiver_id = ? AND product_id = ? AND message_type = 'price_offer' "
+            'ORDER BY id DESC LIMIT 1', seller_id, own_product)),
+        post('seller.reply_message', json={'product_id': own_product, 'buyer_id': buyer_id, 'content': '在的'}),
+        post('seller.update_price', json={'price': 99}, product_id=own_product),
+        post('seller.toggle_product_status', json={}, product_id=own_product),
+        post('seller.toggle_product_status', json={}, product_id=own_product),
+        post('seller.batch_products', json={'ops': [{'id': own_product, 'op': 'price', 'price': 88}]}),
+        post('seller.edit_product', data={'title': '九成新台灯', 'price': 80, 'category': 'second', 'desc': '宿舍用'},
+             product_id=own_product),
+        post('seller.dashboard', data={'title': '全新笔记本', 'price': 5, 'category': 'creative', 'desc': '没拆封'}),
+        post('seller.delete_product', json={}, product_id=lambda one: one(
+            'SELECT id FROM products WHERE seller_id = ? ORDER BY id DESC LIMIT 1', seller_id)),
+        get('seller.ship_order', expect='redirect', order_id=buyer_order(1, product)),
+        post('buyer.accept_bounty', json={}, bounty_id=lambda one: one(
+            'SELECT id FROM bounties WHERE user_id = ? AND status = 0 ORDER BY id LIMIT 1', buyer_id)),
+        post('buyer.send_bounty_message', json={'content': '什么时候要？'}, bounty_id=accepted_bounty),
+        get('seller.respond_bounty', expect='redirect', bounty_id=lambda one: one(
+            'SELECT id FROM bounties WHERE user_id != ? AND status = 0 ORDER BY id LIMIT 1', seller_id)),
+    ]
+    # 买家处理卖家发货、接单之后的订单与悬赏
+    buyer_again = [
+        get('buyer.confirm_receipt', expect='redirect', order_id=buyer_order(2, product)),
+        post('buyer.create_bounty_order', json=ADDRESS, bounty_id=accepted_bounty),
+        get('buyer.my_orders'),
+        get('auth.logout', expect='redirect'),
+    ]
+    admin = pages.get(ids['admin'], [])
+    return [(None, anonymous), (ids['buyer'], buyer), (ids['seller'], seller), (ids['buyer'], buyer_again),
+            (ids['admin'], admin)]
+
+
+def resolve(value, one):
+    """把 Step 里的函数（执行时才查得到的记录）替换成查询结果"""
+    if callable(value):
+        return value(one)
+    if isinstance(value, dict):
+        return {k: resolve(v, one) for k, v in value.items()}
+    if isinstance(value, list):
+        return [resolve(v, one) for v in value]
+    return value
+
+
+def perform(client, app, step, one):
+    """执行一步，返回 (描述, 失败原因或 None)"""
+    values = resolve(step.values, one)
+    missing = [name for name, value in values.items() if value is None]
+    if missing:
+        return f'{step.method} {step.endpoint}', f'没有可用的样本记录：{", ".join(missing)}'
+    with app.test_request_context():
+        path = url_for(step.endpoint, **values)
+    label = f'{step.method} {path}'
+    if step.method == 'GET':
+        resp = client.get(path)
+    else:
+        resp = client.post(path, data=step.data, json=resolve(step.json, one))
+    if resp.status_code >= 400:
+        return label, f'状态码 {resp.status_code}'
+    if step.expect == 'redirect' and resp.status_code != 302:
+        return label, f'应当跳转，实际返回 {resp.status_code}（表单未通过校验？）'
+    if step.expect == 'json':
+        body = resp.get_json(silent=True)
+        if not body or not body.get('success'):
+            return label, f"接口返回失败：{(body or {}).get('message', resp.status_code)}"
+    return label, None
+
+
+class PlanRecorder:
+    """记录请求里每条 SELECT 的执行计划，按 (视图, SQL 指纹) 去重"""
+
+    def __init__(self):
+        self.plans = {}
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        from app.slow_queries import explain, fingerprint, normalize
+        if not has_request_context() or conn.dialect.name != 'sqlite':
+            return
+        plan = explain(cursor, statement, parameters, executemany)
+        if plan is None:
+            return
+        normalized = normalize(statement)
+        key = (request.endpoint, fingerprint(normalized))
+        if key not in self.plans:
+            self.plans[key] = {'endpoint': request.endpoint, 'sql': normalized, 'plan': plan}
+
+
+def violations(plans, rows, min_rows):
+    found = []
+    for entry in plans:
+        for step in entry['plan']:
+            match = SCAN_RE.match(step.strip())
+            if not match:
+                continue
+            table = match.group(1)
+            if rows.get(table, 0) >= min_rows and (entry['endpoint'], table) not in ALLOWED_SCANS:
+                found.append((entry, table))
+    return found
+
+
+def run(db_path, password, min_rows, verbose):
+    from flask_migrate import upgrade
+
+    from app import create_app
+    from config import Config
+
+    ids, rows = sample_ids(db_path)
+
+    class PlanConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + db_path
+        WTF_CSRF_ENABLED = False
+        METRICS_ENABLED = False
+        SLOW_QUERY_MS = None
+
+    app = create_app(PlanConfig)
+    with app.app_context():
+        upgrade(directory=MIGRATIONS_DIR)
+        from app import db
+        from app.models import User
+        admin = User.query.filter_by(username=ids['admin']).one()
+        admin.role = 'admin'
+        db.session.commit()
+
+    visited = set()
+
+    def on_finished(sender, response, **extra):
+        visited.add((request.endpoint, request.method))
+
+    recorder = PlanRecorder()
+    failures = []
+    conn = sqlite3.connect(db_path)
+    one = lambda sql, *args: (conn.execute(sql, args).fetchone() or (None,))[0]
+    event.listen(Engine, 'before_cursor_execute', recorder)
+    request_finished.connect(on_finished, app)
+    try:
+        for username, steps in scenario(app, ids):
+            client = app.test_client()
+            if username:
+                resp = client.post('/auth/login', data={'username': username, 'password': password})
+                if resp.status_code != 302:
+                    raise SystemExit(f'{username} 登录失败（{resp.status_code}）')
+            for step in steps:
+                label, error = perform(client, app, step, one)
+                if error:
+                    failures.append((username or '游客', label, error))
+    finally:
+        event.remove(Engine, 'before_cursor_execute', recorder)
+        request_finished.disconnect(on_finished, app)
+        conn.close()
+
+    routes = {(rule.endpoint, method) for rule in app.url_map.iter_rules()
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+    unvisited = sorted(routes - visited - set(EXEMPT))
+    plans = sorted(recorder.plans.values(), key=lambda e: e['endpoint'] or '')
+    found = violations(plans, rows, min_rows)
+
+    print(f"检查了 {len({e['endpoint'] for e in plans})} 个视图的 {len(plans)} 条查询；"
+          f"大表（≥{min_rows} 行）: " + ', '.join(f'{t}={n}' for t, n in sorted(rows.items()) if n >= min_rows))
+    if verbose:
+        for entry in plans:
+            print(f"\n[{entry['endpoint']}] {entry['sql'][:300]}")
+            for step in entry['plan']:
+                print(f'    {step}')
+    for entry, table in found:
+        print(f"\n全表扫描 {table}（{rows[table]} 行） 视图 {entry['endpoint']}")
+        print(f"  {entry['sql'][:500]}")
+        for step in entry['plan']:
+            print(f'    {step}')
+    print(f'\n违规 {len(found)} 处' if found else '\n没有发现大表全表扫描')
+    for username, label, error in failures:
+        print(f'请求失败 {username} {label}：{error}')
+    for endpoint, method in unvisited:
+        print(f'未访问的路由 {method} {endpoint}（访问它，或登记到 EXEMPT 并写明原因）')
+    print(f'覆盖 {len(routes & visited)} / {len(routes) - len(set(EXEMPT) & routes)} 个路由（另有 {len(EXEMPT)} 个豁免），'
+          f'请求失败 {len(failures)} 个，未访问 {len(unvisited)} 个')
+    return len(found) + len(failures) + len(unvisited)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='检查页面查询的执行计划')
+    parser.add_argument('--db', required=True, help='SQLite 数据库文件（bench.datagen 生成），在拷贝上运行')
+    parser.add_argument('--password', default='123456', help='生成数据的统一密码')
+    parser.add_argument('--min-rows', type=int, default=1000, help='行数不少于该值的表不允许全表扫描')
+    parser.add_argument('-v', '--verbose', action='store_true', help='打印每条查询的执行计划')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'plans.db')
+        copy_db(args.db, path)
+        problems = run(path, args.password, args.min_rows, args.verbose)
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+相似商品推荐的构建耗时基准
+
+在内存中生成长尾分布的浏览数据（不落库），分别用 NumPy/SciPy 与纯 Python 实现计算
+全量 Top-K 邻居，以及只重算少量用户涉及商品的增量构建，报告耗时与结果规模。
+
+用法：
+    python -m bench.recommend --rows 1000000
+    python -m bench.recommend --rows 200000 --backends numpy,python --json
+"""
+import argparse
+import json
+import random
+import time
+from array import array
+
+from bench.datagen import Zipf
+
+
+def synthesize(rows, users, products, max_items_per_user, seed=42):
+    """生成 (用户, 商品, 权重) 交互，按用户分组，与 app.recommend.load_interactions 的输出同构"""
+    from app.recommend import Interactions
+
+    rng = random.Random(seed)
+    user_dist = Zipf(users, 0.8, rng)
+    product_dist = Zipf(products, 1.0, rng)
+    histories = {}
+    for _ in range(rows):
+        items = histories.setdefault(user_dist.sample(), {})
+        if len(items) < max_items_per_user:
+            # 约 1/10 的交互是收藏
+            items[product_dist.sample()] = 3.0 if rng.random() < 0.1 else 1.0
+
+    data = Interactions(array('i'), array('i'), array('f'))
+    for user_id in sorted(histories):
+        for item_id, weight in histories[user_id].items():
+            data.users.append(user_id)
+            data.items.append(item_id)
+            data.weights.append(weight)
+    return data
+
+
+def run_backend(recommend, name, data, k, incremental_users):
+    """临时切换 app.recommend 的实现，返回全量与增量两次构建的耗时"""
+    saved = recommend.np, recommend.sparse
+    if name == 'python':
+        recommend.np = recommend.sparse = None
+    try:
+        started = time.perf_counter()
+        full = recommend.compute_neighbors(data, k)
+        full_seconds = time.perf_counter() - started
+
+        affected = set(incremental_users)
+        targets = {i for u, i in zip(data.users, data.items) if u in affected}
+        started = time.perf_counter()
+        recommend.compute_neighbors(data, k, targets)
+        incremental_seconds = time.perf_counter() - started
+    finally:
+        recommend.np, recommend.sparse = saved
+    return {
+        'backend': name,
+        'full_seconds': round(full_seconds, 3),
+        'products': len(full),
+        'avg_neighbors': round(sum(len(v) for v in full.values()) / (len(full) or 1), 2),
+        'incremental_products': len(targets),
+        'incremental_seconds': round(incremental_seconds, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='相似商品推荐构建耗时基准')
+    parser.add_argument('--rows', type=int, default=1_000_000, help='交互行数（去重前）')
+    parser.add_argument('--users', type=int, default=100_000)
+    parser.add_argument('--products', type=int, default=200_000)
+    parser.add_argument('--k', type=int, default=20, help='每件商品保留的邻居数')
+    parser.add_argument('--max-items', type=int, default=200, help='每个用户最多参与计算的交互数')
+    parser.add_argument('--incremental-users', type=int, default=1000, help='增量构建模拟的活跃用户数')
+    parser.add_argument('--backends', default='numpy,python', help='逗号分隔：numpy / python')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args(argv)
+
+    from app import recommend
+
+    started = time.perf_counter()
+    data = synthesize(args.rows, args.users, args.products, args.max_items, args.seed)
+    print(f'生成 {len(data.users)} 条去重交互，用时 {time.perf_counter() - started:.1f}s')
+    active = random.Random(args.seed).sample(sorted(set(data.users)), min(args.incremental_users, len(data.users)))
+
+    results = []
+    for name in args.backends.split(','):
+        if name == 'numpy' and not recommend.load_numpy():
+            print('未安装 NumPy/SciPy，跳过 numpy')
+            continue
+        result = run_backend(recommend, name, data, args.k, active)
+        results.append(result)
+        if not args.json:
+            print(f"{name:>6}: 全量 {result['full_seconds']}s（{result['products']} 件商品，"
+                  f"平均 {result['avg_neighbors']} 个邻居），"
+                  f"增量 {result['incremental_seconds']}s（{result['incremental_products']} 件商品）")
+    if args.json:
+        print(json.dumps({'rows': len(data.users), 'results': results}, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
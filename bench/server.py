@@ -0,0 +1,140 @@
+"""
+对比开发服务器与生产服务（gunicorn）的吞吐量
+
+    python -m bench.datagen --scale 0.01 --db sqlite:////tmp/bench.db --reset
+    python -m bench.server --db /tmp/bench.db --concurrency 16 --duration 30
+
+依次在随机端口上启动 python run.py 同款的开发服务器（debug，关闭自动重载）和
+gunicorn -c gunicorn.conf.py wsgi:app，用 bench.loadtest 的同一组虚拟用户路径各压测一轮。
+每轮使用数据库的一份拷贝，互不影响。
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from bench.loadtest import HttpClient, print_report, run
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEV_SERVER = ("from run import app; "
+              "app.run(host='127.0.0.1', port={port}, debug=True, use_reloader=False)")
+
+
+def copy_db(src, dst):
+    """用 SQLite 在线备份复制数据库（WAL 模式下直接复制文件可能丢掉未检查点的页）"""
+    source, target = sqlite3.connect(src), sqlite3.connect(dst)
+    try:
+        source.backup(target)
+    finally:
+        source.close()
+        target.close()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, proc, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'服务进程已退出（返回码 {proc.returncode}）')
+        try:
+            with urllib.request.urlopen(url + '/auth/login', timeout=2) as resp:
+                if resp.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('等待服务启动超时')
+
+
+def stop(proc):
+    if proc.poll() is None:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+
+def serve_and_bench(name, command, env, args, users):
+    port = free_port()
+    url = f'http://127.0.0.1:{port}'
+    command = [part.format(port=port) for part in command]
+    started = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(url, proc, args.startup_timeout)
+        ready = time.perf_counter() - started
+        print(f'[{name}] 启动用时 {ready:.1f}s，开始压测 {url}')
+        result = run(lambda: HttpClient(url), users, args.password, args.concurrency, args.duration,
+                     args.iterations, args.seed)
+    finally:
+        stop(proc)
+    result['startup_s'] = ready
+    print_report(result)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='开发服务器 vs gunicorn 吞吐对比')
+    parser.add_argument('--db', required=True, help='bench.datagen 生成的 SQLite 文件路径')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--iterations', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='gunicorn 进程数，默认按 gunicorn.conf.py')
+    parser.add_argument('--threads', type=int, help='gunicorn 每进程线程数，默认按 gunicorn.conf.py')
+    parser.add_argument('--password', default='123456')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--startup-timeout', type=float, default=120)
+    parser.add_argument('--json', help='把两轮结果写入该 JSON 文件')
+    args = parser.parse_args(argv)
+
+    users = [f'user{i}' for i in range(1, args.concurrency + 1)]
+    servers = [
+        ('dev', [sys.executable, '-c', DEV_SERVER]),
+        ('gunicorn', [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                      '--bind', '127.0.0.1:{port}', 'wsgi:app']),
+    ]
+    results = {}
+    workdir = tempfile.mkdtemp(prefix='bench-server-')
+    try:
+        for name, command in servers:
+            db_path = os.path.join(workdir, f'{name}.db')
+            copy_db(args.db, db_path)
+            env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}', GUNICORN_ACCESS_LOG='')
+            if args.workers:
+                env['GUNICORN_WORKERS'] = str(args.workers)
+            if args.threads:
+                env['GUNICORN_THREADS'] = str(args.threads)
+            results[name] = serve_and_bench(name, command, env, args, users)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    dev, prod = results['dev'], results['gunicorn']
+    print(f"\n{'':<12}{'req/s':>10}{'startup s':>12}")
+    for name, r in results.items():
+        print(f"{name:<12}{r['total_rps']:>10.1f}{r['startup_s']:>12.1f}")
+    if dev['total_rps']:
+        print(f"gunicorn / dev = {prod['total_rps'] / dev['total_rps']:.2f}x")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
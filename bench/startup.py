@@ -0,0 +1,144 @@
+"""
+冷启动耗时：导入、create_app、首个请求与稳定状态请求
+
+    python -m bench.datagen --scale 0.01 --db sqlite:////tmp/bench.db --reset
+    python -m bench.startup --db /tmp/bench.db --runs 5
+
+每轮在全新的 Python 进程里依次计时：
+- import：导入 config 与 app（含 app.models）；
+- create_app：应用工厂（注册蓝图、扩展与命令）；
+- warmup：--warmup 时执行 wsgi.py 同款预热；
+- first：每个页面的第一次请求（模板编译、索引构建等一次性开销都落在这里）；
+- steady：同一页面之后若干次请求的中位数。
+
+模板字节码缓存分三种情况各跑一组：off（关闭）、cold（空缓存目录）、warm（先执行 flask templates compile）。
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench.server import ROOT, copy_db
+
+PATHS = ['/', '/?q=iPhone', '/product/1', '/auth/login', '/auth/register']
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import config
+from app import create_app
+imported = time.perf_counter()
+config.Config.JINJA_BYTECODE_CACHE_DIR = sys.argv[1] or None
+app = create_app()
+created = time.perf_counter()
+timings = {'import': imported - started, 'create_app': created - imported, 'warmup': 0.0}
+if sys.argv[2] == '1':
+    from app.warmup import warmup
+    warmup(app)
+    timings['warmup'] = time.perf_counter() - created
+client = app.test_client()
+first, steady = {}, {}
+for path in json.loads(sys.argv[3]):
+    t = time.perf_counter()
+    status = client.get(path).status_code
+    first[path] = time.perf_counter() - t
+    if status != 200:
+        raise SystemExit(f'{path} returned {status}')
+for path in json.loads(sys.argv[3]):
+    samples = []
+    for _ in range(int(sys.argv[4])):
+        t = time.perf_counter()
+        client.get(path)
+        samples.append(time.perf_counter() - t)
+    samples.sort()
+    steady[path] = samples[len(samples) // 2]
+timings.update(first=first, steady=steady)
+print(json.dumps(timings))
+'''
+
+
+def run_child(env, cache_dir, warm, paths, repeat):
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', CHILD, cache_dir or '', '1' if warm else '0',
+                          json.dumps(paths), str(repeat)],
+                         cwd=ROOT, env=env, check=True, capture_output=True, text=True)
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['process'] = time.perf_counter() - started
+    return result
+
+
+def precompile(env, cache_dir):
+    env = dict(env, FLASK_APP='run.py')
+    code = ('import config, sys; config.Config.JINJA_BYTECODE_CACHE_DIR = sys.argv[1]; '
+            'from flask.cli import main; sys.argv = ["flask", "templates", "compile"]; main()')
+    subprocess.run([sys.executable, '-c', code, cache_dir], cwd=ROOT, env=env, check=True, capture_output=True)
+
+
+def summarize(runs):
+    """多轮取中位数；first / steady 取各页面之和"""
+    def median(key):
+        return statistics.median(r[key] for r in runs)
+    return {
+        'import': median('import'),
+        'create_app': median('create_app'),
+        'warmup': median('warmup'),
+        'first': statistics.median(sum(r['first'].values()) for r in runs),
+        'steady': statistics.median(sum(r['steady'].values()) for r in runs),
+        'first_max': statistics.median(max(r['first'].values()) for r in runs),
+        'process': median('process'),
+        'pages': {path: statistics.median(r['first'][path] for r in runs) for path in runs[0]['first']},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='冷启动耗时分解')
+    parser.add_argument('--db', required=True, help='bench.datagen 生成的 SQLite 文件路径')
+    parser.add_argument('--runs', type=int, default=3, help='每种情况启动的进程数')
+    parser.add_argument('--repeat', type=int, default=20, help='稳定状态每个页面请求的次数')
+    parser.add_argument('--modes', default='off,cold,warm', help='逗号分隔：off / cold / warm')
+    parser.add_argument('--warmup', action='store_true', help='创建应用后执行 app.warmup.warmup')
+    parser.add_argument('--json', help='把结果写入该 JSON 文件')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    results = {}
+    try:
+        db_path = os.path.join(workdir, 'bench.db')
+        copy_db(args.db, db_path)
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{db_path}')
+        for mode in args.modes.split(','):
+            runs = []
+            for i in range(args.runs):
+                cache_dir = None
+                if mode != 'off':
+                    cache_dir = os.path.join(workdir, f'jinja-{mode}-{i}')
+                    os.makedirs(cache_dir)
+                    if mode == 'warm':
+                        precompile(env, cache_dir)
+                runs.append(run_child(env, cache_dir, args.warmup, PATHS, args.repeat))
+            results[mode] = summarize(runs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ms = 1000
+    print(f"{'(ms)':<8}{'import':>9}{'factory':>9}{'warmup':>9}{'first':>9}{'steady':>9}"
+          f"{'first/steady':>14}{'process':>9}")
+    for mode, r in results.items():
+        ratio = r['first'] / r['steady'] if r['steady'] else 0
+        print(f"{mode:<8}{r['import'] * ms:>9.0f}{r['create_app'] * ms:>9.0f}{r['warmup'] * ms:>9.0f}"
+              f"{r['first'] * ms:>9.1f}{r['steady'] * ms:>9.1f}{ratio:>13.1f}x{r['process'] * ms:>9.0f}")
+    print(f'\nfirst / steady 为 {len(PATHS)} 个页面的耗时之和；各页面首个请求（ms）：')
+    for mode, r in results.items():
+        print(f'  {mode:<6}' + '  '.join(f'{path} {t * ms:.1f}' for path, t in r['pages'].items()))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
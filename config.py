@@ -3,9 +3,105 @@ basedir = os.path.abspath(os.path.dirname(__file__))
 
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'suzhou-university-capstone-secret'
-    # 使用 SQLite 方便演示，无需安装 MySQL
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'market.db')
+    # 使用 SQLite 方便演示，无需安装 MySQL；部署时可用 DATABASE_URL 指定数据库文件（只支持 SQLite，见 create_app）
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///' + os.path.join(basedir, 'market.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 读写分离：从库连接串（逗号分隔），为空时所有查询都走主库
+    SQLALCHEMY_REPLICA_URIS = [u for u in os.environ.get('REPLICA_DATABASE_URIS', '').split(',') if u]
+    # 用户提交写操作后，多少秒内其 read-your-writes 视图仍读主库
+    REPLICA_LAG_SECONDS = 5
+    # 首页价格分面的区间边界（最后一档为"以上"）
+    PRICE_FACET_BUCKETS = [0, 50, 100, 500, 1000, 5000]
+    # 搜索补全：中文词内额外索引的后缀个数、增量段合并阈值、热门搜索词上限
+    SUGGEST_MAX_SUFFIXES = 8
+    SUGGEST_MERGE_THRESHOLD = 2000
+    SUGGEST_MAX_QUERIES = 5000
+    # 搜索补全与其他进程同步（后台线程）：检查在售商品版本的间隔、整体重建的间隔（秒，覆盖其他进程的改名）
+    SUGGEST_REFRESH_SECONDS = 30
+    SUGGEST_REBUILD_SECONDS = 3600
+    # 首页搜索结果缓存：总内存上限、每个条件最多缓存的商品 id 数、过期时间
+    SEARCH_CACHE_ENABLED = True
+    SEARCH_CACHE_MAX_BYTES = 8 * 1024 * 1024
+    SEARCH_CACHE_MAX_IDS = 1200
+    SEARCH_CACHE_TTL = 60  # 秒
+    # 相似商品推荐：每件商品保留的邻居数、收藏相对浏览的权重、每个用户参与计算的最近交互数
+    RECOMMEND_TOP_K = 20
+    RECOMMEND_FAVORITE_WEIGHT = 3.0
+    RECOMMEND_MAX_ITEMS_PER_USER = 200
+    # 悬赏匹配：悬赏标题词项至少被商品标题覆盖的比例、商品价格可超出预算的比例
+    BOUNTY_MATCH_MIN_OVERLAP = 0.6
+    BOUNTY_MATCH_BUDGET_TOLERANCE = 0.2
+    BOUNTY_MATCH_REFRESH_SECONDS = 30  # 检查其他进程悬赏变更的间隔
+    # 商品热度：衰减半衰期、收藏相对浏览的权重、计数落库间隔（秒）与每批行数
+    TRENDING_HALF_LIFE_HOURS = 24
+    TRENDING_FAVORITE_WEIGHT = 5.0
+    TRENDING_FLUSH_INTERVAL = 10
+    TRENDING_FLUSH_BATCH = 500
+    # 超时清理：自动确认收货 / 取消订单 / 悬赏过期的时限，每批处理条数，进程内定时间隔（秒，0 表示只用 flask sweep）
+    ORDER_AUTO_CONFIRM_DAYS = 7
+    ORDER_UNPAID_TIMEOUT_HOURS = 24
+    ORDER_UNSHIPPED_TIMEOUT_DAYS = 3
+    BOUNTY_IDLE_DAYS = 14
+    SWEEPER_BATCH = 200
+    SWEEPER_INTERVAL = 0
+    # 浏览历史保留策略：保留天数、每个用户最多条数、清理时每批删除条数
+    BROWSING_HISTORY_TTL_DAYS = 180
+    BROWSING_HISTORY_MAX_PER_USER = 500
+    BROWSING_HISTORY_PRUNE_BATCH = 5000
+    # 购物车摘要（导航栏角标）在 session 中的有效秒数，过期后重新统计
+    CART_SUMMARY_TTL = 300
+    # 批量接口一次最多处理的条目数
+    BATCH_MAX_ITEMS = 500
     # 图片上传配置
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'uploads')
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB limit
\ No newline at end of file
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB limit
+    UPLOAD_CHUNK_SIZE = 64 * 1024  # 上传文件落盘时每次读取的字节数
+    # 缩略图：尺寸名 -> 最长边像素，列表页用 sm，详情页用 md（需要安装 Pillow）
+    UPLOAD_THUMBNAIL_SIZES = {'sm': 320, 'md': 800}
+    UPLOAD_THUMBNAIL_QUALITY = 80
+    UPLOAD_THUMBNAIL_WORKERS = 2
+    # 外部图片代理：允许代理的站点、磁盘缓存目录与容量、下载超时与大小上限、浏览器缓存秒数、失败后直接跳转原图的秒数
+    IMAGE_PROXY_HOSTS = ['images.unsplash.com', 'picsum.photos', 'fastly.picsum.photos',
+                         'via.placeholder.com', 'api.dicebear.com']
+    IMAGE_PROXY_CACHE_DIR = os.path.join(basedir, 'cache', 'images')
+    IMAGE_PROXY_CACHE_BYTES = 512 * 1024 * 1024
+    IMAGE_PROXY_TIMEOUT = 5
+    IMAGE_PROXY_MAX_BYTES = 10 * 1024 * 1024
+    IMAGE_PROXY_MAX_AGE = 30 * 86400
+    IMAGE_PROXY_FAILURE_TTL = 300
+    # Jinja 模板编译结果的磁盘缓存目录（多个 worker / 重启之间共用），设为 None 关闭
+    JINJA_BYTECODE_CACHE_DIR = os.path.join(basedir, 'cache', 'jinja')
+    # 预热时以匿名用户请求的页面（只读，不产生浏览记录）
+    WARMUP_PATHS = ['/', '/auth/login']
+    # 静态资源指纹：flask assets build 的输出目录、带指纹资源的浏览器缓存秒数
+    ASSETS_BUILD_DIR = os.path.join(basedir, 'cache', 'assets')
+    ASSETS_MAX_AGE = 365 * 86400
+    # 动态响应压缩：超过该字节数的文本响应才压缩；gzip 级别、brotli 质量（动态压缩取中等，预压缩用最高）
+    COMPRESS_MIN_SIZE = 1024
+    COMPRESS_LEVEL = 6
+    COMPRESS_BR_QUALITY = 4
+    COMPRESS_MIMETYPES = ['text/html', 'application/json', 'text/css', 'text/javascript', 'application/javascript',
+                          'text/plain', 'image/svg+xml']
+    # 请求性能指标：开关、各进程快照目录与写入间隔（秒）、允许访问 /metrics 的地址
+    METRICS_ENABLED = True
+    METRICS_DIR = os.path.join(basedir, 'cache', 'metrics')
+    METRICS_FLUSH_INTERVAL = 15
+    METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+    # 慢查询日志：超过该毫秒数的语句写入日志（None 关闭）、是否附带 EXPLAIN QUERY PLAN、日志路径与轮转
+    SLOW_QUERY_MS = 100
+    SLOW_QUERY_EXPLAIN = True
+    SLOW_QUERY_LOG = os.path.join(basedir, 'logs', 'slow_queries.log')
+    SLOW_QUERY_LOG_BYTES = 5 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
+    SLOW_QUERY_TOP = 20  # 性能面板显示的慢查询指纹数
+    # 按需采样分析：结果目录、采样间隔（毫秒）、单次分析最长秒数
+    PROFILER_DIR = os.path.join(basedir, 'cache', 'profiles')
+    PROFILER_INTERVAL_MS = 5
+    PROFILER_MAX_DURATION = 600
+    # 密码哈希：werkzeug 的 method 字符串（算法与强度）；修改后旧哈希在用户下次登录成功时自动升级
+    PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+    # 每个进程同时计算密码哈希的线程数、额外排队数与最长等待秒数，等待超时时登录页提示稍后再试；
+    # 计算线程数应小于 gunicorn 每个 worker 的线程数，给浏览请求留出线程
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE = 8
+    PASSWORD_HASH_TIMEOUT = 5
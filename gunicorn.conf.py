@@ -0,0 +1,45 @@
+"""
+gunicorn 配置：gunicorn -c gunicorn.conf.py wsgi:app
+
+- 多进程 × 多线程（gthread），进程数、线程数可用环境变量调整；
+- preload_app：master 先导入应用并完成预热，worker fork 后共享已编译的模板和内存索引；
+  每个 worker 在 post_fork 中丢弃继承的数据库连接，在 post_worker_init 中重新建立；
+- 平滑重启（不丢请求）：
+    kill -HUP <master pid>    重读配置，先启动新 worker 再让旧 worker 处理完手头请求后退出；
+                              preload_app 开启时不会重新加载代码
+    发布新代码：kill -USR2 <master pid> 启动新 master（新代码，共用监听 socket），
+                确认新进程就绪后 kill -QUIT <旧 master pid>，旧进程处理完已接收的请求再退出；
+                或设置 GUNICORN_PRELOAD=0，此时 kill -HUP 即会让新 worker 加载新代码。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') != '0'
+
+# 旧 worker 收到退出信号后最多再处理这么多秒的在途请求
+graceful_timeout = 30
+timeout = 60
+keepalive = 5
+# 定期轮换 worker，抖动避免所有 worker 同时重启
+max_requests = 5000
+max_requests_jitter = 500
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None  # 设为空串关闭访问日志
+errorlog = '-'
+
+
+def post_fork(server, worker):
+    from app.warmup import reset_connections
+    from wsgi import app
+
+    reset_connections(app)
+
+
+def post_worker_init(worker):
+    from app.warmup import open_connections
+
+    open_connections(worker.wsgi, threads)
@@ -1,4 +1,5 @@
 # init_data.py
+from flask_migrate import upgrade
 from app import create_app, db
 from app.models import User, Product, Bounty, Order, Favorite, Cart, Message, BrowsingHistory
 import random
@@ -7,6 +8,8 @@ app = create_app()
 
 with app.app_context():
     db.create_all()
+    # 补齐旧库缺少的列和索引（迁移脚本是幂等的，新库执行也无副作用）
+    upgrade()
     
     # 1. 创建用户
     if not User.query.filter_by(username='seller').first():
@@ -0,0 +1,34 @@
+"""products: origin_bounty_id generated column from attributes JSON
+
+Revision ID: 3f9c2a71d0b4
+Revises:
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a71d0b4'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 基础表由 init_data.py 的 db.create_all() 创建；新库已经带有该列，这里只补旧库
+    columns = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('products')}
+    if 'origin_bounty_id' not in columns:
+        # SQLite 只允许 ALTER TABLE 添加 VIRTUAL 生成列
+        op.add_column('products', sa.Column(
+            'origin_bounty_id', sa.Integer,
+            sa.Computed("json_extract(attributes, '$.origin_bounty_id')", persisted=False)
+        ))
+    op.create_index('ix_products_origin_bounty_id', 'products', ['origin_bounty_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_products_origin_bounty_id', table_name='products')
+    with op.batch_alter_table('products') as batch_op:
+        batch_op.drop_column('origin_bounty_id')
@@ -0,0 +1,36 @@
+"""product_neighbors table and time indexes for recommendation watermarks
+
+Revision ID: 8b1e4d2c9a57
+Revises: 3f9c2a71d0b4
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e4d2c9a57'
+down_revision = '3f9c2a71d0b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 新库由 db.create_all() 建好，这里只补旧库
+    if not sa.inspect(op.get_bind()).has_table('product_neighbors'):
+        op.create_table(
+            'product_neighbors',
+            sa.Column('product_id', sa.Integer, sa.ForeignKey('products.id'), primary_key=True),
+            sa.Column('neighbors', sa.Text),
+            sa.Column('built_at', sa.DateTime),
+        )
+    op.create_index('ix_product_neighbors_built_at', 'product_neighbors', ['built_at'], if_not_exists=True)
+    op.create_index('idx_viewed_at', 'browsing_history', ['viewed_at'], if_not_exists=True)
+    op.create_index('ix_favorites_created_at', 'favorites', ['created_at'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_favorites_created_at', table_name='favorites')
+    op.drop_index('idx_viewed_at', table_name='browsing_history')
+    op.drop_table('product_neighbors')
@@ -0,0 +1,38 @@
+"""browsing_history: drop duplicate (user_id, product_id) rows and make the pair unique
+
+Revision ID: a7d3f8c2e946
+Revises: f2c6e9a4b815
+Create Date: 2026-10-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3f8c2e946'
+down_revision = 'f2c6e9a4b815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    indexes = {ix['name'] for ix in sa.inspect(op.get_bind()).get_indexes('browsing_history')}
+    if 'unique_browsing' in indexes:
+        return
+    # 每个 (用户, 商品) 只保留最近一次浏览
+    op.execute("""
+        DELETE FROM browsing_history WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY user_id, product_id ORDER BY viewed_at DESC, id DESC
+                ) AS rn
+                FROM browsing_history
+            ) WHERE rn > 1
+        )
+    """)
+    op.create_index('unique_browsing', 'browsing_history', ['user_id', 'product_id'], unique=True)
+
+
+def downgrade():
+    op.drop_index('unique_browsing', table_name='browsing_history')
@@ -0,0 +1,45 @@
+"""indexes for the filter / sort columns used by the buyer, seller and admin pages
+
+Revision ID: b3e9d6f1c524
+Revises: a7d3f8c2e946
+Create Date: 2026-10-21 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3e9d6f1c524'
+down_revision = 'a7d3f8c2e946'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('idx_products_status_timestamp', 'products', ['status', 'timestamp']),
+    ('idx_products_status_price', 'products', ['status', 'price']),
+    ('idx_products_status_category_price', 'products', ['status', 'category', 'price']),
+    ('idx_products_seller_timestamp', 'products', ['seller_id', 'timestamp']),
+    ('idx_products_timestamp', 'products', ['timestamp']),
+    ('idx_bounties_status_created', 'bounties', ['status', 'created_at']),
+    ('idx_bounties_user_created', 'bounties', ['user_id', 'created_at']),
+    ('idx_bounties_accepter_accepted', 'bounties', ['accepter_id', 'accepted_at']),
+    ('idx_reviews_product_timestamp', 'reviews', ['product_id', 'timestamp']),
+    ('idx_reviews_buyer_product', 'reviews', ['buyer_id', 'product_id']),
+    ('idx_reviews_seller', 'reviews', ['seller_id']),
+    ('idx_orders_buyer_created', 'orders', ['buyer_id', 'created_at']),
+    ('idx_orders_seller_created', 'orders', ['seller_id', 'created_at']),
+    ('idx_messages_receiver_read', 'messages', ['receiver_id', 'is_read']),
+    ('idx_messages_sender_receiver', 'messages', ['sender_id', 'receiver_id']),
+    ('idx_messages_product_created', 'messages', ['product_id', 'created_at']),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
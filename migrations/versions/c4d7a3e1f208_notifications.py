@@ -0,0 +1,39 @@
+"""notifications table for bounty matches
+
+Revision ID: c4d7a3e1f208
+Revises: 8b1e4d2c9a57
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7a3e1f208'
+down_revision = '8b1e4d2c9a57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 新库由 db.create_all() 建好，这里只补旧库
+    if not sa.inspect(op.get_bind()).has_table('notifications'):
+        op.create_table(
+            'notifications',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id')),
+            sa.Column('kind', sa.String(32)),
+            sa.Column('message', sa.String(256)),
+            sa.Column('bounty_id', sa.Integer, sa.ForeignKey('bounties.id')),
+            sa.Column('product_id', sa.Integer, sa.ForeignKey('products.id')),
+            sa.Column('is_read', sa.Boolean),
+            sa.Column('created_at', sa.DateTime),
+            sa.UniqueConstraint('kind', 'bounty_id', 'product_id', name='unique_notification_ref'),
+        )
+    op.create_index('idx_notification_user_read', 'notifications', ['user_id', 'is_read'], if_not_exists=True)
+    op.create_index('idx_notification_bounty', 'notifications', ['bounty_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table('notifications')
@@ -0,0 +1,25 @@
+"""indexes for the product_id lookups made when a product is deleted
+
+Revision ID: c8f1d4a6b293
+Revises: b3e9d6f1c524
+Create Date: 2026-10-22 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8f1d4a6b293'
+down_revision = 'b3e9d6f1c524'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_orders_product', 'orders', ['product_id'], if_not_exists=True)
+    op.create_index('idx_browsing_product', 'browsing_history', ['product_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_browsing_product', table_name='browsing_history')
+    op.drop_index('idx_orders_product', table_name='orders')
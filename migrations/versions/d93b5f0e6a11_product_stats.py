@@ -0,0 +1,34 @@
+"""product_stats table for trending scores
+
+Revision ID: d93b5f0e6a11
+Revises: c4d7a3e1f208
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b5f0e6a11'
+down_revision = 'c4d7a3e1f208'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 新库由 db.create_all() 建好，这里只补旧库；已有数据用 flask trending rebuild 回填
+    if not sa.inspect(op.get_bind()).has_table('product_stats'):
+        op.create_table(
+            'product_stats',
+            sa.Column('product_id', sa.Integer, sa.ForeignKey('products.id'), primary_key=True),
+            sa.Column('views', sa.Integer),
+            sa.Column('favorites', sa.Integer),
+            sa.Column('score_log', sa.Float),
+            sa.Column('updated_at', sa.DateTime),
+        )
+    op.create_index('ix_product_stats_score_log', 'product_stats', ['score_log'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_table('product_stats')
@@ -0,0 +1,42 @@
+"""price_history table and watcher indexes for price-drop alerts
+
+Revision ID: e5a8c1b7f3d2
+Revises: d93b5f0e6a11
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5a8c1b7f3d2'
+down_revision = 'd93b5f0e6a11'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 新库由 db.create_all() 建好，这里只补旧库；旧库的现价作为第一条记录
+    if not sa.inspect(op.get_bind()).has_table('price_history'):
+        op.create_table(
+            'price_history',
+            sa.Column('id', sa.Integer, primary_key=True),
+            sa.Column('product_id', sa.Integer, sa.ForeignKey('products.id')),
+            sa.Column('old_price', sa.Float),
+            sa.Column('new_price', sa.Float),
+            sa.Column('changed_at', sa.DateTime),
+            sa.Column('notified', sa.Boolean),
+        )
+        op.execute('INSERT INTO price_history (product_id, old_price, new_price, changed_at, notified) '
+                   'SELECT id, NULL, price, timestamp, 1 FROM products')
+    op.create_index('idx_price_history_product', 'price_history', ['product_id', 'changed_at'], if_not_exists=True)
+    op.create_index('idx_price_history_notified', 'price_history', ['notified'], if_not_exists=True)
+    op.create_index('idx_favorites_product', 'favorites', ['product_id'], if_not_exists=True)
+    op.create_index('idx_carts_product', 'carts', ['product_id'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_carts_product', table_name='carts')
+    op.drop_index('idx_favorites_product', table_name='favorites')
+    op.drop_table('price_history')
@@ -0,0 +1,29 @@
+"""indexes for the order / bounty timeout sweeper
+
+Revision ID: f2c6e9a4b815
+Revises: e5a8c1b7f3d2
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2c6e9a4b815'
+down_revision = 'e5a8c1b7f3d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('idx_orders_status_shipped', 'orders', ['status', 'shipped_at'], if_not_exists=True)
+    op.create_index('idx_orders_status_created', 'orders', ['status', 'created_at'], if_not_exists=True)
+    op.create_index('idx_bounties_status_accepted', 'bounties', ['status', 'accepted_at'], if_not_exists=True)
+    op.create_index('idx_messages_bounty_created', 'messages', ['bounty_id', 'created_at'], if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('idx_messages_bounty_created', table_name='messages')
+    op.drop_index('idx_bounties_status_accepted', table_name='bounties')
+    op.drop_index('idx_orders_status_created', table_name='orders')
+    op.drop_index('idx_orders_status_shipped', table_name='orders')
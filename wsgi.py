@@ -0,0 +1,10 @@
+"""
+生产环境入口：gunicorn -c gunicorn.conf.py wsgi:app
+
+导入时即完成预热（见 app/warmup.py），worker 在预热结束后才开始接收请求。
+"""
+from app import create_app
+from app.warmup import warmup
+
+app = create_app()
+warmup(app)